@@ -2,25 +2,58 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import ssl
+import sys
 import cv2
 import numpy as np
 import colorsys
+from contextlib import asynccontextmanager
 from datetime import datetime
-import torch
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import Depends, FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from PIL import Image
 import io
 import easyocr
 import tempfile
 import shutil
+import time
+import json
 from pydantic import BaseModel
-from parler_tts import ParlerTTSForConditionalGeneration
-from transformers import AutoTokenizer
-import soundfile as sf
+from typing import List, Optional
+import asyncio
+from admin import require_admin
+import color_workers
+import gateway_client
+from live_ocr import LiveOCRSession
+import memory_watchdog
+import model_cache
+from model_residency import ModelResidencyManager
+import ocr_quality
+import tiled_ocr
+from metrics import (
+    metrics_middleware,
+    model_load_timer,
+    monitor_event_loop_lag,
+    record_upload_stage,
+    render_metrics,
+    stage,
+    TRIAGE_AVOIDED_MEGAPIXELS,
+    TRIAGE_RETAKES,
+)
+import profiling
+import thread_budget
+from ocr_workers import OCRProcessPool, PooledReader
+from scheduler import DeadlineExceeded, InferenceScheduler, JobCancelled
+from shm_transport import SlotHandoff, SlotTimeout
+from singleflight import SingleFlight, content_key
+import triage
+import tts_cache
+import tts_engine
+import tts_jobs
 
 # Disable SSL certificate verification for downloading models
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -34,33 +67,196 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "X-Model-Version", "X-TTS-Cache-Hit-Ratio"],
 )
 
+# Per-request latency and stage timings
+app.middleware("http")(metrics_middleware)
+# Opt-in profiling of single requests
+app.middleware("http")(profiling.profiling_middleware)
+# RSS change per request, for tracking down growth
+app.middleware("http")(memory_watchdog.memory_middleware)
+
 # Create necessary directories
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("audio", exist_ok=True)
+os.makedirs(tts_jobs.JOBS_AUDIO_DIR, exist_ok=True)
 
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="uploads"), name="static")
 
-# Initialize TTS models and tokenizers globally
-device = "cuda:0" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
+# Take this worker's share of the cores before any model is loaded
+thread_allocation = thread_budget.configure()
+
+# The TTS model lives in tts_engine so the background job workers can share it
+print(f"Using device: {tts_engine.device}")
+
+# Models are loaded on demand and unloaded least-recently-used when the memory
+# budget would be exceeded; models listed in DRISHTI_HOT_MODELS are never unloaded
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("DRISHTI_MODEL_MEMORY_MB", "6144"))
+HOT_MODELS = [name for name in os.environ.get("DRISHTI_HOT_MODELS", "tts,ocr:kn").split(",") if name]
+OCR_LANGUAGES = [lang for lang in os.environ.get("DRISHTI_OCR_LANGUAGES", "kn,en,hi,ta,te").split(",") if lang]
+# Besides the served checkpoint and those in the model cache, the TTS checkpoints and OCR weight
+# directories that /admin/models/{name}/swap may load
+SWAP_TTS_CHECKPOINTS = [c for c in os.environ.get("DRISHTI_SWAP_TTS_CHECKPOINTS", "").split(",") if c]
+SWAP_OCR_DIRECTORIES = [d for d in os.environ.get("DRISHTI_SWAP_OCR_DIRECTORIES", "").split(",") if d]
+DEFAULT_OCR_LANGUAGE = "kn"
 
-tts_model = None
-tts_tokenizer = None
-description_tokenizer = None
+models = ModelResidencyManager(MODEL_MEMORY_BUDGET_MB * 1024 * 1024, hot=HOT_MODELS)
+
+# With DRISHTI_OCR_PROCESSES=N, OCR runs in N worker processes that read the
+# decoded images from shared memory; otherwise it runs in this process.
+OCR_PROCESSES = int(os.environ.get("DRISHTI_OCR_PROCESSES", "0"))
+# Seconds a request waits for a free shared-memory slot before getting a 503
+SLOT_WAIT_TIMEOUT = float(os.environ.get("DRISHTI_SLOT_WAIT_SECONDS", "10"))
+ocr_pool = None
+if OCR_PROCESSES:
+    ocr_pool = OCRProcessPool(
+        OCR_PROCESSES,
+        # Anything larger is tiled, so every untiled image fits a slot as 8-bit BGR
+        slot_bytes=int(tiled_ocr.AUTO_TILE_MEGAPIXELS * 1e6) * 3,
+        threads=max(1, thread_allocation["services"].get("ocr", 1) // OCR_PROCESSES),
+    )
+
+# Batch color detection runs in a process pool sized to this worker's cores
+COLOR_PROCESSES = int(os.environ.get("DRISHTI_COLOR_PROCESSES", "0")) or len(thread_allocation["cpus"])
+MAX_COLOR_BATCH = 200
+COLOR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+color_pool = None
+
+# One inference queue per model. TTS cost is measured in characters and OCR
+# cost in megapixels; aging lets a long job overtake newer short ones after a while.
+# Each queue's inference thread uses its service's share of the worker's threads.
+tts_scheduler = InferenceScheduler(
+    "tts", aging_rate=20.0, priority_weight=200.0, initializer=thread_budget.service_initializer("tts")
+)
+ocr_scheduler = InferenceScheduler(
+    "ocr", workers=max(1, OCR_PROCESSES), aging_rate=1.0, priority_weight=10.0,
+    initializer=thread_budget.service_initializer("ocr")
+)
+# OCR settings step down as the OCR queue or its latency grows
+ocr_quality_controller = ocr_quality.QualityController(lambda: ocr_scheduler.queue_depth)
+# Synthesized audio per (sentence, voice, model version), shared by workers on this host
+tts_audio_cache = tts_cache.SentenceAudioCache()
+# Identical OCR and TTS requests that arrive while one is running share its result
+ocr_flights = SingleFlight("ocr")
+tts_flights = SingleFlight("tts")
+# Seconds to wait for queued inference when the server shuts down
+SHUTDOWN_DRAIN_TIMEOUT = 120
 
 # =============== Helper Functions ===============
 
-def load_tts_models():
-    """Initialize TTS models if not already loaded"""
-    global tts_model, tts_tokenizer, description_tokenizer
-    if tts_model is None:
-        print("Loading TTS models and tokenizers...")
-        tts_model = ParlerTTSForConditionalGeneration.from_pretrained("ai4bharat/indic-parler-tts").to(device)
-        tts_tokenizer = AutoTokenizer.from_pretrained("ai4bharat/indic-parler-tts")
-        description_tokenizer = AutoTokenizer.from_pretrained(tts_model.config.text_encoder._name_or_path)
+def ocr_model_name(lang):
+    return f"ocr:{lang}"
+
+def load_ocr_reader(lang, model_storage_directory=None, recog_network="standard"):
+    """Create an EasyOCR reader for one language, from the model cache when it has one"""
+    print(f"Loading EasyOCR reader for '{lang}'...")
+    options = {"model_storage_directory": model_storage_directory, "download_enabled": False}
+    if model_storage_directory is None:
+        options = model_cache.ocr_reader_options(lang)
+    with model_load_timer(ocr_model_name(lang)):
+        return easyocr.Reader([lang], recog_network=recog_network, **options)
+
+def swap_allowed_tts_checkpoint(checkpoint):
+    """Only configured checkpoints or ones already in the model cache may be swapped in"""
+    return (checkpoint == tts_engine.TTS_CHECKPOINT or checkpoint in SWAP_TTS_CHECKPOINTS
+            or model_cache.ready_artifact(model_cache.tts_artifact_dir(checkpoint, tts_engine.TTS_DTYPE)) is not None)
+
+def swap_allowed_ocr_directory(directory):
+    allowed = [model_cache.ocr_artifact_dir()] + SWAP_OCR_DIRECTORIES
+    return os.path.realpath(directory) in {os.path.realpath(d) for d in allowed}
+
+@asynccontextmanager
+async def use_model(name):
+    """
+    models.use_entry for async handlers. Loading a model that was unloaded
+    takes seconds, so it runs in the threadpool instead of blocking the event loop.
+    """
+    use = models.use_entry(name)
+    enter = asyncio.ensure_future(run_in_threadpool(use.__enter__))
+    try:
+        entry = await asyncio.shield(enter)
+    except asyncio.CancelledError:
+        # The load still finishes in its thread; release the model once it has
+        enter.add_done_callback(lambda f: f.cancelled() or f.exception() or use.__exit__(None, None, None))
+        raise
+    try:
+        yield entry
+    finally:
+        # Released even if the request is cancelled, so the model does not stay pinned
+        await asyncio.shield(run_in_threadpool(use.__exit__, None, None, None))
+
+@asynccontextmanager
+async def live_ocr_reader(lang):
+    """
+    The reader for a live OCR session. With worker processes, frames are read
+    there, so sessions on different scheduler threads never share a reader and
+    this process keeps no model of its own; otherwise the resident reader.
+    """
+    if ocr_pool is not None:
+        yield PooledReader(ocr_pool, lang, SLOT_WAIT_TIMEOUT)
+    else:
+        async with use_model(ocr_model_name(lang)) as entry:
+            yield entry.model
+
+def unload_tts(model):
+    tts_engine.unload_tts_models()
+
+def warm_up_tts(bundle):
+    """Run one short synthesis so the first request does not pay for lazy initialization"""
+    with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+        tts_engine.synthesize_speech("ನಮಸ್ಕಾರ", tts_engine.DEFAULT_VOICE_DESCRIPTION, f.name, bundle=bundle)
+
+def warm_up_ocr(reader):
+    """Run detection and recognition once on a small synthetic line of text"""
+    image = np.full((64, 320, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "DRISHTI 2024", (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    reader.readtext(image)
+
+# Versions reported with responses until an admin swaps a model
+DEFAULT_TTS_VERSION = tts_engine.TTS_CHECKPOINT
+DEFAULT_OCR_VERSION = f"easyocr-{easyocr.__version__}"
+
+models.register("tts", tts_engine.load_tts_models, unload_tts, version=DEFAULT_TTS_VERSION)
+for _lang in OCR_LANGUAGES:
+    models.register(ocr_model_name(_lang), lambda lang=_lang: load_ocr_reader(lang), version=DEFAULT_OCR_VERSION)
+
+def scheduling_options(http_request: Request):
+    """Read priority and deadline headers for the inference scheduler"""
+    options = {"is_disconnected": http_request.is_disconnected}
+    try:
+        options["priority"] = max(-5, min(5, int(http_request.headers.get("x-priority", "0"))))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Priority must be an integer")
+    deadline_ms = http_request.headers.get("x-deadline-ms")
+    if deadline_ms is not None:
+        try:
+            options["deadline"] = time.monotonic() + float(deadline_ms) / 1000.0
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Deadline-Ms must be a number")
+    return options
+
+async def run_inference(scheduler, fn, cost, http_request: Request = None, priority=0, watch_disconnect=True):
+    """
+    Run fn(token) on an inference scheduler and map cancellation to HTTP errors.
+
+    With watch_disconnect=False the client's disconnect and deadline are left
+    to the caller, as when the work is shared by coalesced requests that each
+    have their own.
+    """
+    options = {"priority": priority}
+    if http_request is not None:
+        options.update(scheduling_options(http_request))
+        if not watch_disconnect:
+            del options["is_disconnected"]
+            options.pop("deadline", None)
+    try:
+        return await scheduler.run(fn, cost=cost, **options)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Deadline exceeded before inference finished")
+    except JobCancelled:
+        raise HTTPException(status_code=499, detail="Client closed request")
 
 def cleanup_old_files(directory="audio", max_files=10):
     """Clean up old audio files, keeping only the most recent ones"""
@@ -81,27 +277,7 @@ def average_image_color(image_path):
     """Get the average color of an image."""
     try:
         img = Image.open(image_path)
-        img = img.resize((100, 100))
-        pixels = img.getdata()
-        total_r = 0
-        total_g = 0
-        total_b = 0
-        count = 0
-
-        for pixel in pixels:
-            if isinstance(pixel, tuple) and len(pixel) >= 3:
-                total_r += pixel[0]
-                total_g += pixel[1]
-                total_b += pixel[2]
-                count += 1
-
-        if count > 0:
-            avg_r = int(total_r / count)
-            avg_g = int(total_g / count)
-            avg_b = int(total_b / count)
-            return {"success": True, "color": (avg_r, avg_g, avg_b)}
-        else:
-            return {"success": False, "error": "Could not process image pixels"}
+        return color_workers.average_color(img)
 
     except FileNotFoundError:
         return {"success": False, "error": f"Image file not found at {image_path}"}
@@ -147,27 +323,227 @@ def get_color_name(hue):
     color_index = int(hue / 40) % 9
     return colors[color_index]
 
-async def perform_ocr(image_data: bytes):
-    """Perform OCR on the given image data"""
+def describe_color(rgb):
+    """The /detect-color response for an average RGB color"""
+    hsi_result = rgb_to_hsi(rgb)
+    
+    if not hsi_result["success"]:
+        raise HTTPException(status_code=500, detail=hsi_result.get("error", "Error converting to HSI"))
+    
+    hsi = hsi_result["color"]
+    
+    color_name = get_color_name(hsi[0])
+    
+    return {
+        "rgb": {
+            "r": rgb[0],
+            "g": rgb[1],
+            "b": rgb[2]
+        },
+        "hsi": {
+            "h": hsi[0],
+            "s": hsi[1],
+            "i": hsi[2]
+        },
+        "color_name": color_name,
+        "hex_code": f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
+    }
+
+def get_color_pool():
+    """Process pool for batch color detection, started on first use"""
+    global color_pool
+    if color_pool is None:
+        color_pool = color_workers.make_pool(COLOR_PROCESSES)
+    return color_pool
+
+async def acquire_ocr_slot(timeout=SLOT_WAIT_TIMEOUT):
+    """Lease a shared-memory slot for an OCR image; 503 if none frees up within timeout seconds"""
+    ring = ocr_pool.ring
+    with stage("slot_wait"):
+        acquire = asyncio.ensure_future(run_in_threadpool(ring.acquire, timeout))
+        try:
+            return await asyncio.shield(acquire)
+        except SlotTimeout:
+            raise HTTPException(status_code=503, detail="OCR workers are busy, try again shortly")
+        except asyncio.CancelledError:
+            # The wait still finishes in its thread; give the slot back once it has
+            acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or ring.release(f.result()))
+            raise
+
+async def ocr_in_worker_process(image, lang, options, megapixels, http_request: Request = None, watch_disconnect=True,
+                                method="readtext", slot=None):
+    """
+    Run OCR (or another OCRProcessPool method) in a worker process, handing the image over through shared memory.
+
+    A slot already leased for the image may be passed in; it is released with the job.
+    """
+    ring = ocr_pool.ring
+    if slot is None:
+        if not ring.fits(image.shape, image.dtype):
+            raise HTTPException(status_code=413, detail="Image too large")
+        slot = await acquire_ocr_slot()
+    handoff = SlotHandoff(ring, slot)
+    try:
+        shape, dtype = ring.write(slot, image)
+
+        def readtext(token):
+            if not handoff.start():
+                raise JobCancelled("Request abandoned")
+            try:
+                with stage("inference"):
+                    return getattr(ocr_pool, method)(slot, shape, dtype, lang, options)
+            finally:
+                handoff.finish()
+
+        return await run_inference(ocr_scheduler, readtext, megapixels, http_request, watch_disconnect=watch_disconnect)
+    finally:
+        handoff.abandon()
+
+async def tiled_readtext(image, lang, options, http_request: Request = None, watch_disconnect=True):
+    """Read a large image as overlapping full-resolution tiles; returns (results, tile count, model version)"""
+    tiles = tiled_ocr.make_tiles(image.shape)
+    options = dict(options, canvas_size=tiled_ocr.TILE_SIZE)
+    if ocr_pool is not None:
+        # Each tile is its own job, so the worker processes read tiles in parallel. Only the
+        # first slot can time out: once the request is running, its other tiles wait their
+        # turn, at most one per slot, rather than failing a scan that is partly read.
+        leased = [await acquire_ocr_slot()]
+        window = asyncio.Semaphore(ocr_pool.ring.slots)
+
+        async def read_tile(tile):
+            async with window:
+                slot = leased.pop() if leased else await acquire_ocr_slot(timeout=None)
+                x0, y0, x1, y1 = tile
+                crop = image[y0:y1, x0:x1]
+                megapixels = crop.shape[0] * crop.shape[1] / 1e6
+                return tile, await ocr_in_worker_process(
+                    crop, lang, options, megapixels, http_request, watch_disconnect, slot=slot
+                )
+
+        try:
+            tile_results = await asyncio.gather(*(read_tile(tile) for tile in tiles))
+        finally:
+            for slot in leased:
+                ocr_pool.ring.release(slot)
+        version = DEFAULT_OCR_VERSION
+    else:
+        # One reader cannot be shared between threads, so tiles are read in turn
+        async with use_model(ocr_model_name(lang)) as entry:
+            reader, version = entry.model, entry.version
+            def read_tiles(token):
+                tile_results = []
+                with stage("inference"):
+                    for x0, y0, x1, y1 in tiles:
+                        token.check()
+                        tile_results.append(((x0, y0, x1, y1), reader.readtext(image[y0:y1, x0:x1], **options)))
+                return tile_results
+
+            megapixels = image.shape[0] * image.shape[1] / 1e6
+            tile_results = await run_inference(
+                ocr_scheduler, read_tiles, megapixels, http_request, watch_disconnect=watch_disconnect
+            )
+    with stage("merge"):
+        return tiled_ocr.merge(tile_results, image.shape), len(tiles), version
+
+async def triage_frame(image, lang, http_request: Request = None, watch_disconnect=True, detect_text=True):
+    """Reject blurred, badly exposed and text-free images before full OCR; returns a retake response or None"""
+    with stage("triage"):
+        scores = await run_in_threadpool(triage.image_scores, image)
+    reason = triage.quality_reason(scores)
+    if reason is None and detect_text:
+        # Detection alone at low resolution is a fraction of a full readtext pass
+        small = ocr_quality.downscale(image, triage.TEXT_CANVAS)
+        megapixels = small.shape[0] * small.shape[1] / 1e6
+        options = {"canvas_size": triage.TEXT_CANVAS}
+        if ocr_pool is not None:
+            boxes = await ocr_in_worker_process(
+                small, lang, options, megapixels, http_request, watch_disconnect, method="count_text_boxes"
+            )
+        else:
+            async with use_model(ocr_model_name(lang)) as entry:
+                def detect(token):
+                    with stage("triage_detect"):
+                        return triage.count_text_boxes(entry.model, small, **options)
+
+                boxes = await run_inference(
+                    ocr_scheduler, detect, megapixels, http_request, watch_disconnect=watch_disconnect
+                )
+        scores["text_boxes"] = boxes
+        if boxes == 0:
+            reason = "no_text"
+    if reason is None:
+        return None
+    TRIAGE_RETAKES.labels(reason).inc()
+    TRIAGE_AVOIDED_MEGAPIXELS.inc(image.shape[0] * image.shape[1] / 1e6)
+    return triage.retake(reason, scores)
+
+async def perform_ocr(image_data: bytes, http_request: Request = None, lang: str = DEFAULT_OCR_LANGUAGE,
+                      watch_disconnect=True, tiled=False, run_triage=True):
+    """
+    Perform OCR on the given image data.
+
+    Returns:
+        Dict with the text, the quality tier used, the number of tiles read and
+        the model version that read them, or a retake response from triage
+    """
     try:
         # Convert bytes to numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with stage("decode"):
+            nparr = np.frombuffer(image_data, np.uint8)
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image format")
             
-        # Initialize EasyOCR reader for Kannada
-        reader = easyocr.Reader(['kn'])
+        megapixels = image.shape[0] * image.shape[1] / 1e6
+        tiled = tiled or megapixels > tiled_ocr.AUTO_TILE_MEGAPIXELS
+        if run_triage:
+            # Small print on a large scan is invisible to the low-resolution detector
+            retake = await triage_frame(image, lang, http_request, watch_disconnect, detect_text=not tiled)
+            if retake is not None:
+                return retake
         
-        # Perform OCR
-        results = reader.readtext(image)
+        # Cheaper settings when the OCR service is under load. Triage is left out of the
+        # latency the tiers are chosen by.
+        tier = ocr_quality_controller.choose()
+        start = time.perf_counter()
+        tiles = 1
+        # Worker processes always load the default reader
+        version = DEFAULT_OCR_VERSION
+        if tiled:
+            # Tiles keep full resolution so small glyphs stay readable
+            results, tiles, version = await tiled_readtext(image, lang, tier["readtext"], http_request, watch_disconnect)
+        elif ocr_pool is not None:
+            image = ocr_quality.downscale(image, tier["max_side"])
+            megapixels = image.shape[0] * image.shape[1] / 1e6
+            results = await ocr_in_worker_process(
+                image, lang, tier["readtext"], megapixels, http_request, watch_disconnect
+            )
+        else:
+            image = ocr_quality.downscale(image, tier["max_side"])
+            megapixels = image.shape[0] * image.shape[1] / 1e6
+            # Get the EasyOCR reader for the language, loading it if it is not resident
+            async with use_model(ocr_model_name(lang)) as entry:
+                reader, version = entry.model, entry.version
+                # Perform OCR
+                def readtext(token):
+                    with stage("inference"):
+                        return reader.readtext(image, **tier["readtext"])
+
+                results = await run_inference(
+                    ocr_scheduler, readtext, megapixels, http_request, watch_disconnect=watch_disconnect
+                )
         
         # Extract text
         text = ' '.join([result[1] for result in results])
+        if not tiled:
+            # A tiled scan's latency grows with its size, not with the load
+            ocr_quality_controller.observe(time.perf_counter() - start, tier["name"])
         
-        return text
+        return {"text": text, "quality_tier": tier["name"], "tiles": tiles, "model_version": version}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during OCR: {str(e)}")
 
@@ -175,7 +551,19 @@ async def perform_ocr(image_data: bytes):
 
 class TTSRequest(BaseModel):
     text: str
-    voice_description: str = "Anu's voice is monotone yet slightly clear in delivery, with a very close recording that almost has no background noise."
+    voice_description: str = tts_engine.DEFAULT_VOICE_DESCRIPTION
+
+class ModelSwapRequest(BaseModel):
+    version: str
+    # TTS: Hugging Face id or local directory of a Parler checkpoint
+    checkpoint: Optional[str] = None
+    # OCR: where the EasyOCR weights are, and which recognition network to use
+    model_storage_directory: Optional[str] = None
+    recog_network: str = "standard"
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float = 0.0
+    mode: str = "sampling"
 
 # =============== API Routes ===============
 
@@ -187,50 +575,181 @@ async def read_root():
         "services": ["color-detection", "ocr", "tts"]
     }
 
+def outstanding_work():
+    """Queued and running inference jobs per service"""
+    return {"color": 0, "ocr": ocr_scheduler.outstanding, "tts": tts_scheduler.outstanding}
+
+def recent_latency():
+    """p95 seconds from queueing to completion per service over the last minute, None when idle"""
+    return {"ocr": ocr_scheduler.latency_p95(), "tts": tts_scheduler.latency_p95()}
+
+@app.get("/health")
+async def health():
+    """Liveness, capabilities and load, used by the gateway and the autoscaler"""
+    body = {
+        "status": "draining" if memory_watchdog.state["draining"] else "ok",
+        "capabilities": gateway_client.CAPABILITIES,
+        "outstanding": outstanding_work(),
+        "latency_p95": recent_latency(),
+    }
+    # A draining worker is about to restart; take it out of rotation
+    return JSONResponse(body, status_code=503 if memory_watchdog.state["draining"] else 200)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    asyncio.create_task(monitor_event_loop_lag())
+    asyncio.create_task(ocr_quality.track_tier_time(ocr_quality_controller))
+    if gateway_client.GATEWAY_URL:
+        asyncio.create_task(gateway_client.heartbeat_loop(
+            outstanding_work, lambda: memory_watchdog.state["draining"]
+        ))
+    asyncio.create_task(memory_watchdog.watch(drain_schedulers))
+
+async def drain_schedulers():
+    """Wait for queued and running inference to finish"""
+    for scheduler in (ocr_scheduler, tts_scheduler):
+        if scheduler.outstanding:
+            print(f"Draining {scheduler.outstanding} {scheduler.name} jobs...")
+            await run_in_threadpool(scheduler.drain, SHUTDOWN_DRAIN_TIMEOUT)
+
+@app.on_event("shutdown")
+async def drain_inference():
+    """Let queued and running inference finish before the worker exits"""
+    await drain_schedulers()
+    if ocr_pool is not None:
+        await run_in_threadpool(ocr_pool.shutdown)
+    if color_pool is not None:
+        color_pool.shutdown(wait=False)
+
+# Admin Endpoints
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling():
+    """Current profiling settings and the saved profiles"""
+    return {"settings": profiling.settings, "profiles": profiling.list_profiles()}
+
+@app.post("/admin/profiling", dependencies=[Depends(require_admin)])
+async def set_profiling(settings: ProfilingSettings):
+    """Change the profiling sample rate and profiler"""
+    if not 0.0 <= settings.sample_rate <= 1.0:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    if settings.mode not in profiling.PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {profiling.PROFILE_MODES}")
+    profiling.settings.update(sample_rate=settings.sample_rate, mode=settings.mode)
+    return {"settings": profiling.settings}
+
+@app.get("/admin/profiling/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    """Download a saved profile"""
+    path = os.path.join(profiling.PROFILE_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(name))
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+async def get_models():
+    """Resident models, their memory use and the budget"""
+    return models.stats()
+
+@app.post("/admin/models/{name}/unload", dependencies=[Depends(require_admin)])
+async def unload_model(name: str):
+    """Unload a model now; it is loaded again on next use"""
+    if not models.is_registered(name):
+        raise HTTPException(status_code=404, detail="Unknown model")
+    return {"model": name, "unloaded": await run_in_threadpool(models.unload, name)}
+
+@app.post("/admin/models/{name}/swap", dependencies=[Depends(require_admin)])
+async def swap_model(name: str, request: ModelSwapRequest):
+    """
+    Load and warm up a new model version next to the current one, then switch
+    new requests to it. In-flight requests finish on the old version, which is
+    unloaded afterwards.
+    """
+    if not models.is_registered(name):
+        raise HTTPException(status_code=404, detail="Unknown model")
+    if name == "tts":
+        checkpoint = request.checkpoint or tts_engine.TTS_CHECKPOINT
+        if not swap_allowed_tts_checkpoint(checkpoint):
+            raise HTTPException(status_code=403,
+                                detail="Checkpoint is not in the model cache or DRISHTI_SWAP_TTS_CHECKPOINTS")
+        loader, warm_up = (lambda: tts_engine.load_tts_bundle(checkpoint)), warm_up_tts
+    else:
+        if ocr_pool is not None:
+            raise HTTPException(status_code=409,
+                                detail="OCR runs in worker processes; restart them to change the model")
+        directory = request.model_storage_directory
+        if directory is not None and not swap_allowed_ocr_directory(directory):
+            raise HTTPException(status_code=403,
+                                detail="Directory is not the model cache or in DRISHTI_SWAP_OCR_DIRECTORIES")
+        if not re.fullmatch(r"[\w-]+", request.recog_network):
+            raise HTTPException(status_code=400, detail="Invalid recog_network")
+        lang = name.split(":", 1)[1]
+        loader = lambda: load_ocr_reader(lang, directory, request.recog_network)
+        warm_up = warm_up_ocr
+    try:
+        return await run_in_threadpool(models.swap, name, loader, request.version, warmup=warm_up)
+    except Exception as e:
+        print(f"Swapping {name} to {request.version} failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Swap failed, still serving the current version: {e}")
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def get_memory():
+    """This worker's RSS, its limit and the endpoints that grew it most"""
+    return memory_watchdog.stats()
+
+@app.post("/admin/memory/snapshot", dependencies=[Depends(require_admin)])
+async def memory_snapshot(kind: str = "tracemalloc"):
+    """Capture a tracemalloc snapshot or a census of live torch tensors"""
+    if kind == "tracemalloc":
+        return await run_in_threadpool(memory_watchdog.tracemalloc_snapshot, profiling.PROFILE_DIR)
+    if kind == "tracemalloc_stop":
+        memory_watchdog.stop_tracemalloc()
+        return {"status": "tracing_stopped"}
+    if kind == "torch":
+        return await run_in_threadpool(memory_watchdog.torch_snapshot, profiling.PROFILE_DIR)
+    raise HTTPException(status_code=400, detail="kind must be tracemalloc, tracemalloc_stop or torch")
+
+@app.post("/admin/memory/recycle", dependencies=[Depends(require_admin)])
+async def recycle_worker():
+    """Drain this worker and restart it"""
+    if memory_watchdog.state["draining"]:
+        return {"status": "draining"}
+    asyncio.create_task(memory_watchdog.recycle(drain_schedulers, "requested by admin"))
+    return {"status": "draining", "pid": os.getpid()}
+
+@app.get("/admin/threads", dependencies=[Depends(require_admin)])
+async def get_threads():
+    """This worker's CPUs and thread counts"""
+    return thread_allocation
+
 # Color Detection Endpoints
 @app.post("/detect-color")
 async def detect_color(file: UploadFile = File(...)):
     """Detect the average color of an uploaded image"""
-    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')):
+    record_upload_stage()
+    if not file.filename.lower().endswith(COLOR_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Unsupported file format")
     
     temp_file = tempfile.NamedTemporaryFile(delete=False)
     
     try:
-        shutil.copyfileobj(file.file, temp_file)
-        temp_file_path = temp_file.name
-        temp_file.close()
+        with stage("disk_write"):
+            shutil.copyfileobj(file.file, temp_file)
+            temp_file_path = temp_file.name
+            temp_file.close()
         
-        color_result = average_image_color(temp_file_path)
+        with stage("decode_reduce"):
+            color_result = average_image_color(temp_file_path)
         
         if not color_result["success"]:
             raise HTTPException(status_code=500, detail=color_result.get("error", "Error processing image"))
         
-        rgb = color_result["color"]
-        
-        hsi_result = rgb_to_hsi(rgb)
-        
-        if not hsi_result["success"]:
-            raise HTTPException(status_code=500, detail=hsi_result.get("error", "Error converting to HSI"))
-        
-        hsi = hsi_result["color"]
-        
-        color_name = get_color_name(hsi[0])
-        
-        return {
-            "rgb": {
-                "r": rgb[0],
-                "g": rgb[1],
-                "b": rgb[2]
-            },
-            "hsi": {
-                "h": hsi[0],
-                "s": hsi[1],
-                "i": hsi[2]
-            },
-            "color_name": color_name,
-            "hex_code": f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
-        }
+        return describe_color(color_result["color"])
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
@@ -239,69 +758,260 @@ async def detect_color(file: UploadFile = File(...)):
         if os.path.exists(temp_file.name):
             os.unlink(temp_file.name)
 
+@app.post("/detect-color/batch")
+async def detect_color_batch(files: List[UploadFile] = File(...)):
+    """Detect the average color of many images, spread across a process pool"""
+    record_upload_stage()
+    if len(files) > MAX_COLOR_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COLOR_BATCH} images per batch")
+    
+    results = [None] * len(files)
+    images, positions = [], []
+    for i, file in enumerate(files):
+        if not file.filename.lower().endswith(COLOR_EXTENSIONS):
+            results[i] = {"filename": file.filename, "error": "Unsupported file format"}
+            continue
+        images.append(await file.read())
+        positions.append(i)
+    
+    with stage("decode_reduce"):
+        colors = await asyncio.get_running_loop().run_in_executor(
+            None, color_workers.average_colors, get_color_pool(), images, COLOR_PROCESSES
+        )
+    
+    for i, color_result in zip(positions, colors):
+        if color_result["success"]:
+            results[i] = {"filename": files[i].filename, **describe_color(color_result["color"])}
+        else:
+            results[i] = {"filename": files[i].filename, "error": color_result.get("error", "Error processing image")}
+    
+    return {"results": results}
+
 # OCR Endpoints
 @app.post("/ocr/")
-async def ocr_endpoint(file: UploadFile = File(...)):
-    """Perform OCR on uploaded images"""
+async def ocr_endpoint(http_request: Request, file: UploadFile = File(...), lang: str = DEFAULT_OCR_LANGUAGE,
+                       tiled: bool = False, skip_triage: bool = False):
+    """
+    Perform OCR on uploaded images; tiled=true reads large scans in full-resolution tiles.
+
+    Blurred, badly exposed or text-free photos get status "retake" with a
+    reason instead of a full OCR pass, unless skip_triage=true.
+    """
+    record_upload_stage()
+    if lang not in OCR_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language '{lang}', expected one of {OCR_LANGUAGES}")
     try:
         contents = await file.read()
         if not contents:
             raise HTTPException(status_code=400, detail="Empty file")
         
-        extracted_text = await perform_ocr(contents)
+        # A repeat of an upload that is still being read shares its result. The work runs at
+        # the priority in the key and each request waits only until its own deadline.
+        options = scheduling_options(http_request)
+        result = await ocr_flights.do(
+            content_key(contents, lang, tiled, skip_triage, options["priority"]),
+            lambda: perform_ocr(
+                contents, http_request, lang, watch_disconnect=False, tiled=tiled, run_triage=not skip_triage
+            ),
+            http_request.is_disconnected,
+            options.get("deadline"),
+        )
         
+        # A retake from triage carries its own status
         return {
             "status": "success",
-            "text": extracted_text
+            **result
         }
         
+    except HTTPException:
+        raise
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Deadline exceeded before inference finished")
+    except JobCancelled:
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/ocr/live")
+async def live_ocr_endpoint(websocket: WebSocket):
+    """
+    Live OCR over a WebSocket.
+
+    The client sends encoded camera frames as binary messages. Only the newest
+    frame is processed when frames arrive faster than they can be handled, and
+    an update is pushed whenever a region's text changes or a region disappears.
+    """
+    await websocket.accept()
+    latest = {"frame": None}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        while True:
+            latest["frame"] = await websocket.receive_bytes()
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        # Hold the reader for the whole session
+        async with live_ocr_reader(DEFAULT_OCR_LANGUAGE) as reader:
+            session = LiveOCRSession(reader)
+            while True:
+                ready = asyncio.create_task(frame_ready.wait())
+                done, _ = await asyncio.wait({ready, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if receiver in done:
+                    ready.cancel()
+                    receiver.result()  # Re-raises WebSocketDisconnect
+                frame_ready.clear()
+                data, latest["frame"] = latest["frame"], None
+                if data is None:
+                    continue
+
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    await websocket.send_json({"type": "error", "detail": "Invalid image format"})
+                    continue
+
+                # Live frames are small and latency-sensitive, so they go ahead of uploads
+                try:
+                    update = await run_inference(
+                        ocr_scheduler,
+                        lambda token, image=image: session.process_frame(image),
+                        image.shape[0] * image.shape[1] / 1e6,
+                        priority=-1,
+                    )
+                except SlotTimeout:
+                    await websocket.send_json({"type": "error", "detail": "OCR workers are busy"})
+                    continue
+                if update is not None:
+                    await websocket.send_json(update)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
 # TTS Endpoints
 @app.post("/tts/")
-async def text_to_speech(request: TTSRequest):
+async def text_to_speech(request: TTSRequest, http_request: Request = None):
     """Convert Kannada text to speech"""
+    record_upload_stage()
     try:
-        # Ensure models are loaded
-        if tts_model is None:
-            load_tts_models()
+        async def synthesize():
+            # Generate unique filename using timestamp
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            output_path = f"audio/tts_output_{timestamp}.wav"
             
-        print(f"Converting text to speech: {request.text}")
-        
-        # Generate unique filename using timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        output_path = f"audio/tts_output_{timestamp}.wav"
-        
-        # Prepare inputs
-        description_input_ids = description_tokenizer(request.voice_description, return_tensors="pt").to(device)
-        prompt_input_ids = tts_tokenizer(request.text, return_tensors="pt").to(device)
+            # Queue the synthesis of the sentences not in the audio cache; shorter
+            # work is scheduled first. The model is loaded if needed and kept
+            # resident until the synthesis is done.
+            async with use_model("tts") as entry:
+                units = tts_audio_cache.plan(request.text, request.voice_description, entry.version)
+
+                def synthesize_unit(sentence, path, token):
+                    tts_engine.synthesize_speech(sentence, request.voice_description, path, token, bundle=entry.model)
+
+                result = await run_inference(
+                    tts_scheduler,
+                    lambda token: tts_audio_cache.render(units, output_path, synthesize_unit, token),
+                    sum(len(unit.sentence) for unit in units if not unit.cached),
+                    http_request,
+                    watch_disconnect=False
+                )
+            return output_path, timestamp, entry.version, result["hits"] / result["units"]
         
-        # Generate audio
-        print("Generating audio...")
-        generation = tts_model.generate(
-            input_ids=description_input_ids.input_ids,
-            attention_mask=description_input_ids.attention_mask,
-            prompt_input_ids=prompt_input_ids.input_ids,
-            prompt_attention_mask=prompt_input_ids.attention_mask
+        # Identical text and voice already being synthesized at the same priority shares that
+        # audio; each request waits only until its own deadline
+        options = scheduling_options(http_request) if http_request is not None else {"priority": 0}
+        output_path, timestamp, version, hit_ratio = await tts_flights.do(
+            content_key(tts_jobs.dedup_key(request.text, request.voice_description), options["priority"]),
+            synthesize,
+            options.get("is_disconnected"),
+            options.get("deadline"),
         )
         
-        # Convert to audio array and save
-        audio_arr = generation.cpu().numpy().squeeze()
-        sf.write(output_path, audio_arr, tts_model.config.sampling_rate)
-        
         # Clean up old files
-        cleanup_old_files()
+        with stage("disk_cleanup"):
+            cleanup_old_files()
         
         return FileResponse(
             output_path,
             media_type="audio/wav",
-            filename=f"tts_output_{timestamp}.wav"
+            filename=f"tts_output_{timestamp}.wav",
+            headers={"X-Model-Version": version, "X-TTS-Cache-Hit-Ratio": f"{hit_ratio:.2f}"}
         )
         
+    except HTTPException:
+        raise
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Deadline exceeded before inference finished")
+    except JobCancelled:
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during TTS conversion: {str(e)}")
 
+# Asynchronous TTS Jobs
+JOB_EVENTS_POLL_INTERVAL = 0.5
+
+@app.post("/tts/jobs", status_code=202)
+async def create_tts_job(request: TTSRequest):
+    """Queue text for synthesis by the TTS workers and return a job id"""
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Empty text")
+    # SQLite waits up to 30 s for a busy database, so it is kept off the event loop
+    row, created = await run_in_threadpool(tts_jobs.submit_job, request.text, request.voice_description)
+    job = tts_jobs.job_to_dict(row)
+    job["deduplicated"] = not created
+    return job
+
+@app.get("/tts/jobs/{job_id}")
+async def get_tts_job(job_id: str):
+    """Status of a TTS job"""
+    row = await run_in_threadpool(tts_jobs.read_job, job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return tts_jobs.job_to_dict(row)
+
+@app.get("/tts/jobs/{job_id}/audio")
+async def get_tts_job_audio(job_id: str):
+    """Audio of a completed TTS job"""
+    row = await run_in_threadpool(tts_jobs.read_job, job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if row["status"] != tts_jobs.DONE or not os.path.exists(row["result_path"]):
+        raise HTTPException(status_code=409, detail=f"Job is {row['status']}")
+    return FileResponse(row["result_path"], media_type="audio/wav", filename=f"tts_{job_id}.wav")
+
+@app.get("/tts/jobs/{job_id}/events")
+async def tts_job_events(job_id: str, http_request: Request):
+    """Server-sent events with the job status until it finishes"""
+    if await run_in_threadpool(tts_jobs.read_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while not await http_request.is_disconnected():
+            job = tts_jobs.job_to_dict(await run_in_threadpool(tts_jobs.read_job, job_id))
+            if job is None:
+                yield "event: error\ndata: {\"detail\": \"Job expired\"}\n\n"
+                return
+            if job != last:
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+                last = job
+            if job["status"] in tts_jobs.FINISHED_STATES:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Deterministic stand-in models for load tests: DRISHTI_STUB_MODELS=1
+if os.environ.get("DRISHTI_STUB_MODELS") == "1":
+    from stub_models import install_stub_models
+    install_stub_models(
+        sys.modules[__name__],
+        ocr_seconds_per_megapixel=float(os.environ.get("DRISHTI_STUB_OCR_SECONDS_PER_MP", "0.5")),
+        tts_seconds_per_token=float(os.environ.get("DRISHTI_STUB_TTS_SECONDS_PER_TOKEN", "0.01")),
+    )
+    print("Using stub models")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8020)
\ No newline at end of file
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Access control for the /admin endpoints."""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Admin endpoints and admin-only request headers require this token; without it they are disabled
+ADMIN_TOKEN = os.environ.get("DRISHTI_ADMIN_TOKEN")
+
+
+def is_admin_token(token):
+    """Check a token against DRISHTI_ADMIN_TOKEN; nothing is allowed when it is unset"""
+    if not ADMIN_TOKEN:
+        return False
+    # Bytes, since compare_digest refuses str with non-ASCII characters
+    return token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """FastAPI dependency guarding admin endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set DRISHTI_ADMIN_TOKEN to enable them")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local autoscaler for OCR and TTS worker processes.
+
+A fixed number of workers leaves the node idle at night and overloaded during
+school hours. This supervisor runs the routing gateway (gateway.py) on the
+public port and starts Backend.py workers behind it, each serving one service:
+OCR workers (which also take color detection) and TTS workers. Every few
+seconds it reads each worker's /health for outstanding inference jobs and
+recent p95 latency, and per service:
+
+- adds a worker when the queue per worker is above target or p95 latency is
+  above its objective, if the node's memory budget has room for one more
+- retires the least loaded worker when the load would fit on one fewer with
+  room to spare; the worker stops taking requests, drains and exits
+- keeps every service within its min/max bounds, restarting workers that
+  exit, and waits out a cooldown after each change so a worker that is still
+  loading its model is not judged too early
+
+Decisions are printed and exported on --metrics-port.
+
+Usage:
+    python autoscaler.py --port 8020 --ocr-min 1 --ocr-max 4 --tts-min 1 --tts-max 2
+"""
+
+import argparse
+import math
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+from prometheus_client import start_http_server
+
+from memory_watchdog import rss_bytes
+from metrics import AUTOSCALER_DECISIONS, AUTOSCALER_DESIRED_WORKERS, AUTOSCALER_WORKERS
+from serve import WORKER_MEMORY_MB, available_memory_mb
+
+TICK_SECONDS = 5.0
+HEALTH_TIMEOUT = 2.0
+SCALE_UP_COOLDOWN = 60.0
+SCALE_DOWN_COOLDOWN = 300.0
+# Retire only when the load would stay below this fraction of the target on one fewer worker
+SCALE_DOWN_HEADROOM = 0.5
+# Seconds a retiring worker gets to drain before it is killed
+RETIRE_TIMEOUT = 180.0
+GATEWAY_START_TIMEOUT = 30.0
+
+
+class ServicePolicy:
+    """
+    Scaling bounds and targets of one service.
+
+    Args:
+        target_outstanding: Queued plus running jobs per worker to aim for
+        latency_slo: p95 seconds from queueing to completion above which a worker is added
+        memory_mb: Expected RSS of one worker until a running one has been measured
+    """
+
+    def __init__(self, name, capabilities, hot_models, min_workers, max_workers,
+                 target_outstanding, latency_slo, memory_mb):
+        self.name = name
+        self.capabilities = capabilities
+        self.hot_models = hot_models
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target_outstanding = target_outstanding
+        self.latency_slo = latency_slo
+        self.memory_mb = memory_mb
+
+
+def desired_workers(policy, current, outstanding, p95):
+    """How many workers the service's load calls for, within its bounds"""
+    desired = math.ceil(outstanding / float(policy.target_outstanding)) if outstanding else 0
+    if p95 is not None and p95 > policy.latency_slo:
+        desired = max(desired, current + 1)
+    if desired < current:
+        # Hold unless the load fits comfortably on one fewer worker, so it does not flap
+        fewer = current - 1
+        queue_fits = outstanding <= fewer * policy.target_outstanding * SCALE_DOWN_HEADROOM
+        latency_fits = p95 is None or p95 <= policy.latency_slo * SCALE_DOWN_HEADROOM
+        desired = fewer if queue_fits and latency_fits else current
+    return min(policy.max_workers, max(policy.min_workers, desired))
+
+
+class ManagedWorker:
+    def __init__(self, service, port, process):
+        self.service = service
+        self.port = port
+        self.process = process
+        self.url = f"http://127.0.0.1:{port}"
+        self.started = time.time()
+        self.retiring_since = None
+        self.health = None
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def outstanding(self):
+        return (self.health or {}).get("outstanding", {}).get(self.service, 0)
+
+
+class Autoscaler:
+    def __init__(self, policies, gateway_url, worker_port_base, memory_budget_mb, admin_token=None):
+        self.policies = policies
+        self.gateway_url = gateway_url
+        self.worker_port_base = worker_port_base
+        self.memory_budget_mb = memory_budget_mb
+        self.admin_token = admin_token
+        self.workers = []
+        self.last_change = {name: 0.0 for name in policies}
+        # Largest RSS seen per service, to predict the size of the next worker
+        self.measured_mb = {}
+        self.client = httpx.Client(timeout=HEALTH_TIMEOUT)
+
+    def decide(self, service, action, reason):
+        AUTOSCALER_DECISIONS.labels(service, action, reason).inc()
+        if action != "hold":
+            print(f"[autoscaler] {service}: {action} ({reason})")
+
+    def free_port(self):
+        used = {worker.port for worker in self.workers}
+        port = self.worker_port_base
+        while port in used:
+            port += 1
+        return port
+
+    def spawn(self, policy):
+        port = self.free_port()
+        env = dict(
+            os.environ,
+            DRISHTI_CAPABILITIES=policy.capabilities,
+            DRISHTI_HOT_MODELS=policy.hot_models,
+            DRISHTI_GATEWAY_URL=self.gateway_url,
+            DRISHTI_WORKER_URL=f"http://127.0.0.1:{port}",
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "Backend:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        )
+        self.workers.append(ManagedWorker(policy.name, port, process))
+
+    def retire(self, worker):
+        """Ask a worker to stop taking requests, drain and exit"""
+        worker.retiring_since = time.time()
+        headers = {"X-Admin-Token": self.admin_token} if self.admin_token else {}
+        try:
+            self.client.post(f"{worker.url}/admin/memory/recycle", headers=headers).raise_for_status()
+        except httpx.HTTPError:
+            # Not answering; uvicorn still finishes open requests on SIGTERM
+            worker.process.send_signal(signal.SIGTERM)
+
+    def reap(self):
+        """Forget exited workers and kill ones that take too long to drain"""
+        for worker in list(self.workers):
+            if worker.alive:
+                if worker.retiring_since and time.time() - worker.retiring_since > RETIRE_TIMEOUT:
+                    print(f"[autoscaler] killing {worker.service} worker on port {worker.port}: drain timed out")
+                    worker.process.kill()
+                continue
+            self.workers.remove(worker)
+            if worker.retiring_since is None:
+                self.decide(worker.service, "exited", f"code {worker.process.returncode}")
+
+    def poll(self):
+        """Refresh the health and memory of every live worker"""
+        for worker in self.workers:
+            if worker.retiring_since is not None:
+                continue
+            try:
+                worker.health = self.client.get(f"{worker.url}/health").json()
+            except (httpx.HTTPError, ValueError):
+                # Still loading its models, or restarting after a memory recycle
+                worker.health = None
+            rss_mb = rss_bytes(worker.process.pid) / 2**20
+            self.measured_mb[worker.service] = max(self.measured_mb.get(worker.service, 0.0), rss_mb)
+
+    def memory_allows(self, policy):
+        """Whether one more worker of this service fits the budget and the free memory"""
+        expected = self.measured_mb.get(policy.name, policy.memory_mb)
+        used = sum(rss_bytes(w.process.pid) for w in self.workers if w.alive) / 2**20
+        if self.memory_budget_mb and used + expected > self.memory_budget_mb:
+            return False
+        free = available_memory_mb()
+        return free is None or free >= expected
+
+    def scale(self, policy):
+        workers = [w for w in self.workers if w.service == policy.name and w.retiring_since is None]
+        ready = [w for w in workers if w.health is not None]
+        outstanding = sum(w.outstanding() for w in ready)
+        latencies = [w.health.get("latency_p95", {}).get(policy.name) for w in ready]
+        latencies = [seconds for seconds in latencies if seconds is not None]
+        p95 = max(latencies) if latencies else None
+
+        current = len(workers)
+        desired = desired_workers(policy, current, outstanding, p95)
+        AUTOSCALER_WORKERS.labels(policy.name).set(current)
+        AUTOSCALER_DESIRED_WORKERS.labels(policy.name).set(desired)
+        since_change = time.time() - self.last_change[policy.name]
+
+        if desired > current:
+            # Below the minimum (e.g. a worker crashed) is fixed without waiting
+            if current >= policy.min_workers and since_change < SCALE_UP_COOLDOWN:
+                self.decide(policy.name, "hold", "cooldown")
+            elif current >= policy.min_workers and len(ready) < current:
+                self.decide(policy.name, "hold", "worker_starting")
+            elif not self.memory_allows(policy):
+                self.decide(policy.name, "hold", "memory_budget")
+            else:
+                reason = "below_min" if current < policy.min_workers else (
+                    "latency" if p95 is not None and p95 > policy.latency_slo else "queue_depth")
+                self.spawn(policy)
+                self.last_change[policy.name] = time.time()
+                self.decide(policy.name, "scale_up", reason)
+        elif desired < current:
+            if since_change < SCALE_DOWN_COOLDOWN:
+                self.decide(policy.name, "hold", "cooldown")
+            else:
+                # Starting workers have no load yet but are about to be useful
+                self.retire(min(ready or workers, key=lambda w: w.outstanding()))
+                self.last_change[policy.name] = time.time()
+                self.decide(policy.name, "scale_down", "idle")
+
+    def run(self):
+        while True:
+            self.reap()
+            self.poll()
+            for policy in self.policies.values():
+                self.scale(policy)
+            time.sleep(TICK_SECONDS)
+
+    def shutdown(self):
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.send_signal(signal.SIGTERM)
+        for worker in self.workers:
+            try:
+                worker.process.wait(RETIRE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+
+def start_gateway(port):
+    gateway = subprocess.Popen(
+        [sys.executable, "gateway.py", "--port", str(port)], cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    deadline = time.time() + GATEWAY_START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0)
+            return gateway
+        except httpx.HTTPError:
+            if gateway.poll() is not None:
+                raise RuntimeError("Gateway exited during startup")
+            time.sleep(0.5)
+    gateway.terminate()
+    raise RuntimeError("Gateway did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the gateway and scale OCR and TTS workers with load")
+    parser.add_argument("--port", type=int, default=8020, help="Public port of the gateway")
+    parser.add_argument("--gateway-url", help="Use a gateway that is already running instead of starting one")
+    parser.add_argument("--worker-port-base", type=int, default=8100)
+    parser.add_argument("--metrics-port", type=int, default=9100)
+    parser.add_argument("--ocr-min", type=int, default=1)
+    parser.add_argument("--ocr-max", type=int, default=4)
+    parser.add_argument("--tts-min", type=int, default=1)
+    parser.add_argument("--tts-max", type=int, default=2)
+    parser.add_argument("--ocr-target-queue", type=float, default=4.0, help="Outstanding OCR jobs per worker")
+    parser.add_argument("--tts-target-queue", type=float, default=2.0, help="Outstanding TTS jobs per worker")
+    parser.add_argument("--ocr-latency-slo", type=float, default=3.0, help="p95 seconds")
+    parser.add_argument("--tts-latency-slo", type=float, default=15.0, help="p95 seconds")
+    parser.add_argument("--ocr-worker-memory-mb", type=int, default=1500)
+    parser.add_argument("--tts-worker-memory-mb", type=int, default=WORKER_MEMORY_MB)
+    parser.add_argument("--memory-budget-mb", type=int,
+                        help="Total RSS the workers may use (default: 90%% of the memory available at start)")
+    args = parser.parse_args()
+
+    memory_budget_mb = args.memory_budget_mb
+    if memory_budget_mb is None and available_memory_mb():
+        memory_budget_mb = int(available_memory_mb() * 0.9)
+    policies = {
+        "ocr": ServicePolicy("ocr", "color,ocr", "ocr:kn", args.ocr_min, args.ocr_max,
+                             args.ocr_target_queue, args.ocr_latency_slo, args.ocr_worker_memory_mb),
+        "tts": ServicePolicy("tts", "tts", "tts", args.tts_min, args.tts_max,
+                             args.tts_target_queue, args.tts_latency_slo, args.tts_worker_memory_mb),
+    }
+    # Sized for the most workers that can run at once, so peak load does not oversubscribe the cores
+    os.environ.setdefault("DRISHTI_WORKERS", str(args.ocr_max + args.tts_max))
+
+    gateway = None
+    gateway_url = args.gateway_url
+    if gateway_url is None:
+        # Shared by the gateway and the workers started here, which inherit the environment
+        os.environ.setdefault("DRISHTI_GATEWAY_SECRET", secrets.token_urlsafe(32))
+        gateway = start_gateway(args.port)
+        gateway_url = f"http://127.0.0.1:{args.port}"
+    start_http_server(args.metrics_port)
+    print(f"[autoscaler] gateway {gateway_url}, metrics on :{args.metrics_port}, "
+          f"memory budget {memory_budget_mb or 'unlimited'} MB")
+
+    autoscaler = Autoscaler(policies, gateway_url, args.worker_port_base, memory_budget_mb,
+                            os.environ.get("DRISHTI_ADMIN_TOKEN"))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        autoscaler.run()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        autoscaler.shutdown()
+        if gateway is not None:
+            gateway.terminate()
+            gateway.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmarks for the color, OCR and TTS hot paths.
+
+Models are replaced with the deterministic stand-ins from stub_models, so the
+suite runs offline on CPU. Results are written as JSON and can be compared
+against a saved baseline to flag regressions.
+
+Usage:
+    python benchmark.py --output bench_results.json
+    python benchmark.py --baseline benchmark_baseline.json
+    python benchmark.py --save-baseline benchmark_baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import Backend
+import color_workers
+import tts_cache
+from stub_models import install_stub_models
+
+IMAGE_SIZES = {
+    "small": (320, 240),
+    "medium": (1280, 960),
+    "large": (4032, 3024),
+}
+TEXT_LENGTHS = [10, 100, 1000]
+# Numbered so that every sentence differs and none is served from the sentence cache
+SAMPLE_SENTENCE = "ಕನ್ನಡ ನಾಡು ನುಡಿ {}. "
+# A benchmark regresses when its median is this much slower than the baseline
+DEFAULT_THRESHOLD = 0.20
+# /detect-color/batch should sustain at least this many medium (1280x960 JPEG)
+# images per second for each core in its process pool
+COLOR_BATCH_TARGET_PER_CORE = 100
+COLOR_BATCH_SIZE = 64
+
+
+def make_image(width, height, seed=0):
+    """Deterministic test image: a colour gradient with noise and dark text-like bars"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    image = np.empty((height, width, 3), dtype=np.float32)
+    image[..., 0] = x[None, :]
+    image[..., 1] = y[:, None]
+    image[..., 2] = 128
+    image += rng.normal(0, 8, image.shape)
+    for top in range(height // 8, height, max(1, height // 6)):
+        image[top:top + max(2, height // 40), width // 10:width - width // 10] = 20
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg(image):
+    ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("Could not encode benchmark image")
+    return data.tobytes()
+
+
+def sample_text(length):
+    """length characters of distinct Kannada sentences"""
+    text = ""
+    while len(text) < length:
+        text += SAMPLE_SENTENCE.format(text.count(".") + 1)
+    return text[:length]
+
+
+def time_call(fn, iterations, warmup=1, setup=None):
+    """Run fn repeatedly and return timing statistics in seconds; setup runs untimed before each call"""
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "median_s": statistics.median(samples),
+        "p95_s": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "min_s": samples[0],
+    }
+
+
+def iterations_for(size_name, base):
+    return max(3, base // {"small": 1, "medium": 4, "large": 16}[size_name])
+
+
+def run_benchmarks(base_iterations=50):
+    """Run every benchmark and return {name: stats}"""
+    install_stub_models(Backend)
+    results = {}
+
+    # Color hot path
+    colors = [tuple(int(c) for c in np.random.default_rng(i).integers(0, 256, 3)) for i in range(1000)]
+    results["rgb_to_hsi/1000"] = time_call(
+        lambda: [Backend.rgb_to_hsi(rgb) for rgb in colors], base_iterations
+    )
+    hues = [float(h) for h in np.linspace(0, 359, 1000)]
+    results["get_color_name/1000"] = time_call(
+        lambda: [Backend.get_color_name(h) for h in hues], base_iterations
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_name, (width, height) in IMAGE_SIZES.items():
+            image = make_image(width, height)
+            data = encode_jpeg(image)
+            path = os.path.join(tmp, f"{size_name}.jpg")
+            with open(path, "wb") as f:
+                f.write(data)
+            n = iterations_for(size_name, base_iterations)
+
+            results[f"average_image_color/{size_name}"] = time_call(
+                lambda: Backend.average_image_color(path), n
+            )
+            results[f"imdecode/{size_name}"] = time_call(
+                lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), n
+            )
+            results[f"perform_ocr/{size_name}"] = time_call(
+                lambda: asyncio.run(Backend.perform_ocr(data)), n
+            )
+
+    # Batch color detection across the process pool, reported per core
+    batch = [encode_jpeg(make_image(*IMAGE_SIZES["medium"], seed=i)) for i in range(COLOR_BATCH_SIZE)]
+    pool = Backend.get_color_pool()
+    stats = time_call(
+        lambda: color_workers.average_colors(pool, batch, Backend.COLOR_PROCESSES),
+        max(3, base_iterations // 10),
+    )
+    stats["images_per_second_per_core"] = COLOR_BATCH_SIZE / stats["median_s"] / Backend.COLOR_PROCESSES
+    stats["target_per_core"] = COLOR_BATCH_TARGET_PER_CORE
+    results[f"color_batch/medium_x{COLOR_BATCH_SIZE}"] = stats
+
+    # TTS handler end to end, including tokenization, WAV encoding and disk writes. Cold
+    # runs start from an empty sentence cache and synthesize every sentence; warm runs
+    # repeat a text whose sentences are all cached.
+    default_cache = Backend.tts_audio_cache
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            def empty_cache():
+                Backend.tts_audio_cache = tts_cache.SentenceAudioCache(tempfile.mkdtemp(dir=tmp))
+
+            for length in TEXT_LENGTHS:
+                request = Backend.TTSRequest(text=sample_text(length))
+                n = max(3, base_iterations // (1 + length // 100))
+                results[f"tts_handler/{length}_chars_cold"] = time_call(
+                    lambda: asyncio.run(Backend.text_to_speech(request)), n, setup=empty_cache
+                )
+                # The warmup run fills the cache
+                empty_cache()
+                results[f"tts_handler/{length}_chars_warm"] = time_call(
+                    lambda: asyncio.run(Backend.text_to_speech(request)), n
+                )
+    finally:
+        Backend.tts_audio_cache = default_cache
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of (name, baseline_s, current_s, ratio) for regressed benchmarks"""
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["median_s"]
+        after = stats["median_s"]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append((name, before, after, after / before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DrishtiYantra hot paths with stub models")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown of the median before flagging a regression")
+    parser.add_argument("--iterations", type=int, default=50, help="Iterations for the cheapest benchmarks")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.iterations)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+        "results": results,
+    }
+
+    for name, stats in results.items():
+        print(f"{name:40s} median {stats['median_s'] * 1000:9.3f} ms   p95 {stats['p95_s'] * 1000:9.3f} ms")
+        if "images_per_second_per_core" in stats:
+            rate = stats["images_per_second_per_core"]
+            verdict = "meets" if rate >= stats["target_per_core"] else "BELOW"
+            print(f"{'':40s} {rate:.1f} images/s/core, {verdict} target of {stats['target_per_core']}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
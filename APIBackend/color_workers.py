@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Average-color reduction, shared by /detect-color and the batch endpoint.
+
+Kept free of the FastAPI app and the models so process-pool workers can import
+it cheaply. The worker gets the encoded upload bytes, which are far smaller
+than the decoded image, and returns only the average RGB.
+"""
+
+import concurrent.futures
+import io
+import multiprocessing
+
+import numpy as np
+from PIL import Image
+
+import thread_budget
+
+# Images are reduced at this size, which is plenty for an average
+REDUCE_SIZE = (100, 100)
+
+
+def average_color(img):
+    """Average RGB of a PIL image, computed on a 100x100 resize"""
+    pixels = np.asarray(img.resize(REDUCE_SIZE))
+    # Single-channel and palette images have no per-pixel RGB to average
+    if pixels.ndim != 3 or pixels.shape[2] < 3:
+        return {"success": False, "error": "Could not process image pixels"}
+    totals = pixels[..., :3].reshape(-1, 3).sum(axis=0, dtype=np.int64)
+    count = pixels.shape[0] * pixels.shape[1]
+    return {"success": True, "color": tuple(int(total / count) for total in totals)}
+
+
+def average_color_bytes(data):
+    """Decode an encoded image and return its average color"""
+    try:
+        return average_color(Image.open(io.BytesIO(data)))
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def init_worker():
+    # Parallelism comes from the processes, so each one stays single-threaded
+    thread_budget.set_opencv_threads(1)
+
+
+def make_pool(processes):
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    )
+
+
+def average_colors(pool, images, processes):
+    """Average colors of many encoded images, in order, spread across the pool"""
+    chunksize = max(1, len(images) // (processes * 4))
+    return list(pool.map(average_color_bytes, images, chunksize=chunksize))
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Routing gateway for a pool of backend workers.
+
+Each worker is an ordinary Backend.py process, on this machine or another
+node, started with DRISHTI_GATEWAY_URL pointing here. Workers send heartbeats
+with their capabilities (color, ocr, tts) and their outstanding inference
+jobs. The gateway forwards each request to the healthy worker with the least
+outstanding work for that service. Outstanding work is what the worker last
+reported plus what the gateway has sent it since. Workers are health-checked,
+and a request that cannot reach its worker is retried on another one. Live
+OCR WebSockets are relayed to the least loaded OCR worker.
+
+Workers must present the shared DRISHTI_GATEWAY_SECRET and register a URL on
+one of the hosts in DRISHTI_GATEWAY_WORKER_HOSTS; otherwise anyone who can
+reach the gateway could register and receive users' images and text.
+
+Usage:
+    DRISHTI_GATEWAY_SECRET=... python gateway.py --port 8020
+    DRISHTI_GATEWAY_SECRET=... DRISHTI_GATEWAY_URL=http://127.0.0.1:8020 DRISHTI_WORKER_URL=http://127.0.0.1:8021 \\
+        uvicorn Backend:app --port 8021
+"""
+
+import argparse
+import asyncio
+import collections
+import hmac
+import json
+import os
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+import websockets
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+# Workers whose last heartbeat is older than this are not routed to
+HEARTBEAT_TIMEOUT = 10.0
+HEALTH_CHECK_INTERVAL = 5.0
+HEALTH_CHECK_TIMEOUT = 2.0
+# Consecutive failed checks or connection errors before a worker is taken out
+MAX_FAILURES = 2
+MAX_ATTEMPTS = 3
+UPSTREAM_TIMEOUT = httpx.Timeout(300.0, connect=2.0)
+# TTS jobs live in the SQLite queue of the worker that accepted them
+MAX_JOB_ROUTES = 10000
+
+# Workers authenticate with this shared secret; without it none can register
+GATEWAY_SECRET = os.environ.get("DRISHTI_GATEWAY_SECRET")
+# Hosts that worker URLs may point at
+WORKER_HOSTS = {h for h in os.environ.get("DRISHTI_GATEWAY_WORKER_HOSTS", "127.0.0.1,localhost").split(",") if h}
+
+# Hop-by-hop headers are not forwarded in either direction
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+    "trailer", "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+app = FastAPI(title="DrishtiYantra Gateway", description="Routes requests to backend workers")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "X-Model-Version", "X-TTS-Cache-Hit-Ratio", "X-Worker"],
+)
+
+
+class Worker:
+    def __init__(self, url):
+        self.url = url
+        self.capabilities = set()
+        self.reported = {}
+        self.inflight = 0
+        self.last_seen = 0.0
+        self.failures = 0
+        self.draining = False
+
+    @property
+    def healthy(self):
+        return (
+            not self.draining
+            and self.failures < MAX_FAILURES
+            and time.time() - self.last_seen < HEARTBEAT_TIMEOUT
+        )
+
+    def load(self, capability):
+        return self.reported.get(capability, 0) + self.inflight
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "capabilities": sorted(self.capabilities),
+            "outstanding": self.reported,
+            "inflight": self.inflight,
+            "healthy": self.healthy,
+            "failures": self.failures,
+            "draining": self.draining,
+            "last_seen": self.last_seen,
+        }
+
+
+class Heartbeat(BaseModel):
+    url: str
+    capabilities: list
+    outstanding: dict = {}
+    draining: bool = False
+
+
+workers = {}
+job_routes = collections.OrderedDict()
+client = None
+
+
+async def require_gateway_secret(x_gateway_secret: Optional[str] = Header(None)):
+    """FastAPI dependency guarding the worker registry"""
+    if not GATEWAY_SECRET:
+        raise HTTPException(status_code=403, detail="Worker registration is disabled; set DRISHTI_GATEWAY_SECRET")
+    # Bytes, since compare_digest refuses str with non-ASCII characters
+    if x_gateway_secret is None or not hmac.compare_digest(x_gateway_secret.encode(), GATEWAY_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="Gateway secret required")
+
+
+def capability_for(path):
+    """The service a request path needs"""
+    if path.startswith("/detect-color"):
+        return "color"
+    if path.startswith("/ocr"):
+        return "ocr"
+    if path.startswith("/tts"):
+        return "tts"
+    return None
+
+
+def choose_worker(capability, exclude=()):
+    candidates = [
+        w for w in workers.values()
+        if w.healthy and capability in w.capabilities and w.url not in exclude
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda w: w.load(capability))
+
+
+def remember_job(job_id, url):
+    job_routes[job_id] = url
+    job_routes.move_to_end(job_id)
+    while len(job_routes) > MAX_JOB_ROUTES:
+        job_routes.popitem(last=False)
+
+
+def pinned_worker(path):
+    """Requests about an existing TTS job must go to the worker that has it"""
+    parts = path.strip("/").split("/")
+    if len(parts) >= 3 and parts[:2] == ["tts", "jobs"]:
+        return job_routes.get(parts[2])
+    return None
+
+
+async def check_health(worker):
+    try:
+        response = await client.get(f"{worker.url}/health", timeout=HEALTH_CHECK_TIMEOUT)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        worker.failures += 1
+        return
+    health = response.json()
+    worker.failures = 0
+    worker.last_seen = time.time()
+    worker.reported = health.get("outstanding", worker.reported)
+
+
+async def health_check_loop():
+    while True:
+        await asyncio.gather(*(check_health(w) for w in list(workers.values())))
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_gateway():
+    global client
+    client = httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT)
+    asyncio.create_task(health_check_loop())
+
+
+@app.on_event("shutdown")
+async def stop_gateway():
+    await client.aclose()
+
+
+@app.post("/gateway/workers", dependencies=[Depends(require_gateway_secret)])
+async def worker_heartbeat(heartbeat: Heartbeat):
+    """Register a worker or refresh its capabilities and load"""
+    url = urlsplit(heartbeat.url)
+    if url.scheme not in ("http", "https") or url.hostname not in WORKER_HOSTS:
+        raise HTTPException(status_code=403, detail="Worker host is not in DRISHTI_GATEWAY_WORKER_HOSTS")
+    worker = workers.get(heartbeat.url)
+    if worker is None:
+        print(f"Worker registered: {heartbeat.url} ({', '.join(heartbeat.capabilities)})")
+        worker = workers[heartbeat.url] = Worker(heartbeat.url)
+    worker.capabilities = set(heartbeat.capabilities)
+    worker.reported = heartbeat.outstanding
+    worker.draining = heartbeat.draining
+    worker.last_seen = time.time()
+    worker.failures = 0
+    return {"status": "ok"}
+
+
+@app.get("/gateway/workers", dependencies=[Depends(require_gateway_secret)])
+async def list_workers():
+    return [w.to_dict() for w in workers.values()]
+
+
+@app.get("/health")
+async def health():
+    healthy = [w.url for w in workers.values() if w.healthy]
+    return {"status": "ok" if healthy else "no_workers", "workers": len(healthy)}
+
+
+@app.websocket("/ocr/live")
+async def proxy_live_ocr(websocket: WebSocket):
+    """Relay a live OCR session to the least loaded OCR worker for its whole duration"""
+    worker = choose_worker("ocr")
+    if worker is None:
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    url = "ws" + worker.url[len("http"):] + "/ocr/live"
+    if websocket.url.query:
+        url += "?" + websocket.url.query
+
+    worker.inflight += 1
+    try:
+        async with websockets.connect(url, max_size=None) as upstream:
+            async def client_to_worker():
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    await upstream.send(message["bytes"] if message.get("bytes") is not None else message["text"])
+
+            async def worker_to_client():
+                async for message in upstream:
+                    if isinstance(message, bytes):
+                        await websocket.send_bytes(message)
+                    else:
+                        await websocket.send_text(message)
+
+            relays = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+            # Either side closing ends the session
+            done, pending = await asyncio.wait(relays, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+    except (OSError, websockets.WebSocketException, WebSocketDisconnect) as e:
+        print(f"Live OCR session through {worker.url} ended: {e}")
+    finally:
+        worker.inflight -= 1
+        try:
+            await websocket.close()
+        except RuntimeError:
+            # Already closed by the client
+            pass
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def proxy(path: str, request: Request):
+    """Forward a request to the least loaded worker that offers its service"""
+    path = "/" + path
+    capability = capability_for(path)
+    if capability is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    body = await request.body()
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP}
+    pinned = pinned_worker(path)
+    tried = set()
+
+    for attempt in range(MAX_ATTEMPTS):
+        if pinned is not None:
+            worker = workers.get(pinned)
+        else:
+            worker = choose_worker(capability, exclude=tried)
+        if worker is None:
+            break
+        tried.add(worker.url)
+
+        upstream = client.build_request(
+            request.method, worker.url + path, params=request.query_params, headers=headers, content=body
+        )
+        worker.inflight += 1
+        try:
+            response = await client.send(upstream, stream=True)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            # Nothing reached the worker, so the request is safe to send elsewhere
+            worker.inflight -= 1
+            worker.failures += 1
+            print(f"Worker {worker.url} unreachable ({e}); attempt {attempt + 1}/{MAX_ATTEMPTS}")
+            if pinned is not None:
+                break
+            continue
+        except httpx.HTTPError as e:
+            worker.inflight -= 1
+            raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+
+        if response.status_code == 503 and pinned is None and attempt + 1 < MAX_ATTEMPTS:
+            # The worker is shedding load; try the next one
+            worker.inflight -= 1
+            await response.aclose()
+            continue
+
+        content = response.aiter_raw()
+        if path == "/tts/jobs" and request.method == "POST" and response.status_code == 202:
+            raw = b"".join([chunk async for chunk in content])
+            remember_job(json.loads(raw)["job_id"], worker.url)
+            content = iter([raw])
+
+        async def release(response=response, worker=worker):
+            worker.inflight -= 1
+            await response.aclose()
+
+        response_headers = {k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP}
+        response_headers["X-Worker"] = worker.url
+        return StreamingResponse(
+            content,
+            status_code=response.status_code,
+            headers=response_headers,
+            background=BackgroundTask(release),
+        )
+
+    raise HTTPException(status_code=503, detail=f"No healthy worker available for {capability}")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the DrishtiYantra routing gateway")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8020)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Registration of a backend worker with the routing gateway (see gateway.py).
+
+When DRISHTI_GATEWAY_URL is set, the worker sends a heartbeat with its
+capabilities and outstanding inference jobs every few seconds, signed with the
+shared DRISHTI_GATEWAY_SECRET. Set DRISHTI_WORKER_URL to the address the
+gateway should use to reach this worker, and DRISHTI_CAPABILITIES to limit the
+services it offers, e.g. "ocr" on a node without the TTS model.
+"""
+
+import asyncio
+import os
+
+import httpx
+
+GATEWAY_URL = os.environ.get("DRISHTI_GATEWAY_URL")
+# No default: the gateway's own port would make it route requests to itself
+WORKER_URL = os.environ.get("DRISHTI_WORKER_URL")
+GATEWAY_SECRET = os.environ.get("DRISHTI_GATEWAY_SECRET")
+CAPABILITIES = [c for c in os.environ.get("DRISHTI_CAPABILITIES", "color,ocr,tts").split(",") if c]
+HEARTBEAT_INTERVAL = 2.0
+
+
+async def heartbeat_loop(outstanding, draining=lambda: False, interval=HEARTBEAT_INTERVAL):
+    """
+    Report this worker to the gateway until cancelled.
+
+    Args:
+        outstanding: Callable returning {service: queued and running jobs}
+        draining: Callable returning True while the worker is shutting down
+    """
+    if not WORKER_URL:
+        print("DRISHTI_WORKER_URL is not set; not registering with the gateway")
+        return
+    headers = {"X-Gateway-Secret": GATEWAY_SECRET} if GATEWAY_SECRET else {}
+    async with httpx.AsyncClient(timeout=2.0, headers=headers) as client:
+        registered = False
+        while True:
+            try:
+                response = await client.post(f"{GATEWAY_URL}/gateway/workers", json={
+                    "url": WORKER_URL,
+                    "capabilities": CAPABILITIES,
+                    "outstanding": outstanding(),
+                    "draining": draining(),
+                })
+                response.raise_for_status()
+                if not registered:
+                    print(f"Registered with gateway {GATEWAY_URL} as {WORKER_URL}")
+                    registered = True
+            except httpx.HTTPError as e:
+                if registered:
+                    print(f"Lost contact with gateway {GATEWAY_URL}: {e}")
+                registered = False
+            await asyncio.sleep(interval)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Streaming OCR for live camera frames.
+
+Every frame only goes through EasyOCR's text-region detector. Detected boxes
+are tracked across frames and the recognizer is run only on regions that are
+new or have changed and then held steady for a few frames. A region whose box
+stays put but whose content changes, such as a turned page, is read again.
+Recognized regions are cached by a hash of their pixels so a region seen again
+is not recognized twice.
+"""
+
+import hashlib
+import itertools
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Detector settings used for live frames (smaller canvas than a full readtext)
+LIVE_CANVAS_SIZE = 1280
+# Number of consecutive frames a box must hold still before it is recognized
+STABLE_FRAMES = 3
+# Minimum IoU for a detection to be matched with an existing track
+MATCH_IOU = 0.3
+# IoU with the previous frame above which a box counts as not having moved
+STEADY_IOU = 0.85
+# Mean absolute difference (0-255) of a recognized region's thumbnail above which its content has changed;
+# well above what hand jitter and sensor noise cause
+CONTENT_CHANGE = 24.0
+# Thumbnail the content comparison works on, coarse enough to blur small shifts
+SIGNATURE_SIZE = (64, 16)
+# Frames a track may go undetected before it is dropped
+MAX_MISSED_FRAMES = 5
+# Number of recognized regions kept in the content-hash cache
+REGION_CACHE_SIZE = 512
+
+
+class RegionCache:
+    """Small LRU cache mapping region content hashes to recognized text"""
+
+    def __init__(self, capacity=REGION_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+
+# Shared across sessions so a region rescanned by another client is a hit too
+region_cache = RegionCache()
+
+
+class Track:
+    """A text region followed across frames"""
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.stable_count = 1
+        self.missed = 0
+        self.text = None
+        self.confidence = None
+        self.needs_recognition = True
+        # Thumbnail of the region when it was last recognized
+        self.signature = None
+
+
+def box_iou(a, b):
+    """Intersection over union of two [x_min, x_max, y_min, y_max] boxes"""
+    ix = max(0, min(a[1], b[1]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[2], b[2]))
+    inter = ix * iy
+    if inter == 0:
+        return 0.0
+    area_a = (a[1] - a[0]) * (a[3] - a[2])
+    area_b = (b[1] - b[0]) * (b[3] - b[2])
+    return inter / float(area_a + area_b - inter)
+
+
+def region_hash(grey, box):
+    """Hash the pixels of a region, coarsely, so sensor noise does not change it"""
+    x_min, x_max, y_min, y_max = box
+    crop = grey[y_min:y_max, x_min:x_max]
+    if crop.size == 0:
+        return None
+    height = 32
+    width = max(1, int(round(crop.shape[1] * height / float(crop.shape[0]))))
+    small = cv2.resize(crop, (width, height), interpolation=cv2.INTER_AREA)
+    quantized = (small >> 4).astype(np.uint8)
+    return hashlib.sha1(quantized.tobytes() + bytes(str(quantized.shape), "ascii")).hexdigest()
+
+
+def region_signature(grey, box):
+    """Small blurred thumbnail of a region, for telling a content change from jitter"""
+    x_min, x_max, y_min, y_max = box
+    crop = grey[y_min:y_max, x_min:x_max]
+    if crop.size == 0:
+        return None
+    return cv2.resize(crop, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def content_changed(track, grey):
+    """Whether a recognized region now shows something else under the same box"""
+    signature = region_signature(grey, track.box)
+    if signature is None or track.signature is None:
+        return False
+    return float(np.abs(signature - track.signature).mean()) > CONTENT_CHANGE
+
+
+def _to_boxes(horizontal_list, free_list, shape):
+    """Convert detector output to clipped integer [x_min, x_max, y_min, y_max] boxes"""
+    height, width = shape[:2]
+    boxes = []
+    for x_min, x_max, y_min, y_max in horizontal_list:
+        boxes.append([x_min, x_max, y_min, y_max])
+    for polygon in free_list:
+        xs = [point[0] for point in polygon]
+        ys = [point[1] for point in polygon]
+        boxes.append([min(xs), max(xs), min(ys), max(ys)])
+
+    clipped = []
+    for x_min, x_max, y_min, y_max in boxes:
+        x_min, x_max = max(0, int(x_min)), min(width, int(x_max))
+        y_min, y_max = max(0, int(y_min)), min(height, int(y_max))
+        if x_max > x_min and y_max > y_min:
+            clipped.append([x_min, x_max, y_min, y_max])
+    return clipped
+
+
+def reading_order(tracks):
+    """Sort tracks top-to-bottom, then left-to-right within a line"""
+    ordered = sorted(tracks, key=lambda t: (t.box[2] + t.box[3]) / 2.0)
+    lines = []
+    for track in ordered:
+        center = (track.box[2] + track.box[3]) / 2.0
+        if lines and abs(center - lines[-1][0]) < (track.box[3] - track.box[2]) / 2.0:
+            lines[-1][1].append(track)
+        else:
+            lines.append([center, [track]])
+    result = []
+    for _, line in lines:
+        result.extend(sorted(line, key=lambda t: t.box[0]))
+    return result
+
+
+class LiveOCRSession:
+    """Per-connection state for live OCR"""
+
+    def __init__(self, reader, cache=None, stable_frames=STABLE_FRAMES, canvas_size=LIVE_CANVAS_SIZE):
+        self.reader = reader
+        self.cache = cache if cache is not None else region_cache
+        self.stable_frames = stable_frames
+        self.canvas_size = canvas_size
+        self.tracks = {}
+        self.frame_count = 0
+        self._ids = itertools.count(1)
+
+    def _update_tracks(self, boxes):
+        """Match this frame's boxes to existing tracks and return ids of dropped tracks"""
+        unmatched = set(self.tracks)
+        for box in boxes:
+            best_id, best_iou = None, MATCH_IOU
+            for track_id in unmatched:
+                iou = box_iou(self.tracks[track_id].box, box)
+                if iou >= best_iou:
+                    best_id, best_iou = track_id, iou
+
+            if best_id is None:
+                track = Track(next(self._ids), box)
+                self.tracks[track.id] = track
+                continue
+
+            unmatched.discard(best_id)
+            track = self.tracks[best_id]
+            track.missed = 0
+            if best_iou >= STEADY_IOU:
+                track.stable_count += 1
+            else:
+                # The region moved or changed shape, so wait for it to settle again
+                track.stable_count = 1
+                track.needs_recognition = True
+            track.box = box
+
+        removed = []
+        for track_id in unmatched:
+            track = self.tracks[track_id]
+            track.missed += 1
+            if track.missed > MAX_MISSED_FRAMES:
+                removed.append(track_id)
+        for track_id in removed:
+            del self.tracks[track_id]
+        return removed
+
+    def process_frame(self, image):
+        """
+        Run detection on a frame and recognition on regions that became stable.
+
+        Args:
+            image: BGR image array from cv2.imdecode
+
+        Returns:
+            Dict with the regions whose text changed, ids of removed regions and
+            the full text in reading order, or None if nothing changed
+        """
+        self.frame_count += 1
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        horizontal_list, free_list = self.reader.detect(image, canvas_size=self.canvas_size)
+        boxes = _to_boxes(horizontal_list[0], free_list[0], image.shape)
+        removed = self._update_tracks(boxes)
+
+        updated = []
+        pending = []
+        for track in self.tracks.values():
+            if track.missed:
+                continue
+            if not track.needs_recognition:
+                if content_changed(track, grey):
+                    # New content under a steady box, e.g. a page turn; read it once it settles
+                    track.needs_recognition = True
+                    track.stable_count = 1
+                continue
+            if track.stable_count < self.stable_frames:
+                continue
+            key = region_hash(grey, track.box)
+            if not key:
+                continue
+            track.signature = region_signature(grey, track.box)
+            cached = self.cache.get(key)
+            if cached is not None:
+                track.text, track.confidence = cached
+                track.needs_recognition = False
+                updated.append((track, True))
+            else:
+                pending.append((track, key))
+
+        if pending:
+            # One recognizer call for every region that needs it in this frame
+            results = self.reader.recognize(
+                grey,
+                horizontal_list=[track.box for track, _ in pending],
+                free_list=[],
+                detail=1,
+            )
+            # recognize() returns results sorted by position, so map them back by box
+            by_box = {}
+            for box, text, confidence in results:
+                xs = [point[0] for point in box]
+                ys = [point[1] for point in box]
+                by_box[(int(min(xs)), int(max(xs)), int(min(ys)), int(max(ys)))] = (text, float(confidence))
+            for track, key in pending:
+                text, confidence = by_box.get(tuple(track.box), ("", 0.0))
+                track.text, track.confidence = text, confidence
+                track.needs_recognition = False
+                self.cache.put(key, (text, confidence))
+                updated.append((track, False))
+
+        if not updated and not removed:
+            return None
+
+        recognized = [t for t in self.tracks.values() if t.text]
+        return {
+            "type": "update",
+            "frame": self.frame_count,
+            "regions": [
+                {
+                    "id": track.id,
+                    "box": track.box,
+                    "text": track.text,
+                    "confidence": track.confidence,
+                    "cached": cached,
+                }
+                for track, cached in updated
+            ],
+            "removed": removed,
+            "text": " ".join(t.text for t in reading_order(recognized)),
+        }
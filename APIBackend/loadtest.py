@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Open-loop load test that replays the mobile app's request mix.
+
+Mimics the flows in frontend/apiService.js:
+- read_aloud: an /ocr/ upload followed by /tts/ of the recognized text
+- color_burst: a few /detect-color calls in quick succession, as when the user
+  points the camera at several things
+
+Flows start at Poisson-distributed times at the given rate, whether or not
+earlier flows have finished, so an overloaded server shows up as growing
+latency and errors rather than as a slower client. Run it against a backend
+started with stub models (--spawn-server does this):
+
+    DRISHTI_STUB_MODELS=1 uvicorn Backend:app --port 8020
+    python loadtest.py --url http://127.0.0.1:8020 --rate 5 --duration 60
+
+Results are printed and written as JSON: throughput, error rate and
+p50/p95/p99 latency per endpoint.
+
+--compare-serve N replays the same workload (same seed) against the current
+startup and against `serve.py --workers N`, both over TLS with stub models,
+and reports the two side by side. The current startup is backend/run_https.py's:
+uvicorn with reload=True, one worker and a self-signed certificate. run_https.py
+itself serves only backend/app.py, so its settings are applied to Backend:app.
+
+    python loadtest.py --compare-serve 4 --rate 10 --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import cv2
+import httpx
+import numpy as np
+
+from serve import generate_self_signed_cert
+
+IMAGE_SIZES = {
+    "small": (640, 480),
+    "medium": (1280, 960),
+    "large": (4032, 3024),
+}
+SAMPLE_TEXT = "ಕನ್ನಡ ನಾಡು ನುಡಿ ನಮ್ಮ ಹೆಮ್ಮೆ. "
+VOICE_DESCRIPTION = "Anu's voice is monotone yet slightly clear in delivery, with a very close recording that almost has no background noise."
+IMAGES_PER_SIZE = 8
+REQUEST_TIMEOUT = 120.0
+SERVER_START_TIMEOUT = 300.0
+
+
+def parse_mix(text):
+    """Parse "a=0.6,b=0.4" into {"a": 0.6, "b": 0.4}"""
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def pick(mix, rng):
+    names = list(mix)
+    return rng.choices(names, weights=[mix[n] for n in names])[0]
+
+
+def make_photo(width, height, seed):
+    """A camera-like JPEG: textured background with dark text lines"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(60, 220, 3)
+    image = np.clip(rng.normal(base, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    line = max(8, height // 30)
+    for top in range(line * 2, height - line * 2, line * 2):
+        image[top:top + line, width // 10:width - width // 10 - int(rng.integers(0, width // 4))] = 25
+    ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return data.tobytes()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.flows = {}
+
+    def record(self, endpoint, seconds, ok, detail=None):
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            errors = self.errors.setdefault(endpoint, {})
+            errors[detail] = errors.get(detail, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            errors = sum(self.errors.get(endpoint, {}).values())
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "throughput_per_s": (len(samples) - errors) / elapsed,
+                "p50_s": percentile(samples, 0.50),
+                "p95_s": percentile(samples, 0.95),
+                "p99_s": percentile(samples, 0.99),
+                "error_detail": self.errors.get(endpoint, {}),
+            }
+        return {"elapsed_s": elapsed, "flows": self.flows, "endpoints": endpoints}
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.image_mix = parse_mix(args.image_mix)
+        self.text_mix = {int(k): v for k, v in parse_mix(args.text_mix).items()}
+        self.flow_mix = parse_mix(args.flow_mix)
+        self.images = {
+            size: [make_photo(*IMAGE_SIZES[size], seed=i) for i in range(IMAGES_PER_SIZE)]
+            for size in self.image_mix
+        }
+        self.recorder = Recorder()
+
+    def image(self, rng):
+        return rng.choice(self.images[pick(self.image_mix, rng)])
+
+    def text(self, rng):
+        length = pick(self.text_mix, rng)
+        return (SAMPLE_TEXT * (length // len(SAMPLE_TEXT) + 1))[:length]
+
+    async def call(self, client, endpoint, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.post(self.args.url + endpoint, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(endpoint, time.perf_counter() - start, False, type(e).__name__)
+            return None
+        self.recorder.record(
+            endpoint, time.perf_counter() - start, response.status_code < 400, str(response.status_code)
+        )
+        return response if response.status_code < 400 else None
+
+    async def read_aloud(self, client, rng):
+        response = await self.call(
+            client, "/ocr/", files={"file": ("photo.jpg", self.image(rng), "image/jpeg")},
+            headers={"Accept": "application/json"},
+        )
+        if response is None:
+            return
+        # The app reads out what was recognized; the text length mix stands in
+        # for real pages, since stub OCR text is short and repetitive
+        await self.call(client, "/tts/", json={"text": self.text(rng), "voice_description": VOICE_DESCRIPTION})
+
+    async def color_burst(self, client, rng):
+        for _ in range(rng.randint(1, self.args.burst)):
+            await self.call(client, "/detect-color", files={"file": ("photo.jpg", self.image(rng), "image/jpeg")})
+            await asyncio.sleep(rng.uniform(0.1, 0.5))
+
+    async def run(self):
+        flows = {"read_aloud": self.read_aloud, "color_burst": self.color_burst}
+        limits = httpx.Limits(max_connections=self.args.max_connections)
+        # --compare-serve's servers use a self-signed development certificate
+        verify = not getattr(self.args, "self_signed", False)
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits, verify=verify) as client:
+            tasks = []
+            start = time.perf_counter()
+            next_arrival = start
+            while next_arrival - start < self.args.duration:
+                await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+                name = pick(self.flow_mix, self.rng)
+                self.recorder.flows[name] = self.recorder.flows.get(name, 0) + 1
+                # Each flow draws from its own generator, so the workload does not
+                # depend on how the server's response times interleave the flows
+                flow_rng = random.Random(self.rng.getrandbits(32))
+                tasks.append(asyncio.create_task(flows[name](client, flow_rng)))
+                next_arrival += self.rng.expovariate(self.args.rate)
+            await asyncio.gather(*tasks)
+            return self.recorder.report(time.perf_counter() - start)
+
+
+def server_command(setup, port, workers=1, keyfile=None, certfile=None):
+    """
+    Command line of a backend setup: "single" (uvicorn, one worker), "current"
+    (backend/run_https.py's settings: TLS, one worker, reload=True) or "serve"
+    (the production launcher, with TLS when a certificate is given)
+    """
+    if setup == "single":
+        return [sys.executable, "-m", "uvicorn", "Backend:app", "--port", str(port)]
+    if setup == "current":
+        return [sys.executable, "-m", "uvicorn", "Backend:app", "--host", "127.0.0.1", "--port", str(port),
+                "--reload", "--ssl-keyfile", keyfile, "--ssl-certfile", certfile]
+    command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    if certfile:
+        command += ["--keyfile", keyfile, "--certfile", certfile]
+    return command
+
+
+def spawn_server(port, command=None, scheme="http"):
+    """Start the backend with stub models and wait until it answers"""
+    env = dict(os.environ, DRISHTI_STUB_MODELS="1")
+    server = subprocess.Popen(
+        command or server_command("single", port),
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{scheme}://127.0.0.1:{port}/health", timeout=1.0, verify=False).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Backend did not start in time")
+
+
+def print_report(report):
+    print(f"{'endpoint':16s} {'reqs':>6s} {'err%':>6s} {'req/s':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:16s} {stats['requests']:6d} {stats['error_rate'] * 100:6.1f} "
+              f"{stats['throughput_per_s']:7.2f} {stats['p50_s']:8.3f} {stats['p95_s']:8.3f} {stats['p99_s']:8.3f}")
+
+
+def compare_serve(args):
+    """Run the workload against the current startup and serve.py, one after the other"""
+    port = args.spawn_server or 8020
+    args.url = f"https://127.0.0.1:{port}"
+    args.self_signed = True
+    keyfile, certfile = (os.path.abspath(path) for path in generate_self_signed_cert(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "certs")))
+    reports = {}
+    for setup in ("current", "serve"):
+        label = "run_https.py settings" if setup == "current" else f"serve.py --workers {args.compare_serve}"
+        print(f"Running against {label}...")
+        command = server_command(setup, port, args.compare_serve, keyfile, certfile)
+        server = spawn_server(port, command, scheme="https")
+        try:
+            # A new LoadTest with the same seed replays the same flows
+            reports[setup] = asyncio.run(LoadTest(args).run())
+        finally:
+            server.terminate()
+            server.wait()
+        print_report(reports[setup])
+
+    print(f"{'endpoint':16s} {'req/s current':>14s} {'req/s serve':>12s} {'p95 current':>12s} {'p95 serve':>10s}")
+    for endpoint in reports["current"]["endpoints"]:
+        current = reports["current"]["endpoints"][endpoint]
+        served = reports["serve"]["endpoints"].get(endpoint)
+        if served is None:
+            continue
+        print(f"{endpoint:16s} {current['throughput_per_s']:14.2f} {served['throughput_per_s']:12.2f} "
+              f"{current['p95_s']:12.3f} {served['p95_s']:10.3f}")
+    return {"setups": reports, "serve_workers": args.compare_serve}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the mobile app's request mix against the backend")
+    parser.add_argument("--url", default="http://127.0.0.1:8020")
+    parser.add_argument("--rate", type=float, default=2.0, help="Flows started per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to keep starting flows")
+    parser.add_argument("--flow-mix", default="read_aloud=0.6,color_burst=0.4")
+    parser.add_argument("--image-mix", default="small=0.3,medium=0.5,large=0.2")
+    parser.add_argument("--text-mix", default="20=0.4,100=0.4,400=0.2", help="TTS text lengths in characters")
+    parser.add_argument("--burst", type=int, default=5, help="Most /detect-color calls in one burst")
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--spawn-server", type=int, metavar="PORT",
+                        help="Start the backend with stub models on this port and test it")
+    parser.add_argument("--compare-serve", type=int, metavar="WORKERS",
+                        help="Compare run_https.py's startup with serve.py --workers WORKERS "
+                             "(both over TLS with stub models, on --spawn-server's port or 8020)")
+    args = parser.parse_args()
+
+    if args.compare_serve:
+        report = compare_serve(args)
+    else:
+        server = None
+        if args.spawn_server:
+            server = spawn_server(args.spawn_server)
+            args.url = f"http://127.0.0.1:{args.spawn_server}"
+        try:
+            report = asyncio.run(LoadTest(args).run())
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        print_report(report)
+
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("output", "spawn_server")}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
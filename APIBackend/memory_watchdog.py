@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memory watchdog for long-running workers.
+
+Workers that host Parler and EasyOCR slowly grow through allocator
+fragmentation and tensors left behind by failed requests. The watchdog
+samples this process's RSS, records how much each request moved it (per
+endpoint), and can capture tracemalloc snapshots and a census of live torch
+tensors on demand.
+
+When RSS stays above DRISHTI_RSS_LIMIT_MB, the worker recycles itself. It
+reports itself as draining so the gateway and load balancers stop sending it
+work, waits for queued inference to finish, then sends itself SIGTERM for a
+graceful shutdown. The process supervisor (uvicorn with --workers, systemd)
+starts a fresh worker in its place.
+"""
+
+import asyncio
+import gc
+import os
+import signal
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from metrics import REQUEST_RSS_DELTA, WORKER_RSS_BYTES, route_path
+
+# 0 disables recycling
+RSS_LIMIT_BYTES = int(os.environ.get("DRISHTI_RSS_LIMIT_MB", "0")) * 1024 * 1024
+SAMPLE_INTERVAL = 5.0
+# Consecutive samples over the limit before recycling, so a spike does not trigger it
+SAMPLES_OVER_LIMIT = 3
+TRACEMALLOC_FRAMES = 25
+TOP_ALLOCATIONS = 25
+
+state = {
+    "draining": False,
+    "peak_rss": 0,
+    "started": time.time(),
+}
+# Total RSS growth attributed to each endpoint, for /admin/memory
+endpoint_growth = Counter()
+_last_snapshot = None
+
+
+def rss_bytes(pid="self"):
+    """Resident set size of this process, or of another one by pid"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+async def memory_middleware(request, call_next):
+    """Record how much RSS changed while each request was handled"""
+    before = rss_bytes()
+    try:
+        return await call_next(request)
+    finally:
+        delta = rss_bytes() - before
+        endpoint = route_path(request.app, request.scope)
+        # Concurrent requests share the process, so deltas are attributed
+        # approximately; growth that keeps showing up on one endpoint is the signal
+        REQUEST_RSS_DELTA.labels(endpoint).observe(delta)
+        if delta > 0:
+            endpoint_growth[endpoint] += delta
+
+
+async def watch(drain, interval=SAMPLE_INTERVAL, limit=RSS_LIMIT_BYTES):
+    """
+    Sample RSS and recycle the worker once it stays above the limit.
+
+    Args:
+        drain: Coroutine function that waits for in-flight work to finish
+    """
+    over = 0
+    while True:
+        await asyncio.sleep(interval)
+        rss = rss_bytes()
+        WORKER_RSS_BYTES.set(rss)
+        state["peak_rss"] = max(state["peak_rss"], rss)
+        if not limit or state["draining"]:
+            continue
+        over = over + 1 if rss > limit else 0
+        if over >= SAMPLES_OVER_LIMIT:
+            await recycle(drain, f"RSS {rss / 2**20:.0f} MB above limit {limit / 2**20:.0f} MB")
+
+
+async def recycle(drain, reason):
+    """Stop taking work, finish what is in flight, then shut down gracefully"""
+    print(f"Recycling worker {os.getpid()}: {reason}")
+    state["draining"] = True
+    await drain()
+    # uvicorn and hypercorn treat SIGTERM as a graceful shutdown: open requests
+    # complete, then the shutdown handlers run
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def tracemalloc_snapshot(directory):
+    """
+    Start tracing on the first call; later calls save a snapshot and return the
+    top allocations and the growth since the previous snapshot.
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        _last_snapshot = None
+        return {"status": "tracing_started", "detail": "Call again after some traffic to take a snapshot"}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_memory.tracemalloc"
+    snapshot.dump(os.path.join(directory, name))
+
+    result = {
+        "status": "snapshot",
+        "file": name,
+        "traced_bytes": tracemalloc.get_traced_memory()[0],
+        "top": [
+            {"location": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        ],
+    }
+    if _last_snapshot is not None:
+        result["growth"] = [
+            {"location": str(stat.traceback), "bytes": stat.size_diff, "count": stat.count_diff}
+            for stat in snapshot.compare_to(_last_snapshot, "lineno")[:TOP_ALLOCATIONS]
+        ]
+    _last_snapshot = snapshot
+    return result
+
+
+def stop_tracemalloc():
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def torch_snapshot(directory):
+    """
+    Census of live torch tensors by dtype, shape and device.
+
+    On CUDA the caching allocator's own snapshot is saved as well, for
+    https://pytorch.org/memory_viz.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return {"status": "unavailable", "detail": "torch is not loaded"}
+
+    groups = Counter()
+    counts = Counter()
+    for obj in gc.get_objects():
+        try:
+            if not isinstance(obj, torch.Tensor):
+                continue
+            key = (str(obj.dtype), tuple(obj.shape), str(obj.device))
+            groups[key] += obj.numel() * obj.element_size()
+            counts[key] += 1
+        except Exception:
+            continue
+    result = {
+        "status": "snapshot",
+        "tensor_bytes": sum(groups.values()),
+        "top": [
+            {"dtype": dtype, "shape": list(shape), "device": device, "bytes": size, "count": counts[(dtype, shape, device)]}
+            for (dtype, shape, device), size in groups.most_common(TOP_ALLOCATIONS)
+        ],
+    }
+    if torch.cuda.is_available():
+        import pickle
+
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_cuda_memory.pickle"
+        with open(os.path.join(directory, name), "wb") as f:
+            pickle.dump(torch.cuda.memory._snapshot(), f)
+        result["file"] = name
+        result["cuda_allocated_bytes"] = torch.cuda.memory_allocated()
+        result["cuda_reserved_bytes"] = torch.cuda.memory_reserved()
+    return result
+
+
+def stats():
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "peak_rss_bytes": state["peak_rss"],
+        "limit_bytes": RSS_LIMIT_BYTES,
+        "draining": state["draining"],
+        "uptime_seconds": time.time() - state["started"],
+        "tracing": tracemalloc.is_tracing(),
+        "endpoint_growth_bytes": dict(endpoint_growth.most_common()),
+    }
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Request and per-stage latency metrics.
+
+Stage timings are collected per request and exported both as Prometheus
+histograms on /metrics and as a Server-Timing response header, so a slow
+request can be broken down into upload, decode, inference, audio encoding and
+disk I/O.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.routing import Match
+
+# Buckets cover both quick color requests and multi-second TTS generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "drishti_request_duration_seconds",
+    "End-to-end request latency",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "drishti_stage_duration_seconds",
+    "Latency of each processing stage within a request",
+    ["endpoint", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_DEPTH = Gauge(
+    "drishti_queue_depth",
+    "Requests accepted but not yet finished",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+EVENT_LOOP_LAG = Gauge(
+    "drishti_event_loop_lag_seconds",
+    "How late the event loop woke up a periodic timer",
+    multiprocess_mode="max",
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "drishti_model_load_seconds",
+    "Time taken by the most recent load of each model",
+    ["model"],
+    multiprocess_mode="max",
+)
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "drishti_scheduler_queued_jobs",
+    "Inference jobs waiting for a worker",
+    ["service"],
+    multiprocess_mode="livesum",
+)
+SCHEDULER_JOBS = Counter(
+    "drishti_scheduler_jobs_total",
+    "Inference jobs by outcome (completed, failed, cancelled, expired)",
+    ["service", "outcome"],
+)
+COALESCED_REQUESTS = Counter(
+    "drishti_coalesced_requests_total",
+    "Requests that attached to an identical request already in flight",
+    ["service"],
+)
+WORKER_RSS_BYTES = Gauge(
+    "drishti_worker_rss_bytes",
+    "Resident set size of each worker process",
+    multiprocess_mode="all",
+)
+REQUEST_RSS_DELTA = Histogram(
+    "drishti_request_rss_delta_bytes",
+    "Change in worker RSS while a request was handled",
+    ["endpoint"],
+    buckets=(-64 * 2**20, -2**20, 0, 2**20, 4 * 2**20, 16 * 2**20, 64 * 2**20, 256 * 2**20),
+)
+MODEL_RESIDENT_BYTES = Gauge(
+    "drishti_model_resident_bytes",
+    "Memory held by each resident model (0 when unloaded)",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+MODEL_EVICTIONS = Counter(
+    "drishti_model_evictions_total",
+    "Models unloaded to stay within the memory budget",
+    ["model"],
+)
+OCR_QUALITY_TIER = Gauge(
+    "drishti_ocr_quality_tier",
+    "Current OCR quality tier (0 is full quality, higher is cheaper)",
+    multiprocess_mode="max",
+)
+OCR_TIER_SECONDS = Counter(
+    "drishti_ocr_quality_tier_seconds",
+    "Time the OCR service has spent in each quality tier",
+    ["tier"],
+)
+TTS_DECODE_STEPS = Histogram(
+    "drishti_tts_decode_steps",
+    "Decoder steps (codec frames) generated per TTS request",
+    buckets=(50, 100, 200, 400, 800, 1200, 1600, 2000, 2600),
+)
+TTS_EARLY_STOPS = Counter(
+    "drishti_tts_early_stops_total",
+    "TTS generations ended by the length cap or by trailing silence",
+    ["reason"],
+)
+TTS_TRIMMED_SECONDS = Counter(
+    "drishti_tts_trimmed_silence_seconds_total",
+    "Seconds of trailing silence trimmed from generated audio",
+)
+AUTOSCALER_WORKERS = Gauge(
+    "drishti_autoscaler_workers",
+    "Worker processes the autoscaler is running per service (including ones starting up)",
+    ["service"],
+)
+AUTOSCALER_DESIRED_WORKERS = Gauge(
+    "drishti_autoscaler_desired_workers",
+    "Worker processes the autoscaler wants per service, within its bounds",
+    ["service"],
+)
+AUTOSCALER_DECISIONS = Counter(
+    "drishti_autoscaler_decisions_total",
+    "Scaling actions taken or held back, by reason",
+    ["service", "action", "reason"],
+)
+TRIAGE_RETAKES = Counter(
+    "drishti_ocr_triage_retakes_total",
+    "OCR requests answered with a retake instead of running full OCR",
+    ["reason"],
+)
+TRIAGE_AVOIDED_MEGAPIXELS = Counter(
+    "drishti_ocr_triage_avoided_megapixels_total",
+    "Megapixels of images that triage kept from full OCR",
+)
+TTS_CACHE_UNITS = Counter(
+    "drishti_tts_cache_units_total",
+    "Sentence units of TTS requests served from the audio cache (hit) or synthesized (miss)",
+    ["result"],
+)
+
+# Stage timings of the request currently being handled
+_request_timings = ContextVar("request_timings", default=None)
+
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+
+def route_path(app, scope):
+    """Return the route template for a request so metric labels stay bounded"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@contextmanager
+def stage(name):
+    """Time a block of work as a named stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name, seconds):
+    """Record a stage duration for the current request"""
+    timings = _request_timings.get()
+    if timings is None:
+        return
+    timings["stages"].append((name, seconds))
+    STAGE_LATENCY.labels(timings["endpoint"], name).observe(seconds)
+
+
+def record_upload_stage():
+    """
+    Record the time from the start of the request until the handler runs.
+
+    FastAPI receives and parses multipart bodies before calling the handler, so
+    this is the time spent uploading the request.
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        record_stage("upload", time.perf_counter() - timings["start"])
+
+
+def server_timing_header(stages, total):
+    """Format stage timings as a Server-Timing header value"""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+async def metrics_middleware(request, call_next):
+    """Time every request and attach its stage breakdown as Server-Timing"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+
+    endpoint = route_path(request.app, request.scope)
+    timings = {"endpoint": endpoint, "start": time.perf_counter(), "stages": []}
+    token = _request_timings.set(timings)
+    QUEUE_DEPTH.labels(endpoint).inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        total = time.perf_counter() - timings["start"]
+        response.headers["Server-Timing"] = server_timing_header(timings["stages"], total)
+        return response
+    finally:
+        QUEUE_DEPTH.labels(endpoint).dec()
+        REQUEST_LATENCY.labels(endpoint, request.method, str(status)).observe(
+            time.perf_counter() - timings["start"]
+        )
+        _request_timings.reset(token)
+
+
+@contextmanager
+def model_load_timer(model_name):
+    """Time a model load and publish it as a gauge"""
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    MODEL_LOAD_SECONDS.labels(model_name).set(seconds)
+    print(f"Loaded {model_name} in {seconds:.1f}s")
+
+
+async def monitor_event_loop_lag(interval=EVENT_LOOP_LAG_INTERVAL):
+    """Measure how late a periodic sleep wakes up, which is time the loop was blocked"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(0.0, loop.time() - expected))
+
+
+def render_metrics():
+    """Return the Prometheus exposition body and content type"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Several workers (see serve.py): aggregate what every process has written
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
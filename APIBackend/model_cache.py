@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local cache of ready-to-load model artifacts.
+
+Loading Parler from the hub resolves its config and files over the network
+and converts the weights on every boot, which makes restarts and scale-out
+slow and needs network access. Each model is instead stored once under
+DRISHTI_MODEL_CACHE in its final form, with a manifest of file sizes and
+SHA-256 checksums:
+
+- tts/<checkpoint>-<dtype>: the Parler model converted to the serving dtype,
+  as safetensors with its config, plus both tokenizers
+- ocr: EasyOCR's detector and recognizer weights, loaded with downloads
+  disabled (EasyOCR only reads its own .pth files)
+
+The loaders use an artifact when it is present and intact, and fall back to
+the hub otherwise. File sizes are checked on every load; full checksums when
+DRISHTI_MODEL_CACHE_VERIFY=1 or with the verify command.
+
+    python model_cache.py build tts
+    python model_cache.py build ocr --langs kn,en,hi,ta,te
+    python model_cache.py verify
+    python model_cache.py boot-time tts
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+CACHE_ROOT = os.environ.get("DRISHTI_MODEL_CACHE", "model_cache")
+VERIFY_ON_LOAD = os.environ.get("DRISHTI_MODEL_CACHE_VERIFY") == "1"
+MANIFEST = "manifest.json"
+HASH_CHUNK_BYTES = 16 * 1024 * 1024
+BOOT_TIME_RUNS = 3
+
+
+def tts_artifact_dir(checkpoint, dtype):
+    return os.path.join(CACHE_ROOT, "tts", f"{checkpoint.replace('/', '--')}-{dtype}")
+
+
+def ocr_artifact_dir():
+    return os.path.join(CACHE_ROOT, "ocr")
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_manifest(directory, kind, source, **details):
+    """Record every file in an artifact directory with its size and checksum"""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory)
+            if relative == MANIFEST:
+                continue
+            files[relative] = {"bytes": os.path.getsize(path), "sha256": sha256_file(path)}
+    manifest = dict(details, kind=kind, source=source, created=time.time(), files=files)
+    partial = os.path.join(directory, MANIFEST + ".partial")
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=2)
+    # The manifest appears last, so a half-built artifact is never used
+    os.replace(partial, os.path.join(directory, MANIFEST))
+    return manifest
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def verify(directory, full=False):
+    """Problems with an artifact: missing files, wrong sizes and, if full, wrong checksums"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return ["no manifest"]
+    problems = []
+    for relative, expected in manifest["files"].items():
+        path = os.path.join(directory, relative)
+        if not os.path.isfile(path):
+            problems.append(f"{relative}: missing")
+        elif os.path.getsize(path) != expected["bytes"]:
+            problems.append(f"{relative}: {os.path.getsize(path)} bytes, expected {expected['bytes']}")
+        elif full and sha256_file(path) != expected["sha256"]:
+            problems.append(f"{relative}: checksum mismatch")
+    return problems
+
+
+def ready_artifact(directory, full=VERIFY_ON_LOAD):
+    """The manifest of an intact artifact, or None to fall back to the original source"""
+    if read_manifest(directory) is None:
+        return None
+    problems = verify(directory, full)
+    if problems:
+        print(f"Ignoring damaged model artifact {directory}: {'; '.join(problems)}")
+        return None
+    return read_manifest(directory)
+
+
+def ocr_reader_options(lang):
+    """easyocr.Reader arguments that load lang from the cache without network, or {}"""
+    manifest = ready_artifact(ocr_artifact_dir())
+    if manifest is None or lang not in manifest["languages"]:
+        return {}
+    return {"model_storage_directory": ocr_artifact_dir(), "download_enabled": False}
+
+
+def build_ocr(langs):
+    """Download EasyOCR weights for the languages into the cache"""
+    import easyocr
+
+    directory = ocr_artifact_dir()
+    os.makedirs(directory, exist_ok=True)
+    built = set((read_manifest(directory) or {}).get("languages", []))
+    for lang in langs:
+        print(f"Fetching EasyOCR weights for '{lang}'...")
+        easyocr.Reader([lang], gpu=False, model_storage_directory=directory, download_enabled=True)
+        built.add(lang)
+    return write_manifest(directory, "ocr", "easyocr", languages=sorted(built), easyocr_version=easyocr.__version__)
+
+
+def load_once(kind, source, lang):
+    """
+    Load one model in this process and return the seconds it took, as
+    published in the drishti_model_load_seconds gauge by the server's loaders
+    """
+    from prometheus_client import REGISTRY
+
+    from metrics import model_load_timer
+
+    if kind == "tts":
+        import tts_engine
+
+        model = "tts"
+        tts_engine.load_tts_bundle(use_cache=(source == "cache"))
+    else:
+        import easyocr
+
+        model = f"ocr:{lang}"
+        options = ocr_reader_options(lang) if source == "cache" else {}
+        if source == "cache" and not options:
+            raise SystemExit(f"No OCR artifact for '{lang}'; run: python model_cache.py build ocr --langs {lang}")
+        with model_load_timer(model):
+            easyocr.Reader([lang], **options)
+    return REGISTRY.get_sample_value("drishti_model_load_seconds", {"model": model})
+
+
+def boot_time(kind, lang, runs=BOOT_TIME_RUNS):
+    """Time loading from the original source and from the cache, each in fresh processes"""
+    report = {}
+    for source in ("hub", "cache"):
+        loads, totals = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "load", kind, "--source", source, "--lang", lang],
+                check=True, stdout=subprocess.PIPE, text=True,
+            ).stdout
+            totals.append(time.perf_counter() - start)
+            loads.append(json.loads(output.strip().splitlines()[-1])["load_seconds"])
+        # Process totals include interpreter start-up and imports
+        report[source] = {"load_seconds": min(loads), "process_seconds": min(totals)}
+    report["speedup"] = report["hub"]["load_seconds"] / report["cache"]["load_seconds"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and check the local model artifact cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Store a model in the cache")
+    build.add_argument("kind", choices=["tts", "ocr"])
+    build.add_argument("--checkpoint", help="Parler checkpoint (default: the served one)")
+    build.add_argument("--dtype", help="Serving dtype (default: float16 on CUDA, float32 on CPU)")
+    build.add_argument("--langs", default="kn,en,hi,ta,te")
+    sub.add_parser("verify", help="Check every artifact against its checksums")
+    timing = sub.add_parser("boot-time", help="Compare load times from the hub and from the cache")
+    timing.add_argument("kind", choices=["tts", "ocr"])
+    timing.add_argument("--lang", default="kn")
+    timing.add_argument("--output", default="boot_time.json")
+    load = sub.add_parser("load", help=argparse.SUPPRESS)
+    load.add_argument("kind", choices=["tts", "ocr"])
+    load.add_argument("--source", choices=["hub", "cache"])
+    load.add_argument("--lang", default="kn")
+    args = parser.parse_args()
+
+    if args.command == "build" and args.kind == "tts":
+        import tts_engine
+
+        manifest = tts_engine.build_tts_artifact(args.checkpoint or tts_engine.TTS_CHECKPOINT, args.dtype)
+        print(f"Stored {len(manifest['files'])} files for {manifest['source']} ({manifest['dtype']})")
+    elif args.command == "build":
+        manifest = build_ocr([lang.strip() for lang in args.langs.split(",")])
+        print(f"Stored {len(manifest['files'])} files for languages {', '.join(manifest['languages'])}")
+    elif args.command == "verify":
+        directories = [ocr_artifact_dir()]
+        tts_root = os.path.join(CACHE_ROOT, "tts")
+        if os.path.isdir(tts_root):
+            directories += [os.path.join(tts_root, name) for name in sorted(os.listdir(tts_root))]
+        failed = False
+        for directory in directories:
+            if read_manifest(directory) is None:
+                continue
+            problems = verify(directory, full=True)
+            failed = failed or bool(problems)
+            print(f"{directory}: {'; '.join(problems) if problems else 'ok'}")
+        sys.exit(1 if failed else 0)
+    elif args.command == "boot-time":
+        report = boot_time(args.kind, args.lang)
+        for source in ("hub", "cache"):
+            print(f"{source:6s} load {report[source]['load_seconds']:7.2f}s  "
+                  f"process {report[source]['process_seconds']:7.2f}s")
+        print(f"Cache loads {report['speedup']:.1f}x faster")
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps({"load_seconds": load_once(args.kind, args.source, args.lang)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memory-budgeted residency of models.
+
+Models are registered with a loader and loaded on first use. The manager
+tracks each resident model's size and last use, and when loading another model
+would exceed the memory budget it unloads idle, unpinned models in
+least-recently-used order. Models in use by a request are never unloaded, and
+pinned ("hot") models stay resident once loaded.
+
+A model can be swapped for a new version without downtime: the new version is
+loaded and warmed up next to the current one, new requests switch to it at
+once, and the old version is unloaded when its last in-flight request ends.
+"""
+
+import gc
+import threading
+import time
+from contextlib import contextmanager
+
+from memory_watchdog import rss_bytes
+from metrics import MODEL_EVICTIONS, MODEL_RESIDENT_BYTES, record_stage
+
+try:
+    import torch
+except ImportError:  # Sizes fall back to RSS deltas
+    torch = None
+
+
+def _tensor_bytes(obj, seen):
+    """Bytes of parameters and buffers of the torch modules reachable from obj"""
+    if torch is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, torch.nn.Module):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if isinstance(obj, (list, tuple)):
+        return sum(_tensor_bytes(item, seen) for item in obj)
+    # EasyOCR's Reader keeps its networks in plain attributes
+    total = 0
+    for value in getattr(obj, "__dict__", {}).values():
+        if isinstance(value, (torch.nn.Module, list, tuple)):
+            total += _tensor_bytes(value, seen)
+    return total
+
+
+def model_bytes(model, rss_delta=0):
+    """Best estimate of a model's memory: its tensors, or the RSS growth while loading"""
+    return max(_tensor_bytes(model, set()), rss_delta)
+
+
+class ModelEntry:
+    def __init__(self, name, loader, unloader=None, pinned=False, version=None):
+        self.name = name
+        self.version = version
+        self.loader = loader
+        self.unloader = unloader
+        self.pinned = pinned
+        self.model = None
+        self.bytes = 0
+        self.last_used = None
+        self.in_use = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = None
+        self.retired = False
+        self.lock = threading.Lock()
+
+    @property
+    def resident(self):
+        return self.model is not None
+
+
+class ModelResidencyManager:
+    """
+    Load models on demand within a memory budget.
+
+    Args:
+        budget_bytes: Total bytes resident models may use
+        hot: Names of models that are never unloaded once loaded
+    """
+
+    def __init__(self, budget_bytes, hot=()):
+        self.budget_bytes = budget_bytes
+        self.hot = set(hot)
+        self.evictions = 0
+        self._entries = {}
+        # Versions being warmed up or waiting for in-flight requests to finish
+        self._detached = []
+        self._lock = threading.RLock()
+        self._swap_lock = threading.Lock()
+
+    def register(self, name, loader, unloader=None, pinned=None, replace=False, version=None):
+        """Register a model; loader() returns it and unloader(model) releases it"""
+        with self._lock:
+            if name in self._entries and not replace:
+                return self._entries[name]
+            if name in self._entries:
+                self._unload(self._entries[name])
+            entry = ModelEntry(name, loader, unloader, name in self.hot if pinned is None else pinned, version)
+            self._entries[name] = entry
+            return entry
+
+    def is_registered(self, name):
+        return name in self._entries
+
+    @property
+    def resident_bytes(self):
+        entries = list(self._entries.values()) + self._detached
+        return sum(entry.bytes for entry in entries if entry.resident)
+
+    def _publish_bytes(self, name):
+        # Old and new versions of a model both count while a swap is under way
+        entries = list(self._entries.values()) + self._detached
+        MODEL_RESIDENT_BYTES.labels(name).set(sum(e.bytes for e in entries if e.name == name and e.resident))
+
+    def _unload(self, entry):
+        model, entry.model = entry.model, None
+        if model is not None and entry.unloader is not None:
+            entry.unloader(model)
+        del model
+        entry.bytes = 0
+        self._publish_bytes(entry.name)
+        gc.collect()
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _make_room(self, needed):
+        """Unload idle, unpinned models (least recently used first) until needed bytes fit"""
+        with self._lock:
+            candidates = sorted(
+                (e for e in self._entries.values() if e.resident and not e.pinned and e.in_use == 0),
+                key=lambda e: e.last_used or 0,
+            )
+            for entry in candidates:
+                if self.resident_bytes + needed <= self.budget_bytes:
+                    break
+                print(f"Unloading {entry.name} ({entry.bytes / 2**20:.0f} MB) to stay within the model memory budget")
+                self._unload(entry)
+                entry.evictions += 1
+                self.evictions += 1
+                MODEL_EVICTIONS.labels(entry.name).inc()
+
+    def _load(self, entry):
+        # Use the size from a previous load, if any, to make room up front
+        self._make_room(entry.bytes)
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        model = entry.loader()
+        entry.load_seconds = time.perf_counter() - start
+        record_stage("model_load", entry.load_seconds)
+        entry.model = model
+        entry.bytes = model_bytes(model, rss_bytes() - rss_before)
+        entry.loads += 1
+        self._publish_bytes(entry.name)
+        # The real size is known now; unload others if it pushed us over
+        self._make_room(0)
+        if self.resident_bytes > self.budget_bytes:
+            print(f"Model memory {self.resident_bytes / 2**20:.0f} MB exceeds the budget "
+                  f"of {self.budget_bytes / 2**20:.0f} MB; every other model is pinned or in use")
+
+    @contextmanager
+    def use_entry(self, name):
+        """Like use(), but yields the entry so the caller can report its version"""
+        # Taken together with the count, so a swap cannot retire the entry in between
+        with self._lock:
+            entry = self._entries[name]
+            entry.in_use += 1
+        with entry.lock:
+            try:
+                if entry.model is None:
+                    self._load(entry)
+            except BaseException:
+                with self._lock:
+                    entry.in_use -= 1
+                raise
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+                if entry.retired and entry.in_use == 0:
+                    self._retire(entry)
+
+    @contextmanager
+    def use(self, name):
+        """Load a model if needed and keep it resident for the duration of the block"""
+        with self.use_entry(name) as entry:
+            yield entry.model
+
+    def _retire(self, entry):
+        if entry in self._detached:
+            self._detached.remove(entry)
+        if entry.resident:
+            print(f"Unloading {entry.name} version {entry.version}; its last request has finished")
+            self._unload(entry)
+
+    def swap(self, name, loader, version, unloader=None, warmup=None):
+        """
+        Replace a model with a new version without interrupting requests.
+
+        The new version is loaded and warmed up while the current one keeps
+        serving. Requests that start after the switch get the new version;
+        the old one is unloaded when the requests using it have finished.
+
+        Args:
+            loader: Returns the new version of the model
+            version: Label reported with responses served by the new version
+            warmup: Optional callable run on the loaded model before the switch
+
+        Returns:
+            The previous and new versions
+        """
+        with self._swap_lock:
+            old = self._entries[name]
+            entry = ModelEntry(name, loader, unloader, old.pinned, version)
+            # The new version is probably about as large as the current one
+            entry.bytes = old.bytes
+            with self._lock:
+                self._detached.append(entry)
+            try:
+                self._load(entry)
+                if warmup is not None:
+                    start = time.perf_counter()
+                    warmup(entry.model)
+                    record_stage("model_warmup", time.perf_counter() - start)
+            except BaseException:
+                with self._lock:
+                    self._retire(entry)
+                raise
+
+            with self._lock:
+                self._detached.remove(entry)
+                self._entries[name] = entry
+                old.retired = True
+                if old.in_use:
+                    self._detached.append(old)
+                else:
+                    self._retire(old)
+            print(f"Swapped {name} from version {old.version} to {version}; "
+                  f"{old.in_use} requests still finishing on the old version")
+            return {"model": name, "previous_version": old.version, "version": version, "draining": old.in_use}
+
+    def unload(self, name):
+        """Unload a model now if nothing is using it; returns whether it was unloaded"""
+        entry = self._entries[name]
+        with entry.lock, self._lock:
+            if entry.resident and entry.in_use == 0:
+                self._unload(entry)
+                return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self.resident_bytes,
+                "evictions": self.evictions,
+                "models": {
+                    name: {
+                        "version": entry.version,
+                        "resident": entry.resident,
+                        "bytes": entry.bytes,
+                        "pinned": entry.pinned,
+                        "in_use": entry.in_use,
+                        "last_used": entry.last_used,
+                        "loads": entry.loads,
+                        "evictions": entry.evictions,
+                        "load_seconds": entry.load_seconds,
+                    }
+                    for name, entry in self._entries.items()
+                },
+                "retiring": [
+                    {"model": entry.name, "version": entry.version, "in_use": entry.in_use}
+                    for entry in self._detached if entry.retired
+                ],
+            }
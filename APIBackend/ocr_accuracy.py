@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OCR accuracy and speed on the synthetic Kannada corpus (ocr_corpus.py).
+
+For each OCR backend and quality tier, reports the character error rate
+against the ground truth next to latency and throughput, so a speed
+optimization that costs accuracy shows up. Backends:
+
+- easyocr: an in-process reader with the tier's settings, as /ocr/ runs it
+- tiled: the full-resolution tiled path used for large scans
+- api: a running server's /ocr/ endpoint (the server picks the tier)
+
+Usage:
+    python ocr_corpus.py --count 500
+    python ocr_accuracy.py ocr_corpus/v1-seed0-n500-3f9c2a1e --backends easyocr,tiled
+    python ocr_accuracy.py <corpus> --baseline ocr_accuracy_baseline.json
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import model_cache
+import ocr_corpus
+import ocr_quality
+import tiled_ocr
+
+# A run regresses when CER rises by more than this (absolute) over the baseline
+DEFAULT_CER_THRESHOLD = 0.01
+# ...or when its median latency is this much slower
+DEFAULT_LATENCY_THRESHOLD = 0.20
+REQUEST_TIMEOUT = 120.0
+
+_readers = {}
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def get_reader(lang):
+    """One reader per language, shared by the runs of every tier"""
+    if lang not in _readers:
+        import easyocr
+
+        _readers[lang] = easyocr.Reader([lang], **model_cache.ocr_reader_options(lang))
+    return _readers[lang]
+
+
+def easyocr_backend(lang, tier):
+    reader = get_reader(lang)
+
+    def read(data):
+        image = ocr_quality.downscale(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), tier["max_side"])
+        return " ".join(result[1] for result in reader.readtext(image, **tier["readtext"]))
+
+    return read
+
+
+def tiled_backend(lang, tier):
+    reader = get_reader(lang)
+    options = dict(tier["readtext"], canvas_size=tiled_ocr.TILE_SIZE)
+
+    def read(data):
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        tile_results = [
+            ((x0, y0, x1, y1), reader.readtext(image[y0:y1, x0:x1], **options))
+            for x0, y0, x1, y1 in tiled_ocr.make_tiles(image.shape)
+        ]
+        return " ".join(result[1] for result in tiled_ocr.merge(tile_results, image.shape))
+
+    return read
+
+
+def api_backend(url, lang):
+    import httpx
+
+    client = httpx.Client(timeout=REQUEST_TIMEOUT)
+
+    def read(data):
+        response = client.post(
+            f"{url}/ocr/", params={"lang": lang, "skip_triage": "true"},
+            files={"file": ("sample.jpg", data, "image/jpeg")},
+        )
+        response.raise_for_status()
+        return response.json()["text"]
+
+    return read
+
+
+def evaluate(read, records):
+    """Run read over the corpus; returns summary statistics and per-sample results"""
+    latencies, samples = [], []
+    edits = characters = exact = 0
+    # Warm up outside the timed window
+    with open(records[0]["path"], "rb") as f:
+        read(f.read())
+    start = time.perf_counter()
+    for record in records:
+        with open(record["path"], "rb") as f:
+            data = f.read()
+        begin = time.perf_counter()
+        text = ocr_corpus.normalize_text(read(data))
+        latencies.append(time.perf_counter() - begin)
+        distance = edit_distance(record["text"], text)
+        edits += distance
+        characters += len(record["text"])
+        exact += distance == 0
+        samples.append({"id": record["id"], "text": text, "cer": distance / float(max(1, len(record["text"])))})
+    elapsed = time.perf_counter() - start
+    return {
+        "images": len(records),
+        # Corpus-level CER: total edits over total reference characters
+        "cer": edits / float(max(1, characters)),
+        "mean_sample_cer": sum(s["cer"] for s in samples) / max(1, len(samples)),
+        "exact_match_rate": exact / float(max(1, len(records))),
+        "median_s": ocr_quality.percentile(latencies, 0.5),
+        "p95_s": ocr_quality.percentile(latencies, 0.95),
+        "images_per_second": len(records) / elapsed,
+    }, samples
+
+
+def compare(results, baseline, cer_threshold, latency_threshold):
+    """Return messages for runs whose CER or median latency regressed"""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if stats["cer"] > before["cer"] + cer_threshold:
+            regressions.append(f"{name}: CER {before['cer']:.3f} -> {stats['cer']:.3f}")
+        if stats["median_s"] > before["median_s"] * (1 + latency_threshold):
+            regressions.append(f"{name}: median {before['median_s']:.3f}s -> {stats['median_s']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure OCR accuracy and speed on a synthetic corpus")
+    parser.add_argument("corpus", help="Corpus directory written by ocr_corpus.py")
+    parser.add_argument("--backends", default="easyocr", help="Comma-separated: easyocr, tiled, api")
+    parser.add_argument("--tiers", default=",".join(tier["name"] for tier in ocr_quality.QUALITY_TIERS))
+    parser.add_argument("--lang", default="kn")
+    parser.add_argument("--url", default="http://127.0.0.1:8020", help="Server for the api backend")
+    parser.add_argument("--limit", type=int, help="Use only the first N images")
+    parser.add_argument("--output", default="ocr_accuracy.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--cer-threshold", type=float, default=DEFAULT_CER_THRESHOLD)
+    parser.add_argument("--latency-threshold", type=float, default=DEFAULT_LATENCY_THRESHOLD)
+    args = parser.parse_args()
+
+    records = ocr_corpus.load(args.corpus)[:args.limit]
+    with open(os.path.join(args.corpus, "manifest.json")) as f:
+        manifest = json.load(f)
+    tiers = [tier for tier in ocr_quality.QUALITY_TIERS if tier["name"] in args.tiers.split(",")]
+
+    runs = []
+    for backend in args.backends.split(","):
+        if backend == "api":
+            runs.append(("api/server", lambda: api_backend(args.url, args.lang)))
+            continue
+        make = {"easyocr": easyocr_backend, "tiled": tiled_backend}[backend]
+        runs += [(f"{backend}/{tier['name']}", lambda make=make, tier=tier: make(args.lang, tier)) for tier in tiers]
+
+    results, samples = {}, {}
+    for name, make in runs:
+        print(f"Running {name} on {len(records)} images...")
+        results[name], samples[name] = evaluate(make(), records)
+
+    print(f"{'run':24s} {'CER':>7s} {'exact':>7s} {'median':>8s} {'p95':>8s} {'img/s':>7s}")
+    for name, stats in results.items():
+        print(f"{name:24s} {stats['cer']:7.3f} {stats['exact_match_rate']:7.2f} {stats['median_s']:8.3f} "
+              f"{stats['p95_s']:8.3f} {stats['images_per_second']:7.2f}")
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(), "corpus": os.path.basename(args.corpus.rstrip("/")),
+                 "corpus_manifest": manifest, "lang": args.lang},
+        "results": results,
+        "samples": samples,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["corpus"] != report["meta"]["corpus"]:
+            print(f"Warning: baseline was measured on corpus {baseline['meta']['corpus']}")
+        regressions = compare(results, baseline["results"], args.cer_threshold, args.latency_threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
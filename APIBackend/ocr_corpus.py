@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic Kannada OCR corpus with ground truth.
+
+Renders Kannada sentences with varied fonts, sizes, blur, rotation, lighting,
+background noise and JPEG compression, like photos taken with the app. A
+corpus is fully determined by the generator version, the seed, the sample
+count, the fonts and the sentences, and is written to its own versioned
+directory (the suffix is a digest of the fonts and sentences):
+
+    ocr_corpus/v1-seed0-n500-3f9c2a1e/
+        images/00000.jpg ...
+        ground_truth.jsonl   one line per image: text and rendering parameters
+        manifest.json        generator version, seed, fonts and their checksums
+
+Kannada needs complex text shaping, so Pillow must be built with libraqm;
+without it conjuncts are rendered wrongly and would not match the ground truth.
+
+    python ocr_corpus.py --count 500 --fonts /usr/share/fonts/truetype/noto
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import unicodedata
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, features
+
+# Bump when rendering changes, so corpora made by different generators never mix
+GENERATOR_VERSION = 1
+CORPUS_ROOT = os.environ.get("DRISHTI_OCR_CORPUS", "ocr_corpus")
+FONT_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts"), "C:/Windows/Fonts"]
+KANNADA_FONT_NAMES = re.compile(r"kannada|knda|tunga|tamma|kedage|mallige", re.IGNORECASE)
+
+SENTENCES = [
+    "ಇದು ದೃಷ್ಟಿಹೀನ ಜನರಿಗೆ ಸಹಾಯ ಮಾಡುವ ಯೋಜನೆಯಾಗಿದೆ.",
+    "ಕನ್ನಡ ನಾಡು ನುಡಿ ನಮ್ಮ ಹೆಮ್ಮೆ.",
+    "ಬೆಂಗಳೂರು ಕರ್ನಾಟಕ ರಾಜ್ಯದ ರಾಜಧಾನಿ.",
+    "ದಯವಿಟ್ಟು ಬಾಗಿಲನ್ನು ಮುಚ್ಚಿ.",
+    "ಔಷಧಿಯನ್ನು ದಿನಕ್ಕೆ ಎರಡು ಬಾರಿ ಊಟದ ನಂತರ ತೆಗೆದುಕೊಳ್ಳಿ.",
+    "ಮುಂದಿನ ನಿಲ್ದಾಣ ಮೆಜೆಸ್ಟಿಕ್.",
+    "ಬೆಲೆ ನೂರ ಇಪ್ಪತ್ತು ರೂಪಾಯಿ ಮಾತ್ರ.",
+    "ಪ್ರವೇಶ ದ್ವಾರ ಎಡಭಾಗದಲ್ಲಿದೆ.",
+    "ಶಾಲೆಗೆ ರಜೆ ಘೋಷಿಸಲಾಗಿದೆ.",
+    "ಹಾಲು ಮೊಸರು ಮತ್ತು ತುಪ್ಪ ಇಲ್ಲಿ ದೊರೆಯುತ್ತದೆ.",
+    "ಧೂಮಪಾನ ಆರೋಗ್ಯಕ್ಕೆ ಹಾನಿಕರ.",
+    "ಅಂಚೆ ಕಚೇರಿ ಬೆಳಿಗ್ಗೆ ಹತ್ತು ಗಂಟೆಗೆ ತೆರೆಯುತ್ತದೆ.",
+    "ವಾಹನಗಳನ್ನು ಇಲ್ಲಿ ನಿಲ್ಲಿಸಬೇಡಿ.",
+    "ಗ್ರಂಥಾಲಯದಲ್ಲಿ ಮೌನವನ್ನು ಕಾಪಾಡಿ.",
+    "ತುರ್ತು ಸಂದರ್ಭದಲ್ಲಿ ನೂರ ಎಂಟಕ್ಕೆ ಕರೆ ಮಾಡಿ.",
+    "ಕುಡಿಯುವ ನೀರು ಎರಡನೇ ಮಹಡಿಯಲ್ಲಿದೆ.",
+    "ಕ್ಷಮಿಸಿ, ಈ ರಸ್ತೆ ದುರಸ್ತಿಯಲ್ಲಿದೆ.",
+    "ಶ್ರೀ ಕೃಷ್ಣ ಜನ್ಮಾಷ್ಟಮಿಯ ಶುಭಾಶಯಗಳು.",
+    "ಪರೀಕ್ಷೆಯ ಫಲಿತಾಂಶ ನಾಳೆ ಪ್ರಕಟವಾಗಲಿದೆ.",
+    "ಉಪಾಹಾರ ಗೃಹ ರಾತ್ರಿ ಒಂಬತ್ತು ಗಂಟೆಯವರೆಗೆ ತೆರೆದಿರುತ್ತದೆ.",
+]
+
+# Ranges the rendering parameters are drawn from
+FONT_SIZES = (22, 72)
+MAX_LINES = 3
+BLUR_SIGMA = (0.0, 2.0)
+ROTATION_DEGREES = (-8.0, 8.0)
+LIGHTING_GAIN = (0.45, 1.15)
+LIGHTING_GRADIENT = (0.0, 0.5)
+NOISE_SIGMA = (0.0, 14.0)
+JPEG_QUALITY = (45, 95)
+MARGIN = 40
+
+
+def normalize_text(text):
+    """NFC with whitespace collapsed, as ground truth and OCR output are compared"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def find_fonts(paths=None):
+    """Kannada-capable font files given explicitly or found in the usual font directories"""
+    fonts = []
+    for path in paths or FONT_DIRS:
+        if os.path.isfile(path):
+            fonts.append(path)
+            continue
+        for candidate in glob.glob(os.path.join(path, "**", "*"), recursive=True):
+            name = os.path.basename(candidate)
+            if name.lower().endswith((".ttf", ".otf")) and (paths or KANNADA_FONT_NAMES.search(name)):
+                fonts.append(candidate)
+    return sorted(set(fonts))
+
+
+def sha256_file(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def background(width, height, rng):
+    """Paper-like background with a colour cast and grain"""
+    base = np.array([rng.uniform(170, 255), rng.uniform(170, 255), rng.uniform(160, 250)], dtype=np.float32)
+    grain = rng.normal(0, rng.uniform(2, 10), (height, width, 1)).astype(np.float32)
+    return np.clip(base + grain, 0, 255)
+
+
+def render_text(lines, font, width, height, rng):
+    """Dark text drawn on a background, returned as a float32 RGB array"""
+    canvas = Image.fromarray(background(width, height, rng).astype(np.uint8))
+    draw = ImageDraw.Draw(canvas)
+    ink = tuple(int(v) for v in rng.uniform(0, 70, 3))
+    y = MARGIN
+    for line in lines:
+        draw.text((MARGIN, y), line, font=font, fill=ink)
+        y += int(font.size * 1.6)
+    return np.asarray(canvas, dtype=np.float32)
+
+
+def rotate(image, degrees):
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), degrees, 1.0)
+    edge = tuple(float(v) for v in image[0, 0])
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=edge)
+
+
+def light(image, gain, gradient, angle):
+    """Overall exposure gain times a linear falloff across the image, like a lamp off to one side"""
+    height, width = image.shape[:2]
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    direction = xs / width * math.cos(angle) + ys / height * math.sin(angle)
+    direction -= direction.min()
+    falloff = 1.0 - gradient * direction / max(float(direction.max()), 1e-6)
+    return image * (gain * falloff)[..., None]
+
+
+def make_sample(sentences, fonts, rng):
+    """Render one image; returns the encoded JPEG and its ground truth"""
+    lines = [sentences[i] for i in rng.choice(len(sentences), int(rng.integers(1, MAX_LINES + 1)))]
+    font_path = fonts[int(rng.integers(len(fonts)))]
+    size = int(rng.integers(FONT_SIZES[0], FONT_SIZES[1] + 1))
+    font = ImageFont.truetype(font_path, size, layout_engine=ImageFont.Layout.RAQM)
+    text_width = max(int(font.getlength(line)) for line in lines)
+    width = text_width + 2 * MARGIN
+    height = int(size * 1.6) * len(lines) + 2 * MARGIN
+
+    params = {
+        "font": os.path.basename(font_path),
+        "font_size": size,
+        "rotation": float(rng.uniform(*ROTATION_DEGREES)),
+        "blur_sigma": float(rng.uniform(*BLUR_SIGMA)),
+        "lighting_gain": float(rng.uniform(*LIGHTING_GAIN)),
+        "lighting_gradient": float(rng.uniform(*LIGHTING_GRADIENT)),
+        "noise_sigma": float(rng.uniform(*NOISE_SIGMA)),
+        "jpeg_quality": int(rng.integers(JPEG_QUALITY[0], JPEG_QUALITY[1] + 1)),
+    }
+    image = render_text(lines, font, width, height, rng)
+    image = rotate(image, params["rotation"])
+    if params["blur_sigma"] > 0.3:
+        image = cv2.GaussianBlur(image, (0, 0), params["blur_sigma"])
+    image = light(image, params["lighting_gain"], params["lighting_gradient"], float(rng.uniform(0, 2 * math.pi)))
+    image += rng.normal(0, params["noise_sigma"], image.shape).astype(np.float32)
+    # Rendered as RGB, encoded as OpenCV's BGR
+    bgr = cv2.cvtColor(np.clip(image, 0, 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
+    ok, data = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, params["jpeg_quality"]])
+    if not ok:
+        raise RuntimeError("Could not encode corpus image")
+    return data.tobytes(), dict(params, text=normalize_text(" ".join(lines)), lines=lines)
+
+
+def corpus_dir(seed, count, fonts, sentences, root=CORPUS_ROOT):
+    digest = hashlib.sha256()
+    for part in [os.path.basename(path) for path in fonts] + list(sentences):
+        digest.update(part.encode("utf-8") + b"\0")
+    return os.path.join(root, f"v{GENERATOR_VERSION}-seed{seed}-n{count}-{digest.hexdigest()[:8]}")
+
+
+def generate(count, seed=0, fonts=None, sentences=SENTENCES, root=CORPUS_ROOT):
+    """Write a corpus and return its directory; an existing complete corpus is reused"""
+    directory = corpus_dir(seed, count, fonts or [], sentences, root)
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        print(f"Corpus {directory} already exists")
+        return directory
+    if not features.check_feature("raqm"):
+        raise SystemExit("Pillow was built without libraqm, which Kannada text shaping needs")
+    if not fonts:
+        raise SystemExit("No Kannada fonts found; pass --fonts (e.g. Noto Sans Kannada, Lohit Kannada)")
+
+    os.makedirs(os.path.join(directory, "images"), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(directory, "ground_truth.jsonl"), "w", encoding="utf-8") as f:
+        for index in range(count):
+            data, truth = make_sample(sentences, fonts, rng)
+            name = os.path.join("images", f"{index:05d}.jpg")
+            with open(os.path.join(directory, name), "wb") as image_file:
+                image_file.write(data)
+            f.write(json.dumps(dict(truth, id=index, file=name), ensure_ascii=False) + "\n")
+
+    manifest = {
+        "generator_version": GENERATOR_VERSION,
+        "seed": seed,
+        "count": count,
+        "fonts": {os.path.basename(path): sha256_file(path) for path in fonts},
+        "sentences_sha256": hashlib.sha256("\n".join(sentences).encode("utf-8")).hexdigest(),
+    }
+    # Written last, so an interrupted run is not mistaken for a complete corpus
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return directory
+
+
+def load(directory):
+    """Ground truth records of a corpus, with absolute image paths"""
+    with open(os.path.join(directory, "ground_truth.jsonl"), encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        record["path"] = os.path.join(directory, record["file"])
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a synthetic Kannada OCR corpus with ground truth")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fonts", nargs="*", help="Font files or directories (default: search system fonts)")
+    parser.add_argument("--text-file", help="Extra sentences, one per line")
+    parser.add_argument("--root", default=CORPUS_ROOT)
+    args = parser.parse_args()
+
+    sentences = list(SENTENCES)
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as f:
+            sentences += [line.strip() for line in f if line.strip()]
+    fonts = find_fonts(args.fonts)
+    print(f"Rendering {args.count} images with {len(fonts)} fonts")
+    directory = generate(args.count, args.seed, fonts, sentences, args.root)
+    print(f"Corpus written to {directory}")
+
+
+if __name__ == "__main__":
+    main()
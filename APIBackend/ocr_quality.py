@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Load-adaptive OCR quality.
+
+When the OCR queue builds up, running every request at full quality makes all
+of them miss their latency budget together. The controller watches the OCR
+scheduler's queue depth and the p95 of recent OCR latencies and steps down to
+cheaper settings (smaller detection canvas, downscaled input) as they cross
+thresholds. It steps back up one tier at a time once load has stayed below
+the lower tier's thresholds for a while, so it does not flap.
+
+Latency thresholds are multiples of the full tier's normal latency on this
+machine, since a CPU node and a GPU node differ by an order of magnitude. The
+baseline is DRISHTI_OCR_BASELINE_SECONDS or, when unset, the median of the
+first full-tier requests. Latency alone only steps down while requests are
+queued; a slow machine with an empty queue has nothing to gain from it.
+"""
+
+import asyncio
+import collections
+import os
+import threading
+import time
+
+import cv2
+
+from metrics import OCR_QUALITY_TIER, OCR_TIER_SECONDS
+
+# Ordered from best to cheapest. Thresholds are the queue depth and the p95 latency,
+# as a multiple of the full tier's baseline, at or above which the service steps
+# down to that tier.
+QUALITY_TIERS = [
+    {
+        "name": "full",
+        "queue_depth": 0,
+        "p95_ratio": 0.0,
+        # EasyOCR's own defaults (2560 px canvas, greedy decoding), as /ocr/ ran before tiers existed
+        "readtext": {},
+        "max_side": None,
+    },
+    {
+        "name": "balanced",
+        "queue_depth": 2,
+        "p95_ratio": 2.0,
+        "readtext": {"canvas_size": 1600, "decoder": "greedy"},
+        "max_side": None,
+    },
+    {
+        "name": "reduced",
+        "queue_depth": 5,
+        "p95_ratio": 4.0,
+        "readtext": {"canvas_size": 1024, "decoder": "greedy"},
+        "max_side": 1600,
+    },
+    {
+        "name": "minimal",
+        "queue_depth": 10,
+        "p95_ratio": 8.0,
+        "readtext": {"canvas_size": 640, "decoder": "greedy"},
+        "max_side": 1024,
+    },
+]
+
+# Latencies older than this do not count towards the p95
+LATENCY_WINDOW_SECONDS = 30.0
+MIN_SAMPLES_FOR_P95 = 5
+# Seconds a full-tier OCR request normally takes; calibrated from the first
+# CALIBRATION_SAMPLES full-tier requests when unset
+BASELINE_SECONDS = float(os.environ.get("DRISHTI_OCR_BASELINE_SECONDS", "0")) or None
+CALIBRATION_SAMPLES = 10
+# Load must stay below a tier's thresholds this long before stepping back up to it
+RECOVERY_SECONDS = float(os.environ.get("DRISHTI_OCR_RECOVERY_SECONDS", "10"))
+# Thresholds are scaled by this when stepping up, so load hovering around one does not flap
+RECOVERY_FACTOR = 0.7
+TIER_ACCOUNTING_INTERVAL = 1.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def downscale(image, max_side):
+    """Shrink image so its longest side is at most max_side"""
+    if max_side is None:
+        return image
+    height, width = image.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+class QualityController:
+    """
+    Pick an OCR quality tier from the current load.
+
+    Args:
+        queue_depth: Callable returning the number of queued OCR jobs
+        tiers: Tier definitions, best first
+        baseline: Normal full-tier latency in seconds, or None to calibrate it
+    """
+
+    def __init__(self, queue_depth, tiers=QUALITY_TIERS, baseline=BASELINE_SECONDS):
+        self.queue_depth = queue_depth
+        self.tiers = tiers
+        self.level = 0
+        self.baseline = baseline
+        self._calibration = []
+        self._latencies = collections.deque()
+        self._calm_since = None
+        self._accounted_at = time.monotonic()
+        self._lock = threading.Lock()
+        OCR_QUALITY_TIER.set(0)
+
+    @property
+    def tier(self):
+        return self.tiers[self.level]
+
+    def observe(self, seconds, tier="full"):
+        """Record the OCR latency of a finished request and the tier it ran at"""
+        now = time.monotonic()
+        with self._lock:
+            self._latencies.append((now, seconds))
+            self._trim(now)
+            if self.baseline is None and tier == self.tiers[0]["name"]:
+                self._calibration.append(seconds)
+                if len(self._calibration) >= CALIBRATION_SAMPLES:
+                    self.baseline = percentile(self._calibration, 0.5)
+                    print(f"OCR quality: full-tier baseline {self.baseline:.2f} s")
+
+    def _trim(self, now):
+        while self._latencies and now - self._latencies[0][0] > LATENCY_WINDOW_SECONDS:
+            self._latencies.popleft()
+
+    def p95(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            if len(self._latencies) < MIN_SAMPLES_FOR_P95:
+                return None
+            return percentile([seconds for _, seconds in self._latencies], 0.95)
+
+    def _pressure(self, factor=1.0):
+        """The cheapest tier whose thresholds the current load reaches"""
+        depth = self.queue_depth()
+        p95 = self.p95() if depth > 0 and self.baseline is not None else None
+        level = 0
+        for i, tier in enumerate(self.tiers[1:], start=1):
+            slow = p95 is not None and p95 >= tier["p95_ratio"] * self.baseline * factor
+            if depth >= tier["queue_depth"] * factor or slow:
+                level = i
+        return level
+
+    def account(self):
+        """Add the time since the last call to the current tier's total"""
+        with self._lock:
+            now = time.monotonic()
+            OCR_TIER_SECONDS.labels(self.tier["name"]).inc(now - self._accounted_at)
+            self._accounted_at = now
+
+    def _set_level(self, level):
+        self.account()
+        print(f"OCR quality: {self.tier['name']} -> {self.tiers[level]['name']}")
+        self.level = level
+        OCR_QUALITY_TIER.set(level)
+
+    def choose(self):
+        """Update the tier for the current load and return it"""
+        pressure = self._pressure()
+        if pressure > self.level:
+            # Step straight down to the tier the load calls for
+            self._set_level(pressure)
+            self._calm_since = None
+        elif pressure < self.level and self._pressure(RECOVERY_FACTOR) < self.level:
+            now = time.monotonic()
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= RECOVERY_SECONDS:
+                # Step back up one tier at a time
+                self._set_level(self.level - 1)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return self.tier
+
+
+async def track_tier_time(controller, interval=TIER_ACCOUNTING_INTERVAL):
+    """Keep the time-in-tier counters current between requests"""
+    while True:
+        await asyncio.sleep(interval)
+        controller.account()
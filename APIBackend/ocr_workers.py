@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OCR in worker processes.
+
+Each process loads its own EasyOCR readers and reads images from a
+SharedImageRing owned by the API process, so OCR runs outside the API
+process's GIL without pickling image arrays. Enabled with
+DRISHTI_OCR_PROCESSES=N in Backend.py.
+"""
+
+import concurrent.futures
+import multiprocessing
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import easyocr
+
+import model_cache
+import thread_budget
+import triage
+from shm_transport import DEFAULT_SLOT_BYTES, SharedImageRing
+
+_ring = None
+_readers = {}
+
+
+def init_worker(ring_spec, threads):
+    global _ring
+    slots, slot_bytes, name = ring_spec
+    _ring = SharedImageRing(slots, slot_bytes, name=name)
+    thread_budget.set_torch_threads(threads, thread_budget.INTEROP_THREADS)
+    thread_budget.set_opencv_threads(threads)
+
+
+def _reader(lang):
+    reader = _readers.get(lang)
+    if reader is None:
+        print(f"Loading EasyOCR reader for '{lang}' in worker process...")
+        reader = _readers[lang] = easyocr.Reader([lang], **model_cache.ocr_reader_options(lang))
+    return reader
+
+
+def readtext(slot, shape, dtype, lang, options):
+    """Run EasyOCR on the image in a ring slot"""
+    image = _ring.view(slot, shape, dtype)
+    # Results are plain Python values, so nothing refers to the slot afterwards
+    return [
+        ([[float(x), float(y)] for x, y in box], text, float(confidence))
+        for box, text, confidence in _reader(lang).readtext(image, **options)
+    ]
+
+
+def count_text_boxes(slot, shape, dtype, lang, options):
+    """Run only the text detector on the image in a ring slot"""
+    return triage.count_text_boxes(_reader(lang), _ring.view(slot, shape, dtype), **options)
+
+
+def detect(slot, shape, dtype, lang, options):
+    """Run the text detector on the image in a ring slot"""
+    return _reader(lang).detect(_ring.view(slot, shape, dtype), **options)
+
+
+def recognize(slot, shape, dtype, lang, options):
+    """Run the recognizer on given regions of the image in a ring slot"""
+    return [
+        ([[float(x), float(y)] for x, y in box], text, float(confidence))
+        for box, text, confidence in _reader(lang).recognize(_ring.view(slot, shape, dtype), **options)
+    ]
+
+
+class OCRProcessPool:
+    """
+    A pool of OCR worker processes fed through shared memory.
+
+    Args:
+        processes: Number of worker processes
+        slots: Images that may be in flight at once; defaults to two per process
+        threads: torch/OpenCV threads in each process
+    """
+
+    def __init__(self, processes, slots=None, slot_bytes=DEFAULT_SLOT_BYTES, threads=1):
+        self.processes = processes
+        self.threads = threads
+        self.ring = SharedImageRing(slots or 2 * processes, slot_bytes)
+        self._restart_lock = threading.Lock()
+        self.executor = self._make_executor()
+
+    def _make_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.ring.spec, self.threads),
+        )
+
+    def _run(self, fn, *args):
+        """
+        Run fn in a worker process and wait for the result. When a worker dies
+        (e.g. killed for memory) the executor refuses all further work, so it
+        is replaced and the call retried once.
+        """
+        executor = self.executor
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            with self._restart_lock:
+                # Jobs that failed together replace the executor only once
+                if self.executor is executor:
+                    print("An OCR worker process died; starting a new pool")
+                    self.executor = self._make_executor()
+                    executor.shutdown(wait=False)
+            return self.executor.submit(fn, *args).result()
+
+    def readtext(self, slot, shape, dtype, lang, options):
+        """Run OCR on a slot the caller has written and still holds; blocks until done"""
+        return self._run(readtext, slot, shape, dtype, lang, options)
+
+    def count_text_boxes(self, slot, shape, dtype, lang, options):
+        """Count text regions in a slot the caller has written and still holds; blocks until done"""
+        return self._run(count_text_boxes, slot, shape, dtype, lang, options)
+
+    def detect(self, slot, shape, dtype, lang, options):
+        """Run the text detector on a slot the caller has written and still holds; blocks until done"""
+        return self._run(detect, slot, shape, dtype, lang, options)
+
+    def recognize(self, slot, shape, dtype, lang, options):
+        """Recognize regions of a slot the caller has written and still holds; blocks until done"""
+        return self._run(recognize, slot, shape, dtype, lang, options)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.ring.close()
+
+
+class PooledReader:
+    """
+    The detect/recognize part of an EasyOCR reader, run in an OCRProcessPool.
+
+    Each call leases a slot for its image, so several callers can use one
+    PooledReader from different threads: every worker process owns its reader.
+
+    Args:
+        slot_timeout: Seconds to wait for a free slot before raising SlotTimeout
+    """
+
+    def __init__(self, pool, lang, slot_timeout=None):
+        self.pool = pool
+        self.lang = lang
+        self.slot_timeout = slot_timeout
+
+    def _call(self, method, image, options):
+        with self.pool.ring.lease(self.slot_timeout) as slot:
+            shape, dtype = self.pool.ring.write(slot, image)
+            return method(slot, shape, dtype, self.lang, options)
+
+    def detect(self, image, **options):
+        return self._call(self.pool.detect, image, options)
+
+    def recognize(self, image, **options):
+        return self._call(self.pool.recognize, image, options)
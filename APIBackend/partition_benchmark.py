@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Throughput of inference-like work under different core partitionings.
+
+For each combination of worker processes and threads per worker that fits on
+the node, starts the workers with thread_budget applied and counts how many
+units of work they complete in a fixed time. The default workload is a stack of
+convolutions on a page-sized tensor plus OpenCV preprocessing, shaped like
+EasyOCR's detector; --workload ocr runs the real EasyOCR reader instead.
+
+Usage:
+    python partition_benchmark.py
+    python partition_benchmark.py --workers 1,2,4 --threads 1,2,4 --pin --json partitions.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+import thread_budget
+
+
+def make_page(width=960, height=720):
+    rng = np.random.default_rng(0)
+    page = np.full((height, width, 3), 255, np.uint8)
+    for y in range(40, height - 40, 48):
+        page[y:y + 24, 40:width - 40] = rng.integers(0, 80, (24, width - 80, 3), dtype=np.uint8)
+    return page
+
+
+def synthetic_workload():
+    import cv2
+    import torch
+
+    net = torch.nn.Sequential(
+        torch.nn.Conv2d(3, 32, 3, padding=1), torch.nn.ReLU(),
+        torch.nn.Conv2d(32, 64, 3, padding=1, stride=2), torch.nn.ReLU(),
+        torch.nn.Conv2d(64, 64, 3, padding=1), torch.nn.ReLU(),
+        torch.nn.Conv2d(64, 2, 1),
+    ).eval()
+    page = make_page()
+
+    def run():
+        grey = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+        resized = cv2.resize(cv2.GaussianBlur(grey, (3, 3), 0), (640, 480))
+        x = torch.from_numpy(np.repeat(resized[None, None], 3, axis=1)).float() / 255.0
+        with torch.no_grad():
+            net(x)
+    return run
+
+
+def ocr_workload():
+    import easyocr
+
+    reader = easyocr.Reader(["kn"], gpu=False)
+    page = make_page()
+    return lambda: reader.readtext(page)
+
+
+WORKLOADS = {"synthetic": synthetic_workload, "ocr": ocr_workload}
+
+
+def bench_worker(workload, workers, slot, threads, pin, barrier, duration, results):
+    allocation = thread_budget.configure(workers=workers, slot=slot, threads=threads, services={}, pin=pin)
+    run = WORKLOADS[workload]()
+    run()  # Warm up outside the timed window
+    barrier.wait()
+    count = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        run()
+        count += 1
+    results.put((slot, count, allocation["cpus"]))
+
+
+def measure(workload, workers, threads, pin, duration):
+    """Run one partitioning and return units of work per second across all workers"""
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=bench_worker, args=(workload, workers, slot, threads, pin, barrier, duration, results))
+        for slot in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    total = sum(count for _, count, _ in counts)
+    return {
+        "workers": workers,
+        "threads_per_worker": threads,
+        "pinned": pin,
+        "throughput_per_s": total / duration,
+        "per_worker": {slot: count / duration for slot, count, _ in sorted(counts)},
+    }
+
+
+def parse_ints(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main():
+    cores = len(thread_budget.available_cpus())
+    default_counts = ",".join(str(n) for n in (1, 2, 4, 8, 16) if n <= cores)
+    parser = argparse.ArgumentParser(description="Compare throughput across core partitionings")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="synthetic")
+    parser.add_argument("--workers", default=default_counts, help="Comma-separated worker counts")
+    parser.add_argument("--threads", default=default_counts, help="Comma-separated threads per worker")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to measure each partitioning")
+    parser.add_argument("--pin", action="store_true", help="Pin workers to their cores")
+    parser.add_argument("--oversubscribe", action="store_true",
+                        help="Also run partitionings that use more threads than cores")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{cores} cores, workload={args.workload}, {args.duration:.0f}s per partitioning")
+    print(f"{'workers':>8} {'threads':>8} {'total':>6} {'per s':>10}")
+    for workers in parse_ints(args.workers):
+        for threads in parse_ints(args.threads):
+            if workers * threads > cores and not args.oversubscribe:
+                continue
+            row = measure(args.workload, workers, threads, args.pin, args.duration)
+            rows.append(row)
+            print(f"{workers:>8} {threads:>8} {workers * threads:>6} {row['throughput_per_s']:>10.2f}")
+
+    if rows:
+        best = max(rows, key=lambda r: r["throughput_per_s"])
+        print(f"Best: {best['workers']} workers x {best['threads_per_worker']} threads "
+              f"({best['throughput_per_s']:.2f}/s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cores": cores, "workload": args.workload, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+On-demand profiling of individual requests.
+
+A request is profiled when it carries an `X-Profile` header (`cprofile` or
+`sampling`) or when it is picked by the configured sample rate. Profiles are
+written to a bounded directory: cProfile runs as pstats `.prof` files and the
+sampling profiler as flamegraph-compatible collapsed stacks (`.collapsed`).
+
+cProfile profiles the inference jobs the request ran, in the scheduler
+threads where they execute; profiling the event-loop thread instead would mix
+in other requests' interleaved coroutines and miss the inference entirely.
+The sampling profiler looks at every thread, including threadpool and
+scheduler workers, and is cheap enough to leave enabled at a low sample rate
+in production.
+"""
+
+import contextvars
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from admin import is_admin_token
+
+PROFILE_DIR = os.environ.get("DRISHTI_PROFILE_DIR", "profiles")
+# Oldest profiles are removed once either limit is exceeded
+PROFILE_MAX_FILES = int(os.environ.get("DRISHTI_PROFILE_MAX_FILES", "50"))
+PROFILE_MAX_BYTES = int(os.environ.get("DRISHTI_PROFILE_MAX_MB", "200")) * 1024 * 1024
+# Interval between stack samples for the sampling profiler
+SAMPLING_INTERVAL = 0.005
+PROFILE_MODES = ("cprofile", "sampling")
+
+# Paths that may be profiled by sampling; the header works on any path
+PROFILED_PATHS = ("/ocr/", "/tts/")
+
+# Runtime settings, changed through POST /admin/profiling
+settings = {
+    "sample_rate": float(os.environ.get("DRISHTI_PROFILE_SAMPLE_RATE", "0")),
+    "mode": os.environ.get("DRISHTI_PROFILE_MODE", "sampling"),
+}
+
+# Only one cProfile profiler runs at a time, so concurrent jobs do not disturb each other
+_cprofile_lock = threading.Lock()
+# cProfile results of the request being profiled. Scheduler jobs run in a copy of
+# the submitting request's context, so they add their profiles to its list.
+_job_profiles = contextvars.ContextVar("job_profiles", default=None)
+
+
+def run_profiled(fn, *args):
+    """Run an inference job, under cProfile if the request that submitted it is profiled with cProfile"""
+    profiles = _job_profiles.get()
+    if profiles is None or not _cprofile_lock.acquire(blocking=False):
+        return fn(*args)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args)
+    finally:
+        profiler.disable()
+        _cprofile_lock.release()
+        profiles.append(profiler)
+
+
+class StackSampler:
+    """Sample the stacks of all other threads from a background thread"""
+
+    def __init__(self, interval=SAMPLING_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def prune_profiles(directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES, max_bytes=PROFILE_MAX_BYTES):
+    """Remove the oldest profiles until the directory is within its limits"""
+    try:
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > max_files or total > max_bytes):
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    except Exception as e:
+        print(f"Error pruning profiles: {e}")
+
+
+def choose_mode(request):
+    """Return the profiler to use for this request, or None to skip profiling"""
+    requested = request.headers.get("x-profile")
+    if requested:
+        if not is_admin_token(request.headers.get("x-admin-token")):
+            return None
+        requested = requested.lower()
+        return requested if requested in PROFILE_MODES else settings["mode"]
+
+    rate = settings["sample_rate"]
+    if rate > 0 and request.url.path in PROFILED_PATHS and random.random() < rate:
+        return settings["mode"]
+    return None
+
+
+def profile_filename(request, mode):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    endpoint = request.url.path.strip("/").replace("/", "_") or "root"
+    extension = "prof" if mode == "cprofile" else "collapsed"
+    return f"{timestamp}_{endpoint}.{extension}"
+
+
+async def profiling_middleware(request, call_next):
+    """Wrap selected requests in a profiler and save the result"""
+    mode = choose_mode(request)
+    if mode is None:
+        return await call_next(request)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filename = profile_filename(request, mode)
+    path = os.path.join(PROFILE_DIR, filename)
+    start = time.perf_counter()
+
+    if mode == "cprofile":
+        profiles = []
+        token = _job_profiles.set(profiles)
+        try:
+            response = await call_next(request)
+        finally:
+            _job_profiles.reset(token)
+        if not profiles:
+            # No inference ran, or another request's job held the profiler
+            print(f"No inference profiled for {request.url.path}; use X-Profile: sampling for the whole request")
+            return response
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+    else:
+        with StackSampler() as sampler:
+            response = await call_next(request)
+        sampler.write(path)
+
+    prune_profiles()
+    print(f"Profiled {request.url.path} ({mode}, {time.perf_counter() - start:.2f}s) -> {path}")
+    response.headers["X-Profile-Id"] = filename
+    return response
+
+
+def list_profiles(directory=PROFILE_DIR):
+    """Newest-first listing of the saved profiles"""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in os.listdir(directory):
+        stat = os.stat(os.path.join(directory, name))
+        entries.append({"name": name, "bytes": stat.st_size, "modified": stat.st_mtime})
+    return sorted(entries, key=lambda e: e["modified"], reverse=True)
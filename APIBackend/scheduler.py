@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Priority scheduling of inference jobs.
+
+Each model gets its own scheduler with a small number of worker threads (one by
+default, since the models are not safe to share between threads). Queued jobs
+are ordered by priority and estimated cost, cheapest first, with an aging term
+so long jobs are not starved. A job is dropped before it starts if its client
+has disconnected or its deadline has passed, and running jobs can check their
+CancelToken between generation steps to stop early.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import itertools
+import threading
+import time
+
+from metrics import SCHEDULER_JOBS, SCHEDULER_QUEUE_DEPTH, record_stage
+from profiling import run_profiled
+
+# How often a waiting request checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+# Completed jobs within this window make up the reported recent latency
+LATENCY_WINDOW_SECONDS = 60.0
+
+
+class JobCancelled(Exception):
+    """The job was cancelled, usually because the client went away"""
+
+
+class DeadlineExceeded(JobCancelled):
+    """The job's deadline passed before it finished"""
+
+
+class CancelToken:
+    """Cancellation flag shared between the waiting request and the running job"""
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        if self.deadline is not None and not self._event.is_set() and time.monotonic() > self.deadline:
+            self.cancel("deadline")
+        return self._event.is_set()
+
+    def check(self):
+        """Raise if the job should stop"""
+        if self.cancelled:
+            if self.reason == "deadline":
+                raise DeadlineExceeded("Deadline exceeded")
+            raise JobCancelled(self.reason)
+
+
+class Job:
+    def __init__(self, seq, fn, cost, priority, deadline):
+        self.seq = seq
+        self.fn = fn
+        self.cost = cost
+        self.priority = priority
+        self.submitted = time.monotonic()
+        self.token = CancelToken(deadline)
+        self.future = concurrent.futures.Future()
+        self.context = contextvars.copy_context()
+
+
+class InferenceScheduler:
+    """
+    Run inference jobs in order of priority and estimated cost.
+
+    Args:
+        name: Service name used in metrics
+        workers: Number of worker threads
+        aging_rate: Cost units a job gains per second spent waiting
+        priority_weight: Cost units one priority level is worth
+        initializer: Optional callable run at the start of each worker thread
+    """
+
+    def __init__(self, name, workers=1, aging_rate=1.0, priority_weight=100.0, initializer=None):
+        self.name = name
+        self.workers = workers
+        self.initializer = initializer
+        self.aging_rate = aging_rate
+        self.priority_weight = priority_weight
+        self._queue = []
+        self._running = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        # (finished at, seconds from submission) of recently completed jobs
+        self._latencies = collections.deque()
+
+    def _score(self, job, now):
+        waited = now - job.submitted
+        return job.priority * self.priority_weight + job.cost - self.aging_rate * waited
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker, name=f"{self.name}-inference-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _update_gauge(self):
+        SCHEDULER_QUEUE_DEPTH.labels(self.name).set(len(self._queue))
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    @property
+    def outstanding(self):
+        """Queued plus running jobs"""
+        return len(self._queue) + self._running
+
+    def latency_p95(self, window=LATENCY_WINDOW_SECONDS):
+        """95th percentile of queue wait plus run time of recently completed jobs, or None"""
+        with self._cond:
+            cutoff = time.monotonic() - window
+            while self._latencies and self._latencies[0][0] < cutoff:
+                self._latencies.popleft()
+            ordered = sorted(seconds for _, seconds in self._latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+    def drain(self, timeout):
+        """Wait until no jobs are queued or running; returns False on timeout"""
+        end = time.monotonic() + timeout
+        with self._cond:
+            while self.outstanding:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.1))
+        return True
+
+    def submit(self, fn, cost=1.0, priority=0, deadline=None):
+        """
+        Queue fn(token) and return its Job.
+
+        Args:
+            fn: Callable taking a CancelToken
+            cost: Estimated cost in the scheduler's units (e.g. characters for TTS)
+            priority: Lower runs sooner
+            deadline: time.monotonic() value after which the job is abandoned
+        """
+        job = Job(next(self._seq), fn, cost, priority, deadline)
+        with self._cond:
+            self._start_workers()
+            self._queue.append(job)
+            self._update_gauge()
+            self._cond.notify()
+        return job
+
+    def _remove(self, job):
+        with self._cond:
+            if job in self._queue:
+                self._queue.remove(job)
+                self._update_gauge()
+                return True
+        return False
+
+    def _next_job(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            now = time.monotonic()
+            job = min(self._queue, key=lambda j: (self._score(j, now), j.seq))
+            self._queue.remove(job)
+            self._running += 1
+            self._update_gauge()
+            return job
+
+    def _worker(self):
+        if self.initializer is not None:
+            self.initializer()
+        while True:
+            job = self._next_job()
+            try:
+                self._run_job(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+
+    def _run_job(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            job.token.check()
+        except JobCancelled as e:
+            outcome = "expired" if isinstance(e, DeadlineExceeded) else "cancelled"
+            SCHEDULER_JOBS.labels(self.name, outcome).inc()
+            job.future.set_exception(e)
+            return
+
+        job.context.run(record_stage, "queue_wait", time.monotonic() - job.submitted)
+        try:
+            result = job.context.run(run_profiled, job.fn, job.token)
+        except JobCancelled as e:
+            outcome = "expired" if isinstance(e, DeadlineExceeded) else "cancelled"
+            SCHEDULER_JOBS.labels(self.name, outcome).inc()
+            job.future.set_exception(e)
+        except BaseException as e:
+            SCHEDULER_JOBS.labels(self.name, "failed").inc()
+            job.future.set_exception(e)
+        else:
+            SCHEDULER_JOBS.labels(self.name, "completed").inc()
+            now = time.monotonic()
+            with self._cond:
+                self._latencies.append((now, now - job.submitted))
+            job.future.set_result(result)
+
+    def _abandon(self, job, reason):
+        job.token.cancel(reason)
+        if self._remove(job):
+            # Never started, so nobody else will record or resolve it
+            SCHEDULER_JOBS.labels(self.name, "expired" if reason == "deadline" else "cancelled").inc()
+            job.future.cancel()
+
+    async def run(self, fn, cost=1.0, priority=0, deadline=None, is_disconnected=None):
+        """
+        Submit fn(token) and wait for its result.
+
+        Args:
+            is_disconnected: Optional coroutine function, such as
+                Request.is_disconnected, polled while waiting
+
+        Raises:
+            DeadlineExceeded: The deadline passed first
+            JobCancelled: The client disconnected first
+        """
+        job = self.submit(fn, cost=cost, priority=priority, deadline=deadline)
+        future = asyncio.wrap_future(job.future)
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=DISCONNECT_POLL_INTERVAL)
+                if done:
+                    return future.result()
+                if deadline is not None and time.monotonic() > deadline:
+                    self._abandon(job, "deadline")
+                    raise DeadlineExceeded("Deadline exceeded")
+                if is_disconnected is not None and await is_disconnected():
+                    self._abandon(job, "disconnected")
+                    raise JobCancelled("Client disconnected")
+        except asyncio.CancelledError:
+            self._abandon(job, "cancelled")
+            raise
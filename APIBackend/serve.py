@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Production launcher for the unified backend.
+
+Sizes the number of worker processes from the available cores and memory,
+uses uvloop and httptools when they are installed, sets keep-alive, backlog
+and concurrency limits, and shuts down gracefully so in-flight inference
+finishes before a worker exits.
+
+With TLS, HTTP/2 is served through hypercorn when it is installed; otherwise
+uvicorn serves HTTP/1.1. TLS session tickets are left enabled, so returning
+clients resume sessions instead of doing a full handshake. Ticket keys are per
+process, though, so with several workers a resumed session only succeeds when
+the connection lands on the same worker. Long keep-alive makes that matter
+less, because the phone keeps reusing its connection.
+
+Usage:
+    python serve.py --port 8020
+    python serve.py --port 8443 --self-signed
+    python serve.py --workers 4 --certfile cert.pem --keyfile key.pem
+"""
+
+import argparse
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from thread_budget import SERVICE_SHARES, available_cpus, parse_shares
+
+# Resident memory of one worker with the Parler and EasyOCR models loaded
+WORKER_MEMORY_MB = int(os.environ.get("DRISHTI_WORKER_MEMORY_MB", "3000"))
+# Intra-op threads given to torch/OpenCV in each worker
+THREADS_PER_WORKER = int(os.environ.get("DRISHTI_THREADS_PER_WORKER", "2"))
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def min_threads_per_worker():
+    """One thread for each service's inference thread (see thread_budget.split_threads)"""
+    return max(1, len(parse_shares(SERVICE_SHARES)))
+
+
+def max_workers(threads_per_worker):
+    """Workers whose threads fit on the available cores"""
+    return max(1, len(available_cpus()) // max(1, threads_per_worker))
+
+
+def auto_workers(threads_per_worker=THREADS_PER_WORKER, worker_memory_mb=WORKER_MEMORY_MB):
+    """As many workers as both the cores and the memory for their models allow"""
+    by_cpu = max_workers(threads_per_worker)
+    memory = available_memory_mb()
+    by_memory = max(1, memory // worker_memory_mb) if memory else by_cpu
+    return min(by_cpu, by_memory)
+
+
+def has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def generate_self_signed_cert(cert_dir="certs"):
+    """Generate a self-signed certificate for development if none exists yet"""
+    cert_dir = Path(cert_dir)
+    cert_dir.mkdir(exist_ok=True)
+    key_path = cert_dir / "key.pem"
+    cert_path = cert_dir / "cert.pem"
+    if not key_path.exists() or not cert_path.exists():
+        print("Generating self-signed SSL certificates...")
+        subprocess.run([
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+            '-out', str(cert_path), '-keyout', str(key_path),
+            '-days', '365', '-subj', '/CN=localhost'
+        ], check=True)
+    return str(key_path), str(cert_path)
+
+
+def prepare_metrics_dir():
+    """Give Prometheus a fresh shared directory so /metrics aggregates all workers"""
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir is None:
+        metrics_dir = os.path.join(tempfile.gettempdir(), f"drishti_metrics_{os.getpid()}")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+
+def prepare_thread_slots(workers, pin):
+    """Tell the workers how many share the node and where to claim their CPU slot"""
+    slot_dir = os.path.join(tempfile.gettempdir(), f"drishti_threads_{os.getpid()}")
+    shutil.rmtree(slot_dir, ignore_errors=True)
+    os.environ["DRISHTI_WORKERS"] = str(workers)
+    os.environ["DRISHTI_THREAD_SLOT_DIR"] = slot_dir
+    os.environ["DRISHTI_PIN_THREADS"] = "1" if pin else "0"
+
+
+def run_uvicorn(args, workers, keyfile, certfile):
+    import uvicorn
+
+    loop = "uvloop" if has_module("uvloop") else "asyncio"
+    http = "httptools" if has_module("httptools") else "h11"
+    print(f"Starting uvicorn: {workers} workers, loop={loop}, http={http}, "
+          f"{'HTTPS' if certfile else 'HTTP'} on {args.host}:{args.port}")
+    uvicorn.run(
+        "Backend:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        limit_concurrency=args.limit_concurrency,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        ssl_keyfile=keyfile,
+        ssl_certfile=certfile,
+        access_log=args.access_log,
+        proxy_headers=True,
+    )
+
+
+def run_hypercorn(args, workers, keyfile, certfile):
+    from hypercorn.config import Config
+    from hypercorn.run import run
+
+    config = Config()
+    config.application_path = "Backend:app"
+    config.bind = [f"{args.host}:{args.port}"]
+    config.workers = workers
+    config.worker_class = "uvloop" if has_module("uvloop") else "asyncio"
+    config.backlog = args.backlog
+    config.keep_alive_timeout = args.keep_alive
+    config.graceful_timeout = args.graceful_timeout
+    config.keyfile = keyfile
+    config.certfile = certfile
+    config.alpn_protocols = ["h2", "http/1.1"]
+    if args.access_log:
+        config.accesslog = "-"
+    print(f"Starting hypercorn: {workers} workers, worker_class={config.worker_class}, "
+          f"HTTP/2 over TLS on {args.host}:{args.port}")
+    sys.exit(run(config))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the DrishtiYantra backend for production")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--workers", default="auto", help="Number of worker processes or 'auto'")
+    parser.add_argument("--threads-per-worker", type=int, default=THREADS_PER_WORKER)
+    parser.add_argument("--pin", action="store_true", help="Pin each worker to its share of the cores")
+    parser.add_argument("--keep-alive", type=int, default=30, help="Seconds to keep idle connections open")
+    parser.add_argument("--backlog", type=int, default=2048, help="Pending connection queue size")
+    parser.add_argument("--limit-concurrency", type=int, default=None,
+                        help="Connections per worker before responding with 503")
+    parser.add_argument("--graceful-timeout", type=int, default=120,
+                        help="Seconds to let in-flight inference finish on shutdown")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--self-signed", action="store_true", help="Generate and use a development certificate")
+    parser.add_argument("--no-http2", action="store_true", help="Use uvicorn even when hypercorn is installed")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args()
+
+    if args.threads_per_worker < min_threads_per_worker():
+        print(f"Raising --threads-per-worker to {min_threads_per_worker()}, one per service")
+        args.threads_per_worker = min_threads_per_worker()
+    if args.workers == "auto":
+        workers = auto_workers(args.threads_per_worker)
+    else:
+        workers = int(args.workers)
+        if workers > max_workers(args.threads_per_worker):
+            print(f"Only {max_workers(args.threads_per_worker)} workers of {args.threads_per_worker} threads fit "
+                  f"on {len(available_cpus())} CPUs; starting that many instead of {workers}")
+            workers = max_workers(args.threads_per_worker)
+
+    keyfile, certfile = args.keyfile, args.certfile
+    if args.self_signed and not certfile:
+        keyfile, certfile = generate_self_signed_cert()
+    keyfile = os.path.abspath(keyfile) if keyfile else None
+    certfile = os.path.abspath(certfile) if certfile else None
+
+    # Inherited by the workers before they import torch or OpenCV
+    os.environ["DRISHTI_THREADS_PER_WORKER"] = str(args.threads_per_worker)
+    os.environ.setdefault("OMP_NUM_THREADS", str(args.threads_per_worker))
+    os.environ.setdefault("MKL_NUM_THREADS", str(args.threads_per_worker))
+    prepare_thread_slots(workers, args.pin)
+    if workers > 1:
+        prepare_metrics_dir()
+
+    # Run from this directory so the workers can import Backend
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    if certfile and not args.no_http2 and has_module("hypercorn"):
+        run_hypercorn(args, workers, keyfile, certfile)
+    else:
+        run_uvicorn(args, workers, keyfile, certfile)
+
+
+if __name__ == "__main__":
+    main()
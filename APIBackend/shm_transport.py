@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Zero-copy hand-off of images to inference worker processes.
+
+A SharedImageRing is one multiprocessing.shared_memory block divided into
+fixed-size slots. The API process leases a slot, decodes the upload into it and
+sends the worker only (slot, shape, dtype); the worker maps the same memory as a
+NumPy array, so nothing proportional to the image size is pickled or piped.
+
+Slots are leased and released by the owning process only. When every slot is
+leased, acquire() waits, which bounds the decoded images held in memory; after
+the timeout it raises SlotTimeout so the caller can shed load.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Room for a 12 MP phone photo decoded to 8-bit BGR
+DEFAULT_SLOT_BYTES = 4032 * 3024 * 3
+
+
+class SlotTimeout(Exception):
+    """No slot became free in time"""
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block with the resource
+        # tracker, which would unlink it when this worker exits
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedImageRing:
+    """
+    Fixed-size image slots in shared memory.
+
+    Args:
+        slots: Number of slots
+        slot_bytes: Capacity of each slot
+        name: Name of an existing ring to attach to; a new ring is created when None
+    """
+
+    def __init__(self, slots, slot_bytes=DEFAULT_SLOT_BYTES, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        else:
+            self.shm = _attach(name)
+        self.name = self.shm.name
+        self._free = list(range(slots))
+        self._cond = threading.Condition()
+
+    @property
+    def spec(self):
+        """Arguments for attaching to this ring from another process"""
+        return self.slots, self.slot_bytes, self.name
+
+    @property
+    def in_use(self):
+        return self.slots - len(self._free)
+
+    def fits(self, shape, dtype):
+        return int(np.prod(shape)) * np.dtype(dtype).itemsize <= self.slot_bytes
+
+    def acquire(self, timeout=None):
+        """Lease a free slot, waiting up to timeout seconds"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._free:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise SlotTimeout(f"All {self.slots} shared-memory slots are in use")
+                self._cond.wait(remaining)
+            return self._free.pop()
+
+    def release(self, slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        slot = self.acquire(timeout)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def view(self, slot, shape, dtype):
+        """A NumPy array backed by the slot's memory"""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, array):
+        """Copy array into the slot; returns the (shape, dtype) to send to the worker"""
+        if not self.fits(array.shape, array.dtype):
+            raise ValueError(f"{array.nbytes} bytes do not fit in a {self.slot_bytes}-byte slot")
+        np.copyto(self.view(slot, array.shape, array.dtype), array)
+        return array.shape, array.dtype.str
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SlotHandoff:
+    """
+    Release a leased slot exactly once when a job may outlive its request.
+
+    The job calls start() before reading the slot and finish() when done; the
+    request calls abandon() when it stops waiting. Whichever side is last to use
+    the slot releases it, so a slot is never reused while a worker reads it.
+    """
+
+    def __init__(self, ring, slot):
+        self.ring = ring
+        self.slot = slot
+        self.running = False
+        self.abandoned = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Claim the slot for the job; False if the request already gave up"""
+        with self._lock:
+            if self.abandoned:
+                return False
+            self.running = True
+            return True
+
+    def finish(self):
+        self.ring.release(self.slot)
+
+    def abandon(self):
+        with self._lock:
+            if self.running:
+                return
+            self.abandoned = True
+        self.ring.release(self.slot)
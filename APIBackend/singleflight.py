@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Coalescing of identical in-flight requests.
+
+A double tap or a client retry after a timeout sends the same image or text
+again while the first inference is still running. Requests with the same key
+attach to the computation already in flight and all receive its result.
+The computation is cancelled only once every waiting request has gone away.
+Each request waits until its own deadline, so the computation itself should
+run without one and is abandoned when the last request gives up.
+"""
+
+import asyncio
+import hashlib
+import time
+from contextlib import nullcontext
+
+from metrics import COALESCED_REQUESTS, stage
+from scheduler import DISCONNECT_POLL_INTERVAL, DeadlineExceeded, JobCancelled
+
+
+def content_key(*parts):
+    """SHA-256 over the request's inputs and parameters"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent identical requests.
+
+    Args:
+        name: Service name used in metrics
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+
+    @property
+    def in_flight(self):
+        return len(self._flights)
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key, compute, is_disconnected=None, deadline=None):
+        """
+        Await compute() or, if one with the same key is running, its result.
+
+        Args:
+            compute: Coroutine function started for the first request with this key
+            is_disconnected: Optional coroutine function, such as
+                Request.is_disconnected, polled while waiting
+            deadline: time.monotonic() value after which this request stops waiting
+
+        Raises:
+            JobCancelled: This request's client disconnected first
+            DeadlineExceeded: This request's deadline passed first
+        """
+        flight = self._flights.get(key)
+        timing = nullcontext()
+        if flight is None:
+            flight = self._flights[key] = Flight(asyncio.ensure_future(compute()))
+            flight.task.add_done_callback(lambda task: self._forget(key, flight))
+        else:
+            COALESCED_REQUESTS.labels(self.name).inc()
+            # The stages of the computation are recorded by the request that started it
+            timing = stage("coalesced")
+
+        flight.waiters += 1
+        try:
+            with timing:
+                while True:
+                    timeout = DISCONNECT_POLL_INTERVAL
+                    if deadline is not None:
+                        timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+                    done, _ = await asyncio.wait({flight.task}, timeout=timeout)
+                    if done:
+                        return flight.task.result()
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise DeadlineExceeded("Deadline exceeded while waiting")
+                    if is_disconnected is not None and await is_disconnected():
+                        raise JobCancelled("Client disconnected")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody wants the result any more
+                self._forget(key, flight)
+                flight.task.cancel()
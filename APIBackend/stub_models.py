@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Deterministic stand-ins for the EasyOCR reader and the Parler TTS model.
+
+They follow the same call signatures as the real models, need no downloads and
+run on CPU, so benchmarks and load tests exercise everything around inference
+without the models themselves. Work scales with the input size so latency
+curves keep their shape.
+"""
+
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import torch
+
+import tts_engine
+
+STUB_SAMPLING_RATE = 44100
+# Samples of audio produced per prompt token
+STUB_SAMPLES_PER_TOKEN = 2048
+# Height of the horizontal bands the stub detector treats as text lines
+STUB_LINE_HEIGHT = 48
+STUB_TEXT = "ಕನ್ನಡ"
+
+
+class StubOCRReader:
+    """Stand-in for easyocr.Reader that finds 'text' in high-contrast bands"""
+
+    def __init__(self, seconds_per_megapixel=0.0):
+        self.seconds_per_megapixel = seconds_per_megapixel
+
+    def _grey(self, image):
+        if image.ndim == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def _simulate(self, image):
+        if self.seconds_per_megapixel:
+            time.sleep(self.seconds_per_megapixel * image.shape[0] * image.shape[1] / 1e6)
+
+    def detect(self, image, canvas_size=2560, **kwargs):
+        """Return ([horizontal boxes], [free boxes]) like Reader.detect"""
+        grey = self._grey(image)
+        scale = min(1.0, canvas_size / float(max(grey.shape[:2])))
+        if scale < 1.0:
+            grey = cv2.resize(grey, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        self._simulate(grey)
+
+        boxes = []
+        width = grey.shape[1]
+        for top in range(0, grey.shape[0] - STUB_LINE_HEIGHT + 1, STUB_LINE_HEIGHT):
+            band = grey[top:top + STUB_LINE_HEIGHT]
+            if float(band.std()) > 20.0:
+                boxes.append([
+                    0, int(width / scale), int(top / scale), int((top + STUB_LINE_HEIGHT) / scale)
+                ])
+        return [boxes], [[]]
+
+    def recognize(self, img_cv_grey, horizontal_list=None, free_list=None, detail=1, **kwargs):
+        """Return (box, text, confidence) tuples for the given boxes like Reader.recognize"""
+        results = []
+        for x_min, x_max, y_min, y_max in horizontal_list or []:
+            crop = img_cv_grey[y_min:y_max, x_min:x_max]
+            words = 1 + int(crop.mean()) % 5 if crop.size else 1
+            box = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+            text = " ".join([STUB_TEXT] * words)
+            results.append((box, text, 0.9) if detail else text)
+        return sorted(results, key=lambda item: item[0][0][1] if detail else 0)
+
+    def readtext(self, image, canvas_size=2560, **kwargs):
+        """Detect and recognize like Reader.readtext"""
+        horizontal_list, _ = self.detect(image, canvas_size=canvas_size)
+        return self.recognize(self._grey(image), horizontal_list=horizontal_list[0])
+
+
+class StubEncoding(dict):
+    """Minimal BatchEncoding with attribute access and .to(device)"""
+
+    __getattr__ = dict.__getitem__
+
+    def to(self, device):
+        return StubEncoding({key: value.to(device) for key, value in self.items()})
+
+
+class StubTokenizer:
+    """Stand-in tokenizer mapping each character to one token"""
+
+    def __call__(self, text, return_tensors="pt"):
+        ids = [1 + ord(ch) % 1000 for ch in text] + [0]
+        input_ids = torch.tensor([ids], dtype=torch.long)
+        return StubEncoding(input_ids=input_ids, attention_mask=torch.ones_like(input_ids))
+
+
+class StubTTSModel:
+    """Stand-in for ParlerTTSForConditionalGeneration producing a tone per token"""
+
+    def __init__(self, seconds_per_token=0.0):
+        self.seconds_per_token = seconds_per_token
+        self.config = SimpleNamespace(
+            sampling_rate=STUB_SAMPLING_RATE,
+            text_encoder=SimpleNamespace(_name_or_path="stub"),
+        )
+
+    def to(self, device):
+        return self
+
+    def generate(self, input_ids=None, attention_mask=None, prompt_input_ids=None,
+                 prompt_attention_mask=None, stopping_criteria=None, max_new_tokens=None, **kwargs):
+        tokens = int(prompt_input_ids.shape[-1])
+        if max_new_tokens is not None:
+            tokens = min(tokens, max_new_tokens)
+        # One decoding step per prompt token, checking the stopping criteria like the real model
+        for step in range(1, tokens + 1):
+            if self.seconds_per_token:
+                time.sleep(self.seconds_per_token)
+            if stopping_criteria is not None and bool(stopping_criteria(prompt_input_ids, None).all()):
+                tokens = step
+                break
+        t = np.arange(tokens * STUB_SAMPLES_PER_TOKEN, dtype=np.float32) / STUB_SAMPLING_RATE
+        ids = prompt_input_ids[0, :tokens].numpy().repeat(STUB_SAMPLES_PER_TOKEN).astype(np.float32)
+        audio = 0.1 * np.sin(2 * np.pi * (200.0 + ids) * t)
+        return torch.from_numpy(audio).unsqueeze(0)
+
+
+def install_stub_models(backend, ocr_seconds_per_megapixel=0.0, tts_seconds_per_token=0.0):
+    """Replace the models held by the Backend module and tts_engine with stand-ins"""
+    for lang in backend.OCR_LANGUAGES:
+        backend.models.register(
+            backend.ocr_model_name(lang), lambda: StubOCRReader(ocr_seconds_per_megapixel), replace=True,
+            version="stub",
+        )
+
+    def load_stub_tts():
+        tts_engine.tts_model = StubTTSModel(tts_seconds_per_token)
+        tts_engine.tts_tokenizer = StubTokenizer()
+        tts_engine.description_tokenizer = StubTokenizer()
+        return tts_engine.tts_model, tts_engine.tts_tokenizer, tts_engine.description_tokenizer
+
+    backend.models.register("tts", load_stub_tts, backend.unload_tts, replace=True, version="stub")
+    load_stub_tts()
@@ -0,0 +1,66 @@
+"""Admin endpoints must be closed unless DRISHTI_ADMIN_TOKEN is configured.
+
+Run from APIBackend/: python -m pytest test_admin.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admin
+import Backend
+
+ADMIN_ROUTES = [
+    ("get", "/admin/models", None),
+    ("post", "/admin/models/tts/unload", None),
+    ("post", "/admin/models/tts/swap", {"version": "v2", "checkpoint": "someone/else"}),
+    ("post", "/admin/memory/recycle", None),
+    ("get", "/admin/profiling", None),
+    ("get", "/admin/threads", None),
+]
+
+
+@pytest.fixture
+def client():
+    # Without the context manager no startup handlers run, so no models are loaded
+    return TestClient(Backend.app)
+
+
+@pytest.mark.parametrize("method, path, body", ADMIN_ROUTES)
+def test_admin_routes_refused_without_configured_token(client, monkeypatch, method, path, body):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    response = client.request(method.upper(), path, json=body)
+    assert response.status_code == 403
+    response = client.request(method.upper(), path, json=body, headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("method, path, body", ADMIN_ROUTES)
+def test_admin_routes_refuse_wrong_token(client, monkeypatch, method, path, body):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    response = client.request(method.upper(), path, json=body, headers={"X-Admin-Token": "guess"})
+    assert response.status_code == 403
+
+
+def test_is_admin_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    assert not admin.is_admin_token(None)
+    assert not admin.is_admin_token("")
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert not admin.is_admin_token(None)
+    assert not admin.is_admin_token("guess")
+    assert admin.is_admin_token("secret")
+
+
+def test_swap_refuses_checkpoint_outside_allowlist(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(Backend, "SWAP_TTS_CHECKPOINTS", [])
+    response = client.post("/admin/models/tts/swap", json={"version": "v2", "checkpoint": "someone/else"},
+                           headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 403
+
+
+def test_non_ascii_token_is_refused_not_an_error(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert not admin.is_admin_token("sécret")
+    response = client.get("/admin/models", headers={"X-Admin-Token": "sécret".encode("latin-1")})
+    assert response.status_code == 403
@@ -0,0 +1,72 @@
+"""Live OCR tracking with a fake reader, so no models are needed.
+
+Run from APIBackend/: python -m pytest test_live_ocr.py
+"""
+
+import numpy as np
+
+from live_ocr import STABLE_FRAMES, LiveOCRSession, RegionCache
+
+BOX = [20, 420, 40, 120]
+
+
+class FakeReader:
+    """Detects the same box on every frame and reads it as "dark" or "light" from its pixels"""
+
+    def __init__(self):
+        self.recognized = 0
+
+    def detect(self, image, canvas_size):
+        return [[list(BOX)]], [[]]
+
+    def recognize(self, grey, horizontal_list, free_list, detail):
+        self.recognized += 1
+        x_min, x_max, y_min, y_max = horizontal_list[0]
+        text = "dark" if grey[y_min:y_max, x_min:x_max].mean() < 128 else "light"
+        return [([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], text, 0.9)]
+
+
+def page(dark):
+    """White frame whose text region is mostly ink (dark) or mostly paper"""
+    image = np.full((200, 480, 3), 255, dtype=np.uint8)
+    x_min, x_max, y_min, y_max = BOX
+    region = image[y_min:y_max, x_min:x_max]
+    if dark:
+        region[:] = 0
+        region[::4] = 255
+    else:
+        region[::8] = 0
+    return image
+
+
+def test_same_box_with_new_content_is_read_again():
+    reader = FakeReader()
+    session = LiveOCRSession(reader, cache=RegionCache())
+
+    first, second = page(dark=True), page(dark=False)
+    updates = [session.process_frame(first) for _ in range(STABLE_FRAMES)]
+    assert updates[-1]["text"] == "dark"
+    assert reader.recognized == 1
+
+    # Unchanged content is not recognized again
+    assert session.process_frame(first) is None
+    assert reader.recognized == 1
+
+    # Same box, different pixels (a page turn): read again once it has held still
+    updates = [session.process_frame(second) for _ in range(STABLE_FRAMES)]
+    assert updates[-1]["text"] == "light"
+    assert updates[-1]["regions"][0]["id"] == 1
+    assert reader.recognized == 2
+
+
+def test_small_noise_does_not_trigger_recognition():
+    reader = FakeReader()
+    session = LiveOCRSession(reader, cache=RegionCache())
+    image = page(dark=True)
+    for _ in range(STABLE_FRAMES):
+        session.process_frame(image)
+
+    noise = np.random.default_rng(0).integers(-6, 7, image.shape)
+    noisy = np.clip(image.astype(int) + noise, 0, 255).astype(np.uint8)
+    assert session.process_frame(noisy) is None
+    assert reader.recognized == 1
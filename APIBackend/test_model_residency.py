@@ -0,0 +1,112 @@
+"""Memory-budgeted model residency and hot swaps.
+
+Run from APIBackend/: python -m pytest test_model_residency.py
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import model_residency
+from model_residency import ModelResidencyManager
+
+MB = 2**20
+
+
+@pytest.fixture(autouse=True)
+def sized_models(monkeypatch):
+    # Fake models declare their size instead of holding tensors
+    monkeypatch.setattr(model_residency, "model_bytes", lambda model, rss_delta=0: model.size)
+
+
+def loader(size, label=None):
+    def load():
+        return SimpleNamespace(size=size, label=label)
+    return load
+
+
+def unloader(unloaded):
+    return lambda model: unloaded.append(model.label)
+
+
+def test_least_recently_used_idle_model_is_evicted():
+    unloaded = []
+    models = ModelResidencyManager(250 * MB)
+    for name in ("a", "b", "c"):
+        models.register(name, loader(100 * MB, label=name), unloader(unloaded))
+
+    with models.use("a"):
+        pass
+    with models.use("b"):
+        pass
+    with models.use("a"):
+        pass
+    # c does not fit next to a and b; b was used longest ago
+    with models.use("c"):
+        pass
+    assert unloaded == ["b"]
+    stats = models.stats()
+    assert stats["resident_bytes"] <= 250 * MB
+    assert stats["models"]["b"]["evictions"] == 1
+
+
+def test_models_in_use_and_hot_models_are_not_evicted():
+    unloaded = []
+    models = ModelResidencyManager(150 * MB, hot=["hot"])
+    models.register("hot", loader(100 * MB, label="hot"), unloader(unloaded))
+    models.register("busy", loader(100 * MB, label="busy"), unloader(unloaded))
+    models.register("new", loader(100 * MB, label="new"), unloader(unloaded))
+    models.register("other", loader(100 * MB, label="other"), unloader(unloaded))
+
+    with models.use("hot"):
+        pass
+    with models.use("busy"):
+        with models.use("new"):
+            # Over budget, but nothing can be unloaded
+            assert unloaded == []
+    # The next load unloads idle models, least recently used first, but never the hot one
+    with models.use("other"):
+        pass
+    assert unloaded == ["new", "busy"]
+    assert models.stats()["models"]["hot"]["resident"]
+
+
+def test_swap_waits_for_requests_on_the_old_version():
+    unloaded = []
+    models = ModelResidencyManager(1000 * MB)
+    models.register("tts", loader(100 * MB, label="v1"), unloader(unloaded), version="v1")
+
+    with models.use_entry("tts") as old:
+        assert old.version == "v1"
+        warmed = []
+        swap = models.swap("tts", loader(100 * MB, label="v2"), "v2", unloader(unloaded), warmup=warmed.append)
+        assert swap == {"model": "tts", "previous_version": "v1", "version": "v2", "draining": 1}
+        assert [model.label for model in warmed] == ["v2"]
+
+        # New requests get the new version while the old one finishes its request
+        with models.use_entry("tts") as new:
+            assert new.version == "v2"
+        assert old.model.label == "v1"
+        assert unloaded == []
+        assert models.stats()["retiring"] == [{"model": "tts", "version": "v1", "in_use": 1}]
+
+    assert unloaded == ["v1"]
+    assert models.stats()["retiring"] == []
+    assert models.stats()["resident_bytes"] == 100 * MB
+
+
+def test_failed_swap_keeps_the_current_version():
+    unloaded = []
+    models = ModelResidencyManager(1000 * MB)
+    models.register("tts", loader(100 * MB, label="v1"), unloader(unloaded), version="v1")
+    with models.use("tts"):
+        pass
+
+    def broken_warmup(model):
+        raise RuntimeError("bad weights")
+
+    with pytest.raises(RuntimeError):
+        models.swap("tts", loader(100 * MB, label="v2"), "v2", unloader(unloaded), warmup=broken_warmup)
+    assert unloaded == ["v2"]
+    with models.use_entry("tts") as entry:
+        assert entry.version == "v1"
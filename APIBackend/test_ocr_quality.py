@@ -0,0 +1,29 @@
+"""OCR quality tier selection.
+
+Run from APIBackend/: python -m pytest test_ocr_quality.py
+"""
+
+import ocr_quality
+
+
+def make_controller(depth, baseline=None):
+    return ocr_quality.QualityController(lambda: depth[0], baseline=baseline)
+
+
+def test_slow_machine_with_empty_queue_stays_at_full_quality():
+    depth = [0]
+    controller = make_controller(depth)
+    for _ in range(ocr_quality.CALIBRATION_SAMPLES):
+        controller.observe(3.0)
+    assert controller.baseline == 3.0
+    assert controller.choose()["name"] == "full"
+
+
+def test_latency_steps_down_only_while_requests_queue():
+    depth = [0]
+    controller = make_controller(depth, baseline=1.0)
+    for _ in range(ocr_quality.MIN_SAMPLES_FOR_P95):
+        controller.observe(4.5, "full")
+    assert controller.choose()["name"] == "full"
+    depth[0] = 1
+    assert controller.choose()["name"] == "reduced"
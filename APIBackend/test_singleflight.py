@@ -0,0 +1,98 @@
+"""Coalescing of identical in-flight requests.
+
+Run from APIBackend/: python -m pytest test_singleflight.py
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from scheduler import DeadlineExceeded, JobCancelled
+from singleflight import SingleFlight, content_key
+
+
+def test_each_waiter_keeps_its_own_deadline():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "text"
+
+        hurried = asyncio.create_task(flights.do("key", compute, deadline=time.monotonic() + 0.05))
+        patient = asyncio.create_task(flights.do("key", compute))
+        with pytest.raises(DeadlineExceeded):
+            await hurried
+        # The other request still wants the result, so the work goes on
+        assert flights.in_flight == 1
+        release.set()
+        assert await patient == "text"
+
+    asyncio.run(scenario())
+
+
+def test_waiters_share_one_computation_until_the_last_leaves():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+        runs = []
+        cancelled = asyncio.Event()
+
+        async def compute():
+            runs.append(1)
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "text"
+
+        first = asyncio.create_task(flights.do("key", compute))
+        second = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0)
+        assert flights.in_flight == 1
+
+        # One client disconnects; the work goes on for the other
+        first.cancel()
+        await asyncio.sleep(0.05)
+        assert not cancelled.is_set()
+
+        # The last client leaves, so nobody wants the result any more
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1.0)
+        assert flights.in_flight == 0
+        assert runs == [1]
+
+    asyncio.run(scenario())
+
+
+def test_disconnected_waiter_leaves_with_job_cancelled():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "text"
+
+        async def gone():
+            return True
+
+        async def connected():
+            return False
+
+        leaving = asyncio.create_task(flights.do("key", compute, gone))
+        staying = asyncio.create_task(flights.do("key", compute, connected))
+        with pytest.raises(JobCancelled):
+            await leaving
+        release.set()
+        assert await staying == "text"
+
+    asyncio.run(scenario())
+
+
+def test_content_key_separates_parts():
+    assert content_key(b"ab", "c") != content_key(b"a", "bc")
+    assert content_key(b"ab", "c") == content_key(b"ab", "c")
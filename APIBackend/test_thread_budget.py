@@ -0,0 +1,43 @@
+"""CPU thread allocation across workers and services.
+
+Run from APIBackend/: python -m pytest test_thread_budget.py
+"""
+
+import thread_budget
+
+
+def test_split_threads_by_share():
+    assert thread_budget.split_threads(6, {"tts": 2, "ocr": 1}) == {"tts": 4, "ocr": 2}
+    # The remainder goes to the largest fractions and the total is kept
+    threads = thread_budget.split_threads(5, {"tts": 1, "ocr": 1, "color": 1})
+    assert sum(threads.values()) == 5
+    assert sorted(threads.values()) == [1, 2, 2]
+
+
+def test_split_threads_gives_every_service_one():
+    assert thread_budget.split_threads(1, {"tts": 1, "ocr": 1}) == {"tts": 1, "ocr": 1}
+    # A small share still gets its thread without exceeding the total
+    assert thread_budget.split_threads(4, {"tts": 10, "ocr": 0.1}) == {"tts": 3, "ocr": 1}
+
+
+def test_split_evenly_keeps_all_items():
+    chunks = thread_budget.split_evenly(list(range(7)), 3)
+    assert chunks == [[0, 1, 2], [3, 4], [5, 6]]
+
+
+def test_worker_cpus_cover_the_node_without_overlap(monkeypatch):
+    monkeypatch.setattr(thread_budget, "_read_topology", lambda cpu, name: None)
+    cpus = list(range(8))
+    assigned = [thread_budget.worker_cpus(3, slot, cpus) for slot in range(3)]
+    assert sorted(cpu for chunk in assigned for cpu in chunk) == cpus
+
+
+def test_configure_reads_settings_set_after_import(monkeypatch):
+    # serve.py sets these after importing thread_budget and may run the app in-process
+    monkeypatch.setenv("DRISHTI_WORKERS", "1")
+    monkeypatch.setenv("DRISHTI_THREADS_PER_WORKER", "2")
+    monkeypatch.setattr(thread_budget, "set_torch_threads", lambda threads, interop: None)
+    monkeypatch.setattr(thread_budget, "set_opencv_threads", lambda threads: None)
+    allocation = thread_budget.configure(pin=False, services={"tts": 1, "ocr": 1})
+    assert allocation["threads"] == 2
+    assert allocation["services"] == {"tts": 1, "ocr": 1}
@@ -0,0 +1,57 @@
+"""Tiling of large images and merging of per-tile OCR results.
+
+Run from APIBackend/: python -m pytest test_tiled_ocr.py
+"""
+
+import tiled_ocr
+
+SHAPE = (2000, 3000, 3)
+
+
+def quad(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def read(tile, boxes):
+    """readtext-style results for the given image-space boxes, in tile coordinates"""
+    tx, ty = tile[0], tile[1]
+    return [(quad(x0 - tx, y0 - ty, x1 - tx, y1 - ty), text, confidence) for (x0, y0, x1, y1), text, confidence in boxes]
+
+
+def test_tiles_cover_the_image_with_overlap():
+    tiles = tiled_ocr.make_tiles(SHAPE)
+    assert tiles == [(0, 0, 1600, 1600), (1400, 0, 3000, 1600), (0, 400, 1600, 2000), (1400, 400, 3000, 2000)]
+    assert tiled_ocr.make_tiles((1000, 800, 3)) == [(0, 0, 800, 1000)]
+
+
+def test_every_pixel_is_inside_a_tile():
+    shape = (3517, 4211)
+    tiles = tiled_ocr.make_tiles(shape)
+    for y in range(0, shape[0], 97):
+        for x in range(0, shape[1], 97):
+            assert any(x0 <= x < x1 and y0 <= y < y1 for x0, y0, x1, y1 in tiles)
+
+
+def test_merge_drops_overlap_duplicates_and_cut_copies():
+    left, right, lower_left, _ = tiled_ocr.make_tiles(SHAPE)
+    tile_results = [
+        (left, read(left, [
+            ((100, 100, 300, 130), "first", 0.9),
+            # Inside the overlap and seen whole by both tiles
+            ((1450, 100, 1550, 130), "second", 0.8),
+            # Cut off by this tile's right edge
+            ((1500, 300, 1600, 330), "thi", 0.95),
+            ((100, 900, 300, 930), "fourth", 0.9),
+        ])),
+        (right, read(right, [
+            ((1450, 100, 1550, 130), "second?", 0.6),
+            ((1500, 300, 1700, 330), "third", 0.7),
+        ])),
+        (lower_left, read(lower_left, [
+            ((100, 900, 300, 930), "fourth", 0.85),
+        ])),
+    ]
+    merged = tiled_ocr.merge(tile_results, SHAPE)
+    assert [text for _, text, _ in merged] == ["first", "second", "third", "fourth"]
+    # Boxes come back in image coordinates
+    assert merged[2][0] == [[1500.0, 300.0], [1700.0, 300.0], [1700.0, 330.0], [1500.0, 330.0]]
@@ -0,0 +1,61 @@
+"""Per-sentence TTS audio cache.
+
+Run from APIBackend/: python -m pytest test_tts_cache.py
+"""
+
+import numpy as np
+import soundfile as sf
+
+import tts_cache
+
+RATE = 16000
+
+
+def fake_synthesize(calls):
+    def synthesize(sentence, path, token):
+        calls.append(sentence)
+        sf.write(path, np.full(RATE // 10, len(sentence) / 100.0, dtype=np.float32), RATE)
+    return synthesize
+
+
+def test_split_sentences():
+    text = "ನಮಸ್ಕಾರ.  ಹೇಗಿದ್ದೀರಿ?\nಇದು   ಎರಡನೇ ಸಾಲು। Done!"
+    assert tts_cache.split_sentences(text) == ["ನಮಸ್ಕಾರ.", "ಹೇಗಿದ್ದೀರಿ?", "ಇದು ಎರಡನೇ ಸಾಲು।", "Done!"]
+    # Spacing noise from OCR does not change the key
+    assert tts_cache.split_sentences("a  b.") == tts_cache.split_sentences("a b.")
+    assert tts_cache.split_sentences("no end") == ["no end"]
+
+
+def test_only_new_sentences_are_synthesized(tmp_path):
+    cache = tts_cache.SentenceAudioCache(str(tmp_path))
+    calls = []
+
+    units = cache.plan("One. Two. One.", "voice", "v1")
+    result = cache.render(units, str(tmp_path / "first.wav"), fake_synthesize(calls))
+    # The repeated sentence is synthesized once within the text
+    assert calls == ["One.", "Two."]
+    assert result == {"units": 3, "hits": 1, "sample_rate": RATE}
+
+    units = cache.plan("Two. Three.", "voice", "v1")
+    assert [unit.cached for unit in units] == [True, False]
+    result = cache.render(units, str(tmp_path / "second.wav"), fake_synthesize(calls))
+    assert calls == ["One.", "Two.", "Three."]
+    assert result["hits"] / result["units"] == 0.5
+
+    # Sentences plus a pause between each
+    audio, rate = sf.read(str(tmp_path / "second.wav"))
+    assert len(audio) == 2 * (RATE // 10) + int(tts_cache.SENTENCE_PAUSE_SECONDS * RATE)
+
+
+def test_voice_and_version_are_part_of_the_key(tmp_path):
+    cache = tts_cache.SentenceAudioCache(str(tmp_path))
+    cache.render(cache.plan("One.", "voice", "v1"), str(tmp_path / "out.wav"), fake_synthesize([]))
+    assert cache.plan("One.", "voice", "v1")[0].cached
+    assert not cache.plan("One.", "other voice", "v1")[0].cached
+    assert not cache.plan("One.", "voice", "v2")[0].cached
+
+
+def test_prune_keeps_the_cache_under_its_limit(tmp_path):
+    cache = tts_cache.SentenceAudioCache(str(tmp_path / "cache"), max_bytes=0)
+    cache.render(cache.plan("One. Two.", "voice", "v1"), str(tmp_path / "out.wav"), fake_synthesize([]))
+    assert not [name for name in (tmp_path / "cache").iterdir()]
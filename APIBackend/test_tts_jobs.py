@@ -0,0 +1,67 @@
+"""TTS job queue behaviour that does not need the models.
+
+Run from APIBackend/: python -m pytest test_tts_jobs.py
+"""
+
+import time
+
+import pytest
+
+import tts_jobs
+
+
+@pytest.fixture
+def conn(tmp_path):
+    with tts_jobs.open_db(str(tmp_path / "jobs.sqlite3")) as conn:
+        yield conn
+
+
+def make_stale(conn, job_id):
+    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?",
+                 (time.time() - tts_jobs.STALE_AFTER_SECONDS - 1, job_id))
+
+
+def test_requeue_stale_requeues_until_attempts_run_out(conn):
+    row, _ = tts_jobs.submit(conn, "ನಮಸ್ಕಾರ", "voice")
+    for attempt in range(1, tts_jobs.MAX_ATTEMPTS + 1):
+        claimed = tts_jobs.claim(conn, "worker")
+        assert claimed["id"] == row["id"]
+        assert claimed["attempts"] == attempt
+        # The worker dies without reporting, e.g. killed by the OOM killer
+        make_stale(conn, row["id"])
+        assert tts_jobs.requeue_stale(conn) == 1
+        status = tts_jobs.get(conn, row["id"])["status"]
+        assert status == (tts_jobs.QUEUED if attempt < tts_jobs.MAX_ATTEMPTS else tts_jobs.FAILED)
+
+    failed = tts_jobs.get(conn, row["id"])
+    assert failed["finished_at"] is not None
+    assert failed["error"]
+    assert tts_jobs.claim(conn, "worker") is None
+
+
+def test_requeue_stale_leaves_live_jobs(conn):
+    tts_jobs.submit(conn, "ನಮಸ್ಕಾರ", "voice")
+    claimed = tts_jobs.claim(conn, "worker")
+    assert tts_jobs.requeue_stale(conn) == 0
+    assert tts_jobs.get(conn, claimed["id"])["status"] == tts_jobs.RUNNING
+
+
+def test_worker_that_lost_its_job_cannot_finish_it(conn):
+    row, _ = tts_jobs.submit(conn, "ನಮಸ್ಕಾರ", "voice")
+    tts_jobs.claim(conn, "slow")
+    make_stale(conn, row["id"])
+    tts_jobs.requeue_stale(conn)
+    tts_jobs.claim(conn, "fast")
+
+    # The slow worker finishes or fails after its job was handed on
+    assert not tts_jobs.heartbeat(conn, row["id"], "slow", 10)
+    assert not tts_jobs.complete(conn, row["id"], "slow", "slow.wav", 44100)
+    assert not tts_jobs.fail(conn, row["id"], "slow", "boom")
+    job = tts_jobs.get(conn, row["id"])
+    assert job["status"] == tts_jobs.RUNNING
+    assert job["worker"] == "fast"
+
+    assert tts_jobs.complete(conn, row["id"], "fast", "fast.wav", 44100)
+    job = tts_jobs.get(conn, row["id"])
+    assert job["status"] == tts_jobs.DONE
+    assert job["result_path"] == "fast.wav"
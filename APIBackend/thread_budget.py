@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Allocation of CPU threads to worker processes and services.
+
+PyTorch, OpenCV and EasyOCR each default to one thread per core in every
+process, so N workers on a node run N x cores threads that fight each other.
+Here the cores are split between the worker processes, keeping the hyperthread
+siblings of a physical core in the same worker, and each worker's share is
+split again between its services (TTS and OCR run at the same time in their
+own scheduler threads).
+
+Each worker claims a slot through a lock file, sets torch's intra-op and
+inter-op thread counts and OpenCV's thread count to its share, and with
+DRISHTI_PIN_THREADS=1 pins itself to its cores. serve.py sets DRISHTI_WORKERS
+and DRISHTI_THREAD_SLOT_DIR for the workers it starts.
+"""
+
+import fcntl
+import os
+
+# Relative shares of a worker's threads, e.g. "tts=2,ocr=1"
+SERVICE_SHARES = os.environ.get("DRISHTI_SERVICE_SHARES", "tts=1,ocr=1")
+# Requests are already parallel across workers and services, so one inter-op thread is enough
+INTEROP_THREADS = 1
+
+allocation = None
+_slot_file = None
+
+
+def available_cpus():
+    """CPU ids this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(text):
+    """Parse a kernel CPU list such as "0-3,8" into [0, 1, 2, 3, 8]"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _read_topology(cpu, name):
+    try:
+        with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/{name}") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def core_groups(cpus=None):
+    """
+    Group CPUs by physical core.
+
+    Returns:
+        Lists of hyperthread siblings ordered by socket and core, so that
+        contiguous runs of groups stay on one socket
+    """
+    cpus = available_cpus() if cpus is None else cpus
+    allowed = set(cpus)
+    groups = {}
+    for cpu in cpus:
+        siblings = _read_topology(cpu, "thread_siblings_list")
+        members = [c for c in parse_cpu_list(siblings) if c in allowed] if siblings else [cpu]
+        package = _read_topology(cpu, "physical_package_id") or "0"
+        groups[tuple(members or [cpu])] = int(package)
+    return [list(members) for members, _ in sorted(groups.items(), key=lambda item: (item[1], item[0]))]
+
+
+def split_evenly(items, parts):
+    """Split items into parts contiguous chunks whose sizes differ by at most one"""
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def worker_cpus(workers, slot, cpus=None):
+    """The CPUs given to worker slot out of workers"""
+    cpus = available_cpus() if cpus is None else cpus
+    groups = core_groups(cpus)
+    if workers <= len(groups):
+        chunk = split_evenly(groups, workers)[slot]
+        return sorted(cpu for group in chunk for cpu in group)
+    # More workers than physical cores: share out logical CPUs, wrapping around
+    chunks = split_evenly(cpus, min(workers, len(cpus)))
+    return chunks[slot % len(chunks)]
+
+
+def parse_shares(text):
+    shares = {}
+    for part in text.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            shares[name.strip()] = float(value)
+    return shares
+
+
+def split_threads(total, shares):
+    """
+    Split total threads between services by share.
+
+    Every service runs in its own inference thread and gets at least one, so a
+    worker needs at least len(shares) threads; with fewer, the services together
+    use more threads than the worker was given. serve.py sizes workers so that
+    each has enough.
+    """
+    if not shares:
+        return {}
+    # One thread each, then the rest by share
+    spare = max(0, total - len(shares))
+    weight = sum(shares.values()) or 1.0
+    exact = {name: spare * share / weight for name, share in shares.items()}
+    threads = {name: int(value) for name, value in exact.items()}
+    # Hand out the remainder by largest fraction
+    for name in sorted(exact, key=lambda n: exact[n] - threads[n], reverse=True)[:spare - sum(threads.values())]:
+        threads[name] += 1
+    return {name: 1 + n for name, n in threads.items()}
+
+
+def claim_slot(workers, slot_dir=None):
+    """
+    Claim a free worker slot by locking its file.
+
+    The lock is held for the life of the process, so a restarted worker takes
+    over the slot of the one that exited. Returns None when no slot directory
+    is configured or every slot is taken.
+    """
+    global _slot_file
+    if workers == 1:
+        return 0
+    slot_dir = slot_dir or os.environ.get("DRISHTI_THREAD_SLOT_DIR")
+    if slot_dir is None:
+        return None
+    os.makedirs(slot_dir, exist_ok=True)
+    for slot in range(workers):
+        f = open(os.path.join(slot_dir, f"slot-{slot}.lock"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _slot_file = f
+        return slot
+    return None
+
+
+def set_torch_threads(threads, interop_threads=None):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    if interop_threads is not None:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only allowed once, before any inter-op work has started
+            pass
+
+
+def set_opencv_threads(threads):
+    try:
+        import cv2
+    except ImportError:
+        return
+    cv2.setNumThreads(threads)
+
+
+def configure(workers=None, slot=None, threads=None, services=None, pin=None):
+    """
+    Apply this process's share of the CPU.
+
+    Call before any model is loaded and before worker threads are started, since
+    threads inherit the CPU affinity of the thread that creates them.
+
+    Args:
+        workers: Worker processes sharing the node
+        slot: This worker's slot; claimed through a lock file when None
+        threads: Threads for this worker; defaults to its share of the cores
+        services: Relative thread shares per service
+        pin: Pin the process to its cores
+
+    Settings left as None come from the environment, read here rather than at
+    import: serve.py sets them after importing this module, and runs a single
+    worker in its own process.
+
+    Returns:
+        Dict describing the allocation
+    """
+    global allocation
+    workers = workers or int(os.environ.get("DRISHTI_WORKERS", "1"))
+    # Threads per worker; by default the worker's share of the cores
+    threads = threads or int(os.environ.get("DRISHTI_THREADS_PER_WORKER", "0")) or None
+    pin = os.environ.get("DRISHTI_PIN_THREADS", "0") == "1" if pin is None else pin
+    cpus = available_cpus()
+    if slot is None:
+        slot = claim_slot(workers)
+    if slot is None:
+        # No slot to pin to; just avoid oversubscription
+        assigned = cpus
+        threads = threads or max(1, len(cpus) // workers)
+        pin = False
+    else:
+        assigned = worker_cpus(workers, slot, cpus)
+        threads = threads or len(assigned)
+
+    if pin:
+        try:
+            os.sched_setaffinity(0, assigned)
+        except (AttributeError, OSError) as e:
+            print(f"Could not pin worker to CPUs {assigned}: {e}")
+            pin = False
+
+    services = parse_shares(SERVICE_SHARES) if services is None else services
+    if threads < len(services):
+        print(f"{threads} threads cannot be split between {len(services)} services without oversubscribing; "
+              f"give each worker at least {len(services)}")
+    service_threads = split_threads(threads, services)
+    set_torch_threads(threads, INTEROP_THREADS)
+    # OpenCV runs image decoding and preprocessing alongside OCR
+    set_opencv_threads(service_threads.get("ocr", threads))
+
+    allocation = {
+        "workers": workers,
+        "slot": slot,
+        "cpus": assigned,
+        "pinned": pin,
+        "threads": threads,
+        "interop_threads": INTEROP_THREADS,
+        "services": service_threads,
+    }
+    print(f"Thread allocation: worker slot {slot}/{workers}, {threads} threads on CPUs "
+          f"{assigned}{' (pinned)' if pin else ''}, services {service_threads}")
+    return allocation
+
+
+def service_initializer(service):
+    """
+    Initializer for a service's inference threads that applies its thread count.
+
+    torch's thread count is per calling thread in OpenMP builds, so it is set in
+    each inference thread rather than once per process.
+    """
+    def initialize():
+        if allocation is not None and service in allocation["services"]:
+            set_torch_threads(allocation["services"][service])
+    return initialize
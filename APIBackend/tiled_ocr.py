@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiled OCR for very large images such as flatbed scans and newspaper pages.
+
+One readtext pass over a large image is slow, and shrinking the image to the
+detector's canvas makes small Kannada glyphs unreadable. Instead the image is
+cut into overlapping tiles that are read at full resolution, in parallel when
+OCR runs in worker processes. Boxes found twice in an overlap are merged, and
+the lines are put back in reading order.
+
+The overlap must be taller than a line of text, so that every line lies
+completely inside at least one tile; the copy cut by a tile edge is dropped.
+"""
+
+from live_ocr import reading_order
+
+TILE_SIZE = 1600
+TILE_OVERLAP = 200
+# Images larger than this are tiled even when the client did not ask for it
+AUTO_TILE_MEGAPIXELS = 20.0
+# Boxes within this many pixels of an inner tile edge may be cut off by it
+EDGE_MARGIN = 4
+# Boxes from different tiles are duplicates when this much of the smaller one is covered
+DUPLICATE_COVERAGE = 0.5
+
+
+def _starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    step = tile - overlap
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def make_tiles(shape, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Overlapping (x_min, y_min, x_max, y_max) tiles covering an image"""
+    height, width = shape[:2]
+    return [
+        (x, y, min(width, x + tile), min(height, y + tile))
+        for y in _starts(height, tile, overlap)
+        for x in _starts(width, tile, overlap)
+    ]
+
+
+class Region:
+    def __init__(self, box, quad, text, confidence, tile, cut):
+        self.box = box
+        self.quad = quad
+        self.text = text
+        self.confidence = confidence
+        self.tile = tile
+        self.cut = cut
+
+    @property
+    def area(self):
+        return (self.box[1] - self.box[0]) * (self.box[3] - self.box[2])
+
+
+def _coverage(a, b):
+    """Fraction of the smaller box covered by the other"""
+    ix = max(0, min(a.box[1], b.box[1]) - max(a.box[0], b.box[0]))
+    iy = max(0, min(a.box[3], b.box[3]) - max(a.box[2], b.box[2]))
+    smaller = min(a.area, b.area)
+    return ix * iy / float(smaller) if smaller else 0.0
+
+
+def _regions(tile, results, shape):
+    """readtext results of one tile, moved into image coordinates"""
+    height, width = shape[:2]
+    x0, y0, x1, y1 = tile
+    regions = []
+    for quad, text, confidence in results:
+        points = [[float(x) + x0, float(y) + y0] for x, y in quad]
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        box = [min(xs), max(xs), min(ys), max(ys)]
+        # Touching an edge shared with a neighbouring tile means the text may continue past it
+        cut = (
+            (x0 > 0 and box[0] - x0 <= EDGE_MARGIN)
+            or (x1 < width and x1 - box[1] <= EDGE_MARGIN)
+            or (y0 > 0 and box[2] - y0 <= EDGE_MARGIN)
+            or (y1 < height and y1 - box[3] <= EDGE_MARGIN)
+        )
+        regions.append(Region(box, points, text, float(confidence), tile, cut))
+    return regions
+
+
+def merge(tile_results, shape):
+    """
+    Combine per-tile readtext results into one list in reading order.
+
+    Args:
+        tile_results: (tile, readtext results) pairs
+        shape: Shape of the whole image
+
+    Returns:
+        (quad, text, confidence) tuples like readtext, in image coordinates
+    """
+    regions = [region for tile, results in tile_results for region in _regions(tile, results, shape)]
+    kept = []
+    # Whole boxes beat ones cut by a tile edge, then the more confident reading wins
+    for region in sorted(regions, key=lambda r: (r.cut, -r.confidence, -r.area)):
+        duplicate = any(
+            other.tile != region.tile and _coverage(region, other) >= DUPLICATE_COVERAGE
+            for other in kept
+        )
+        if not duplicate:
+            kept.append(region)
+    return [(region.quad, region.text, region.confidence) for region in reading_order(kept)]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cheap triage of camera frames before OCR.
+
+Many frames sent to /ocr/ are blurred, too dark or show no text, and each
+used to pay for a full detection and recognition pass only to return an
+empty string. A few vectorized checks on a small grayscale copy (sharpness as
+the variance of the Laplacian, and exposure), followed by the text detector
+at low resolution, reject such frames in milliseconds with a reason the app
+can show, e.g. "hold the phone still".
+"""
+
+import cv2
+import numpy as np
+
+# Checks run on a copy no larger than this, so their cost does not grow with the photo
+TRIAGE_SIDE = 1024
+# Variance of the Laplacian below this is too blurred to read
+BLUR_THRESHOLD = 60.0
+# Mean brightness below this, with no bright areas, is too dark
+DARK_MEAN = 35.0
+DARK_P99 = 100.0
+# Mostly clipped highlights with little contrast left is overexposed
+CLIPPED_LEVEL = 250
+CLIPPED_FRACTION = 0.75
+FLAT_STD = 20.0
+# Detector canvas for the text-presence check; lines of a photographed page stay detectable
+TEXT_CANVAS = 960
+
+RETAKE_DETAILS = {
+    "blurry": "The photo is blurred; hold the phone still and try again",
+    "too_dark": "The photo is too dark; add light and try again",
+    "overexposed": "The photo is washed out; avoid glare and try again",
+    "no_text": "No text was found; point the camera at the text and try again",
+}
+
+
+def small_gray(image):
+    """Grayscale copy whose longer side is at most TRIAGE_SIDE"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = TRIAGE_SIDE / float(max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def image_scores(image):
+    """Sharpness and exposure statistics of an image"""
+    gray = small_gray(image)
+    return {
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        "brightness": float(gray.mean()),
+        "contrast": float(gray.std()),
+        "p99": float(np.percentile(gray, 99)),
+        "clipped_fraction": float(np.count_nonzero(gray >= CLIPPED_LEVEL)) / gray.size,
+    }
+
+
+def quality_reason(scores):
+    """Why an image should be retaken, or None if it looks readable"""
+    if scores["brightness"] < DARK_MEAN and scores["p99"] < DARK_P99:
+        return "too_dark"
+    if scores["clipped_fraction"] > CLIPPED_FRACTION and scores["contrast"] < FLAT_STD:
+        return "overexposed"
+    if scores["sharpness"] < BLUR_THRESHOLD:
+        return "blurry"
+    return None
+
+
+def count_text_boxes(reader, image, canvas_size=TEXT_CANVAS):
+    """Number of text regions the detector finds at low resolution"""
+    horizontal_list, free_list = reader.detect(image, canvas_size=canvas_size)
+    return len(horizontal_list[0]) + len(free_list[0])
+
+
+def retake(reason, scores):
+    """Structured /ocr/ response asking the user to take another photo"""
+    return {"status": "retake", "reason": reason, "detail": RETAKE_DETAILS[reason], "scores": scores, "text": ""}
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sentence-level cache of synthesized audio.
+
+A rescanned page, or OCR output that differs by a word, used to be
+synthesized again in full. Text is now split into normalized sentences and
+each (sentence, voice, model version) unit is cached on disk as WAV. Only
+missing units are synthesized; cached and new segments are joined with a short
+pause into the response. The cache lives on disk so every worker on the host
+shares it, and the least recently used units are deleted beyond the size limit.
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+import uuid
+
+import numpy as np
+import soundfile as sf
+
+from metrics import TTS_CACHE_UNITS
+
+CACHE_DIR = os.environ.get("DRISHTI_TTS_CACHE_DIR", os.path.join("audio", "cache"))
+MAX_CACHE_BYTES = int(os.environ.get("DRISHTI_TTS_CACHE_MB", "512")) * 1024 * 1024
+# Silence inserted between sentences, since each unit has its trailing silence trimmed
+SENTENCE_PAUSE_SECONDS = 0.25
+
+# Latin and Devanagari sentence ends; Kannada text uses the full stop
+_SENTENCE_END = re.compile(r"(?<=[.!?।॥])\s+")
+
+
+def normalize(text):
+    """NFC form with runs of whitespace collapsed, so OCR spacing noise does not miss the cache"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def split_sentences(text):
+    """Normalized sentences of text, keeping their punctuation"""
+    sentences = []
+    for paragraph in text.splitlines():
+        sentences.extend(s for s in _SENTENCE_END.split(normalize(paragraph)) if s)
+    return sentences or [text]
+
+
+def unit_key(sentence, voice_description, version):
+    return hashlib.sha256(f"{version}\0{voice_description}\0{sentence}".encode("utf-8")).hexdigest()
+
+
+class Unit:
+    def __init__(self, sentence, key, cached):
+        self.sentence = sentence
+        self.key = key
+        self.cached = cached
+
+
+class SentenceAudioCache:
+    """
+    Per-sentence WAV files keyed by sentence, voice and model version.
+
+    Args:
+        directory: Where the units are stored
+        max_bytes: Size above which the least recently used units are deleted
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def read(self, key):
+        """
+        Audio and sample rate of a cached unit, marked as recently used, or None.
+
+        Another worker's prune may delete the unit at any moment; once the file
+        is open it stays readable, and a unit that is already gone is a miss.
+        """
+        try:
+            with open(self.path(key), "rb") as f:
+                os.utime(f.fileno())
+                return sf.read(f, dtype="float32")
+        except FileNotFoundError:
+            return None
+
+    def plan(self, text, voice_description, version):
+        """Split text into units and note which are already cached"""
+        units = []
+        for sentence in split_sentences(text):
+            key = unit_key(sentence, voice_description, version)
+            units.append(Unit(sentence, key, os.path.exists(self.path(key))))
+        return units
+
+    def render(self, units, output_path, synthesize, token=None):
+        """
+        Synthesize missing units, then join all units into output_path.
+
+        Args:
+            synthesize: Callable (sentence, path, token) that writes one unit as WAV
+            token: Optional scheduler CancelToken checked between units
+
+        Returns:
+            Dict with the number of units, cache hits and the sample rate
+        """
+        hits = 0
+        segments = {}
+        for unit in units:
+            if unit.key in segments:
+                # A sentence repeated in the same text is synthesized once
+                hits += 1
+                continue
+            segment = self.read(unit.key)
+            if segment is None:
+                if token is not None:
+                    token.check()
+                # Written under a unique name and renamed, so readers never see a partial file
+                partial = os.path.join(self.directory, f"{unit.key}.{uuid.uuid4().hex}.partial.wav")
+                try:
+                    synthesize(unit.sentence, partial, token)
+                    # Read before publishing it, since a prune may delete it right after
+                    segment = sf.read(partial, dtype="float32")
+                    os.replace(partial, self.path(unit.key))
+                finally:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+            else:
+                hits += 1
+            segments[unit.key] = segment
+
+        sample_rate = segments[units[0].key][1]
+        pause = np.zeros(int(SENTENCE_PAUSE_SECONDS * sample_rate), dtype=np.float32)
+        audio = []
+        for i, unit in enumerate(units):
+            data, rate = segments[unit.key]
+            if rate != sample_rate:
+                raise ValueError(f"Cached unit has sample rate {rate}, expected {sample_rate}")
+            if i:
+                audio.append(pause)
+            audio.append(data)
+        sf.write(output_path, np.concatenate(audio), sample_rate)
+
+        TTS_CACHE_UNITS.labels("hit").inc(hits)
+        TTS_CACHE_UNITS.labels("miss").inc(len(units) - hits)
+        if hits < len(units):
+            self.prune()
+        return {"units": len(units), "hits": hits, "sample_rate": sample_rate}
+
+    def prune(self):
+        """Delete the least recently used units until the cache fits its size limit"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".wav") and not entry.name.endswith(".partial.wav"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parler TTS model loading and synthesis.
+
+Shared by the API process and the background TTS job workers, so it must not
+import the FastAPI app.
+"""
+
+import math
+import os
+import shutil
+import ssl
+import sys
+
+import numpy as np
+import soundfile as sf
+import torch
+from parler_tts import ParlerTTSForConditionalGeneration
+from transformers import AutoTokenizer, StoppingCriteria, StoppingCriteriaList
+
+import model_cache
+from metrics import (
+    TTS_DECODE_STEPS,
+    TTS_EARLY_STOPS,
+    TTS_TRIMMED_SECONDS,
+    model_load_timer,
+    stage,
+)
+
+# Disable SSL certificate verification for downloading models
+ssl._create_default_https_context = ssl._create_unverified_context
+
+TTS_CHECKPOINT = "ai4bharat/indic-parler-tts"
+DEFAULT_VOICE_DESCRIPTION = "Anu's voice is monotone yet slightly clear in delivery, with a very close recording that almost has no background noise."
+
+device = "cuda:0" if torch.cuda.is_available() else "cpu"
+# Weights are stored in the model cache already converted to this dtype
+TTS_DTYPE = os.environ.get("DRISHTI_TTS_DTYPE", "float16" if torch.cuda.is_available() else "float32")
+
+# Generation length limits. Durations are bounded by the slowest plausible
+# Kannada reading rate, measured with `python tts_engine.py calibrate <file>`
+# (one sentence per line) on the default voice.
+KANNADA_CHARS_PER_SECOND = 11.0
+SECONDS_PER_PROMPT_TOKEN = 0.35
+LENGTH_MARGIN = 1.3
+MIN_AUDIO_SECONDS = 1.0
+# Fastest plausible rate; silence is not treated as the end before this much audio
+FAST_CHARS_PER_SECOND = 20.0
+# Parler's DAC codec produces 86 frames per second of 44.1 kHz audio
+DEFAULT_FRAME_RATE = 86
+
+# Generation stops once the first codebook has held (nearly) one code for this long
+SILENCE_WINDOW_SECONDS = 0.8
+SILENCE_MAX_DISTINCT_CODES = 2
+# Trailing audio quieter than this (relative to the peak) is trimmed
+TRIM_THRESHOLD_DB = -45.0
+TRIM_PADDING_SECONDS = 0.15
+
+tts_model = None
+tts_tokenizer = None
+description_tokenizer = None
+
+
+def load_tts_bundle(checkpoint=TTS_CHECKPOINT, use_cache=True):
+    """
+    Load a Parler checkpoint (Hugging Face id or local directory) and its tokenizers.
+
+    A ready artifact in the model cache is loaded without network access;
+    otherwise the checkpoint is loaded from the hub.
+    """
+    artifact = model_cache.tts_artifact_dir(checkpoint, TTS_DTYPE)
+    if use_cache and model_cache.ready_artifact(artifact):
+        print(f"Loading TTS models and tokenizers from the model cache {artifact} on {device}...")
+        with model_load_timer("tts"):
+            model = ParlerTTSForConditionalGeneration.from_pretrained(
+                artifact, torch_dtype=getattr(torch, TTS_DTYPE), local_files_only=True
+            ).to(device)
+            tokenizer = AutoTokenizer.from_pretrained(os.path.join(artifact, "tokenizer"), local_files_only=True)
+            text_encoder_tokenizer = AutoTokenizer.from_pretrained(
+                os.path.join(artifact, "description_tokenizer"), local_files_only=True
+            )
+        return model, tokenizer, text_encoder_tokenizer
+
+    print(f"Loading TTS models and tokenizers from {checkpoint} on {device}...")
+    with model_load_timer("tts"):
+        model = ParlerTTSForConditionalGeneration.from_pretrained(checkpoint).to(device)
+        tokenizer = AutoTokenizer.from_pretrained(checkpoint)
+        text_encoder_tokenizer = AutoTokenizer.from_pretrained(model.config.text_encoder._name_or_path)
+    return model, tokenizer, text_encoder_tokenizer
+
+
+def build_tts_artifact(checkpoint=TTS_CHECKPOINT, dtype=None):
+    """Store a checkpoint in the model cache converted to dtype, as safetensors plus config"""
+    dtype = dtype or TTS_DTYPE
+    directory = model_cache.tts_artifact_dir(checkpoint, dtype)
+    model, tokenizer, text_encoder_tokenizer = load_tts_bundle(checkpoint, use_cache=False)
+    # Rebuilt from scratch, so files of an older build do not linger
+    shutil.rmtree(directory, ignore_errors=True)
+    model.to(getattr(torch, dtype)).save_pretrained(directory, safe_serialization=True)
+    tokenizer.save_pretrained(os.path.join(directory, "tokenizer"))
+    text_encoder_tokenizer.save_pretrained(os.path.join(directory, "description_tokenizer"))
+    return model_cache.write_manifest(directory, "tts", checkpoint, dtype=dtype)
+
+
+def load_tts_models():
+    """Initialize TTS models if not already loaded"""
+    global tts_model, tts_tokenizer, description_tokenizer
+    if tts_model is None:
+        tts_model, tts_tokenizer, description_tokenizer = load_tts_bundle()
+    return tts_model, tts_tokenizer, description_tokenizer
+
+
+def unload_tts_models():
+    """Drop the references to the TTS model and tokenizers so they can be freed"""
+    global tts_model, tts_tokenizer, description_tokenizer
+    tts_model = None
+    tts_tokenizer = None
+    description_tokenizer = None
+
+
+class CancelCriteria(StoppingCriteria):
+    """Stop generation between decoding steps once the job is cancelled"""
+
+    def __init__(self, token):
+        self.token = token
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.token.cancelled, dtype=torch.bool, device=input_ids.device)
+
+
+class SilenceCriteria(StoppingCriteria):
+    """
+    Stop generation once the codec frames have gone silent.
+
+    Silence comes out of the codec as a run of one or two repeated codes in the
+    first codebook, so the check works on the generated tokens without decoding
+    audio. It is not applied before min_steps, so pauses in the middle of a
+    sentence do not end it early.
+    """
+
+    def __init__(self, num_codebooks, min_steps, window):
+        self.num_codebooks = num_codebooks
+        self.min_steps = min_steps
+        self.window = window
+        self.steps = 0
+        self.fired = False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.steps += 1
+        silent = False
+        rows = input_ids.shape[0]
+        if self.steps >= self.min_steps and input_ids.shape[-1] >= self.window and rows % self.num_codebooks == 0:
+            first_codebook = input_ids.reshape(-1, self.num_codebooks, input_ids.shape[-1])[:, 0, -self.window:]
+            silent = all(
+                torch.unique(codes).numel() <= SILENCE_MAX_DISTINCT_CODES for codes in first_codebook
+            )
+            self.fired = self.fired or silent
+        return torch.full((rows,), silent, dtype=torch.bool, device=input_ids.device)
+
+
+class ProgressCriteria(StoppingCriteria):
+    """Report the number of decoding steps done; never stops generation"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.steps = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.steps += 1
+        self.callback(self.steps)
+        return torch.zeros((input_ids.shape[0],), dtype=torch.bool, device=input_ids.device)
+
+
+def model_frame_rate(model):
+    config = getattr(getattr(model, "audio_encoder", None), "config", None)
+    return getattr(config, "frame_rate", None) or DEFAULT_FRAME_RATE
+
+
+def model_num_codebooks(model):
+    """Number of codec codebooks, or None for models without a multi-codebook decoder"""
+    config = getattr(getattr(model, "decoder", None), "config", None)
+    return getattr(config, "num_codebooks", None)
+
+
+def model_max_steps(model):
+    """The generation length the model would run to without our cap"""
+    config = getattr(model, "generation_config", None)
+    return getattr(config, "max_length", None)
+
+
+def generation_limits(text, prompt_tokens, frame_rate):
+    """
+    Decoder step limits for a prompt.
+
+    Returns:
+        Tuple (max_new_tokens, min_steps_before_silence_stop)
+    """
+    chars = len(text.strip())
+    seconds = max(MIN_AUDIO_SECONDS, chars / KANNADA_CHARS_PER_SECOND, prompt_tokens * SECONDS_PER_PROMPT_TOKEN)
+    max_new_tokens = int(math.ceil(seconds * LENGTH_MARGIN * frame_rate))
+    min_steps = int(chars / FAST_CHARS_PER_SECOND * frame_rate)
+    return max_new_tokens, min_steps
+
+
+def trim_trailing_silence(audio, sample_rate):
+    """Cut quiet audio from the end, keeping a short tail; returns (audio, seconds trimmed)"""
+    if audio.ndim != 1 or audio.size == 0:
+        return audio, 0.0
+    peak = float(np.max(np.abs(audio)))
+    if peak == 0.0:
+        return audio, 0.0
+    window = max(1, int(sample_rate * 0.02))
+    frames = audio.size // window
+    if frames == 0:
+        return audio, 0.0
+    rms = np.sqrt(np.mean(audio[:frames * window].reshape(frames, window).astype(np.float64) ** 2, axis=1))
+    threshold = peak * 10 ** (TRIM_THRESHOLD_DB / 20.0)
+    loud = np.nonzero(rms > threshold)[0]
+    if loud.size == 0:
+        return audio, 0.0
+    end = min(audio.size, (loud[-1] + 1) * window + int(TRIM_PADDING_SECONDS * sample_rate))
+    return audio[:end], (audio.size - end) / float(sample_rate)
+
+
+def synthesize_speech(text, voice_description, output_path, token=None, on_step=None, bundle=None):
+    """
+    Generate speech for text and write it to output_path as WAV.
+
+    Args:
+        token: Optional scheduler CancelToken checked between decoding steps
+        on_step: Optional callback receiving the number of decoding steps done
+        bundle: (model, tokenizer, description tokenizer) to use instead of the
+            default checkpoint, e.g. a version being swapped in
+    """
+    tts_model, tts_tokenizer, description_tokenizer = bundle or load_tts_models()
+
+    # Prepare inputs
+    with stage("tokenize"):
+        description_input_ids = description_tokenizer(voice_description, return_tensors="pt").to(device)
+        prompt_input_ids = tts_tokenizer(text, return_tensors="pt").to(device)
+
+    # Cap the output length by the input length and stop early on trailing silence
+    frame_rate = model_frame_rate(tts_model)
+    max_new_tokens, min_steps = generation_limits(text, prompt_input_ids.input_ids.shape[-1], frame_rate)
+    default_max_steps = model_max_steps(tts_model)
+    if default_max_steps:
+        max_new_tokens = min(max_new_tokens, default_max_steps)
+
+    steps = ProgressCriteria(on_step or (lambda n: None))
+    criteria = [steps]
+    if token is not None:
+        criteria.append(CancelCriteria(token))
+    num_codebooks = model_num_codebooks(tts_model)
+    silence = None
+    if num_codebooks:
+        silence = SilenceCriteria(num_codebooks, min_steps, int(SILENCE_WINDOW_SECONDS * frame_rate))
+        criteria.append(silence)
+
+    # Generate audio, stopping between decoding steps if the job is cancelled
+    with stage("inference"):
+        generation = tts_model.generate(
+            input_ids=description_input_ids.input_ids,
+            attention_mask=description_input_ids.attention_mask,
+            prompt_input_ids=prompt_input_ids.input_ids,
+            prompt_attention_mask=prompt_input_ids.attention_mask,
+            stopping_criteria=StoppingCriteriaList(criteria),
+            max_new_tokens=max_new_tokens
+        )
+    if token is not None:
+        token.check()
+    record_generation(steps.steps, max_new_tokens, silence is not None and silence.fired)
+
+    # Convert to audio array, drop trailing silence and save
+    sample_rate = tts_model.config.sampling_rate
+    with stage("audio_encode"):
+        audio_arr, trimmed = trim_trailing_silence(generation.cpu().numpy().squeeze(), sample_rate)
+        TTS_TRIMMED_SECONDS.inc(trimmed)
+        sf.write(output_path, audio_arr, sample_rate)
+
+    return {
+        "output_file": output_path,
+        "sample_rate": sample_rate,
+        "decode_steps": steps.steps,
+        "max_new_tokens": max_new_tokens,
+        "trimmed_seconds": trimmed,
+    }
+
+
+def record_generation(steps, max_new_tokens, silence_stop):
+    """
+    Publish the decoding steps run and whether the cap or silence detection ended them.
+
+    How many steps an early stop saved is not known: most generations would
+    have reached EOS well before the model's maximum length, so the gap to that
+    maximum is not reported as a saving.
+    """
+    TTS_DECODE_STEPS.observe(steps)
+    reason = "silence" if silence_stop else "length_cap" if steps >= max_new_tokens else None
+    if reason is not None:
+        TTS_EARLY_STOPS.labels(reason).inc()
+
+
+def calibrate(path):
+    """
+    Measure speaking rate on real sentences with no length cap.
+
+    Prints characters per second of generated audio so KANNADA_CHARS_PER_SECOND
+    can be set to a low percentile of it.
+    """
+    model, tokenizer, desc_tokenizer = load_tts_models()
+    with open(path, encoding="utf-8") as f:
+        sentences = [line.strip() for line in f if line.strip()]
+    description = desc_tokenizer(DEFAULT_VOICE_DESCRIPTION, return_tensors="pt").to(device)
+    rates = []
+    for sentence in sentences:
+        prompt = tokenizer(sentence, return_tensors="pt").to(device)
+        generation = model.generate(
+            input_ids=description.input_ids,
+            attention_mask=description.attention_mask,
+            prompt_input_ids=prompt.input_ids,
+            prompt_attention_mask=prompt.attention_mask,
+        )
+        audio, _ = trim_trailing_silence(generation.cpu().numpy().squeeze(), model.config.sampling_rate)
+        seconds = audio.size / float(model.config.sampling_rate)
+        rates.append(len(sentence) / seconds)
+        print(f"{len(sentence):4d} chars {seconds:6.2f}s {rates[-1]:6.2f} chars/s "
+              f"{prompt.input_ids.shape[-1] / seconds:6.2f} tokens/s")
+    rates.sort()
+    print(f"chars/s: min {rates[0]:.2f}  p10 {rates[int(0.1 * (len(rates) - 1))]:.2f}  "
+          f"median {rates[len(rates) // 2]:.2f}  max {rates[-1]:.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "calibrate":
+        calibrate(sys.argv[2])
+    else:
+        print("Usage: python tts_engine.py calibrate <sentences.txt>")
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent queue for asynchronous TTS jobs.
+
+Jobs are stored in a local SQLite database so they survive restarts of both
+the API and the workers. The API only inserts and reads rows; separate worker
+processes (tts_worker.py) claim queued jobs, synthesize them and record the
+result. Identical submissions (same text and voice) share one job while its
+result is still available.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+JOBS_DB = os.environ.get("DRISHTI_TTS_JOBS_DB", "tts_jobs.sqlite3")
+JOBS_AUDIO_DIR = os.environ.get("DRISHTI_TTS_JOBS_AUDIO_DIR", os.path.join("audio", "jobs"))
+# Completed audio is kept this long before it is deleted
+RESULT_TTL_SECONDS = int(os.environ.get("DRISHTI_TTS_JOB_TTL", str(24 * 3600)))
+# A running job whose worker has not sent a heartbeat for this long is requeued
+STALE_AFTER_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATES = (DONE, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT NOT NULL,
+    voice_description TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    heartbeat_at REAL,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT,
+    sample_rate INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+def connect(path=JOBS_DB):
+    """Open the jobs database, creating it if needed"""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL lets the API read while a worker writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def open_db(path=JOBS_DB):
+    """Connection for the duration of a with block"""
+    conn = connect(path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def dedup_key(text, voice_description):
+    return hashlib.sha256(f"{voice_description}\0{text}".encode("utf-8")).hexdigest()
+
+
+def job_to_dict(row):
+    """Public view of a job row"""
+    if row is None:
+        return None
+    job = {
+        "job_id": row["id"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "progress_steps": row["progress"],
+        "attempts": row["attempts"],
+    }
+    if row["status"] == DONE:
+        job["audio_url"] = f"/tts/jobs/{row['id']}/audio"
+        job["expires_at"] = row["expires_at"]
+    if row["error"]:
+        job["error"] = row["error"]
+    return job
+
+
+def submit(conn, text, voice_description):
+    """
+    Queue a job, or return the existing one for an identical submission.
+
+    Returns:
+        Tuple (job row, created) where created is False for a duplicate
+    """
+    key = dedup_key(text, voice_description)
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE dedup_key = ? AND status != ? "
+            "AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at DESC LIMIT 1",
+            (key, FAILED, now),
+        ).fetchone()
+        if row is not None:
+            conn.execute("COMMIT")
+            return row, False
+
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, dedup_key, status, text, voice_description, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, key, QUEUED, text, voice_description, now, now),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return get(conn, job_id), True
+
+
+def get(conn, job_id):
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def submit_job(text, voice_description, path=JOBS_DB):
+    """submit() on a connection of its own, for callers on other threads"""
+    with open_db(path) as conn:
+        return submit(conn, text, voice_description)
+
+
+def read_job(job_id, path=JOBS_DB):
+    """get() on a connection of its own, for callers on other threads"""
+    with open_db(path) as conn:
+        return get(conn, job_id)
+
+
+def claim(conn, worker):
+    """Atomically take the oldest queued job for a worker, or return None"""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, updated_at = ?, "
+            "attempts = attempts + 1, progress = 0 WHERE id = ?",
+            (RUNNING, worker, now, now, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return get(conn, row["id"])
+
+
+# heartbeat, complete and fail only touch a job the worker still holds: once
+# requeue_stale has handed a slow job to another worker, the first one's
+# updates are ignored and each returns False.
+
+def heartbeat(conn, job_id, worker, progress):
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET heartbeat_at = ?, updated_at = ?, progress = ? WHERE id = ? AND status = ? AND worker = ?",
+        (now, now, progress, job_id, RUNNING, worker),
+    )
+    return cursor.rowcount == 1
+
+
+def complete(conn, job_id, worker, result_path, sample_rate, ttl=RESULT_TTL_SECONDS):
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = ?, result_path = ?, sample_rate = ?, finished_at = ?, updated_at = ?, "
+        "expires_at = ?, error = NULL WHERE id = ? AND status = ? AND worker = ?",
+        (DONE, result_path, sample_rate, now, now, now + ttl, job_id, RUNNING, worker),
+    )
+    return cursor.rowcount == 1
+
+
+def fail(conn, job_id, worker, error):
+    """Requeue a failed job until it runs out of attempts"""
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, error = ?, updated_at = ?, "
+        "finished_at = CASE WHEN attempts < ? THEN NULL ELSE ? END, worker = NULL "
+        "WHERE id = ? AND status = ? AND worker = ?",
+        (MAX_ATTEMPTS, QUEUED, FAILED, error, now, MAX_ATTEMPTS, now, job_id, RUNNING, worker),
+    )
+    return cursor.rowcount == 1
+
+
+def requeue_stale(conn, stale_after=STALE_AFTER_SECONDS):
+    """
+    Put running jobs whose worker stopped sending heartbeats back in the queue.
+
+    A text that crashes its worker would otherwise be retried forever, so this
+    counts as a failed attempt like any other.
+    """
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, error = ?, updated_at = ?, "
+        "finished_at = CASE WHEN attempts < ? THEN NULL ELSE ? END, worker = NULL "
+        "WHERE status = ? AND heartbeat_at < ?",
+        (MAX_ATTEMPTS, QUEUED, FAILED, "Worker stopped responding", now, MAX_ATTEMPTS, now,
+         RUNNING, now - stale_after),
+    )
+    return cursor.rowcount
+
+
+def expire(conn):
+    """Delete finished jobs whose TTL has passed, along with their audio"""
+    now = time.time()
+    rows = conn.execute(
+        "SELECT id, result_path FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+    ).fetchall()
+    for row in rows:
+        if row["result_path"]:
+            try:
+                os.remove(row["result_path"])
+            except OSError:
+                pass
+        conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+    # Failed jobs are kept for the same TTL so clients can still read the error
+    conn.execute(
+        "DELETE FROM jobs WHERE status = ? AND finished_at < ?", (FAILED, now - RESULT_TTL_SECONDS)
+    )
+    return len(rows)
+
+
+def queue_depth(conn):
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
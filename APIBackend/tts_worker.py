@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Background worker processes for asynchronous TTS jobs.
+
+Each process loads the Parler model once, then repeatedly claims the oldest
+queued job from the SQLite queue, synthesizes it and stores the audio. Running
+jobs send heartbeats; if a worker dies its job is requeued by the others.
+
+Usage:
+    python tts_worker.py --processes 2
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import thread_budget
+import tts_engine
+import tts_jobs
+
+POLL_INTERVAL = 1.0
+# Housekeeping (stale requeue and TTL expiry) runs at most this often
+MAINTENANCE_INTERVAL = 30.0
+HEARTBEAT_INTERVAL = 2.0
+
+
+def run_worker(index, stop_event, processes=1, pin=False):
+    """Claim and process jobs until stop_event is set"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    # The parent handles Ctrl+C and sets stop_event, so the current job can finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    thread_budget.configure(workers=processes, slot=index, services={"tts": 1}, pin=pin)
+    os.makedirs(tts_jobs.JOBS_AUDIO_DIR, exist_ok=True)
+    conn = tts_jobs.connect()
+    tts_engine.load_tts_models()
+    print(f"TTS worker {worker_id} ready")
+
+    last_maintenance = 0.0
+    while not stop_event.is_set():
+        if time.time() - last_maintenance > MAINTENANCE_INTERVAL:
+            requeued = tts_jobs.requeue_stale(conn)
+            expired = tts_jobs.expire(conn)
+            if requeued or expired:
+                print(f"Requeued or failed {requeued} stale jobs, expired {expired} jobs")
+            last_maintenance = time.time()
+
+        job = tts_jobs.claim(conn, worker_id)
+        if job is None:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+
+        print(f"Worker {worker_id} synthesizing job {job['id']} ({len(job['text'])} chars)")
+        # One file per attempt, so a worker whose job was handed on never writes over the new attempt's
+        output_path = os.path.join(tts_jobs.JOBS_AUDIO_DIR, f"{job['id']}.{job['attempts']}.wav")
+        last_heartbeat = [0.0]
+
+        def on_step(steps):
+            now = time.time()
+            if now - last_heartbeat[0] >= HEARTBEAT_INTERVAL:
+                tts_jobs.heartbeat(conn, job["id"], worker_id, steps)
+                last_heartbeat[0] = now
+
+        try:
+            result = tts_engine.synthesize_speech(
+                job["text"], job["voice_description"], output_path, on_step=on_step
+            )
+            if not tts_jobs.complete(conn, job["id"], worker_id, output_path, result["sample_rate"]):
+                print(f"Job {job['id']} was handed to another worker; discarding this result")
+                os.remove(output_path)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            tts_jobs.fail(conn, job["id"], worker_id, str(e))
+
+    print(f"TTS worker {worker_id} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run TTS job worker processes")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--pin", action="store_true", help="Pin each worker process to its share of the cores")
+    args = parser.parse_args()
+
+    # Create the schema once before the workers race to do it
+    tts_jobs.connect().close()
+
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    workers = [
+        ctx.Process(target=run_worker, args=(i, stop_event, args.processes, args.pin))
+        for i in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop(signum, frame):
+        print("Stopping TTS workers after their current jobs...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 import ssl
+import asyncio
 import cv2
 import numpy as np
 import colorsys
@@ -9,6 +10,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
 from PIL import Image
 import io
+import upload_store
 
 # Disable SSL certificate verification for downloading models
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -25,11 +27,27 @@ app.add_middleware(
 )
 
 # Create directories if they don't exist
-os.makedirs("uploads", exist_ok=True)
+os.makedirs(upload_store.ORIGINALS_DIR, exist_ok=True)
+os.makedirs(upload_store.THUMBNAILS_DIR, exist_ok=True)
 os.makedirs("audio", exist_ok=True)
 
-# Mount static files directory
-app.mount("/static", StaticFiles(directory="uploads"), name="static")
+# Mount static files directory (uploads and their thumbnails)
+app.mount("/static", StaticFiles(directory=upload_store.UPLOAD_DIR), name="static")
+
+async def evict_uploads_periodically():
+    """Keep the upload store within its size and age limits"""
+    while True:
+        try:
+            result = await asyncio.to_thread(upload_store.evict)
+            if result["removed"]:
+                print(f"Evicted {result['removed']} upload files, {result['bytes']} bytes remain")
+        except Exception as e:
+            print(f"Error during upload eviction: {e}")
+        await asyncio.sleep(upload_store.EVICTION_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_upload_eviction():
+    asyncio.create_task(evict_uploads_periodically())
 
 @app.get("/")
 async def read_root():
@@ -54,10 +72,8 @@ async def detect_color(file: UploadFile = File(...)):
         if img is None:
             raise HTTPException(status_code=400, detail="Invalid image format")
         
-        # Save the uploaded image
-        filename = f"uploads/{file.filename}"
-        with open(filename, "wb") as f:
-            f.write(contents)
+        # Save the uploaded image under its content hash; hashing and file writes stay off the event loop
+        stored = await asyncio.to_thread(upload_store.store, contents, img)
         
         # Calculate the average color
         avg_color = average_image_color(img)
@@ -72,7 +88,8 @@ async def detect_color(file: UploadFile = File(...)):
             "rgb_color": avg_color,
             "hsi_color": hsi_color,
             "color_name": color_name,
-            "image_url": f"/static/{file.filename}"
+            "image_url": f"/static/{stored['original']}",
+            "thumbnail_url": f"/static/{stored['thumbnail']}"
         }
     
     except Exception as e:
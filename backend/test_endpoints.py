@@ -1,11 +1,11 @@
 import requests
 import os
 
-BASE_URL = 'http://127.0.0.1:8090'
+BASE_URL = 'http://127.0.0.1:8020'
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 def test_ocr():
-    url = f'{BASE_URL}/ocr'
+    url = f'{BASE_URL}/ocr/'
     file_path = os.path.join(BASE_DIR, 'public', 'KannadaText.png')
     
     with open(file_path, 'rb') as f:
@@ -16,7 +16,7 @@ def test_ocr():
     print('Response:', response.json() if response.status_code == 200 else response.text)
 
 def test_color_detection():
-    url = f'{BASE_URL}/color-detection'
+    url = f'{BASE_URL}/detect-color'
     file_path = os.path.join(BASE_DIR, 'public', 'colortest.jpeg')
     
     with open(file_path, 'rb') as f:
@@ -27,15 +27,14 @@ def test_color_detection():
     print('Response:', response.json() if response.status_code == 200 else response.text)
 
 def test_tts():
-    url = f'{BASE_URL}/tts'
+    url = f'{BASE_URL}/tts/'
     file_path = os.path.join(BASE_DIR, 'public', 'testtext.txt')
     
-    with open(file_path, 'rb') as f:
-        files = {'file': ('testtext.txt', f, 'text/plain')}
-        response = requests.post(url, files=files)
+    with open(file_path, encoding='utf-8') as f:
+        response = requests.post(url, json={'text': f.read().strip()})
     
     print('TTS Test:', 'Passed' if response.status_code == 200 else 'Failed')
-    print('Response:', response.json() if response.status_code == 200 else response.text)
+    print('Response:', f"{response.headers.get('content-type')} ({len(response.content)} bytes)" if response.status_code == 200 else response.text)
 
 if __name__ == '__main__':
     print('Testing OCR Endpoint...')
@@ -0,0 +1,172 @@
+"""
+Content-addressed storage for uploaded images.
+
+Uploads are stored under the SHA-256 of their bytes, so identical images are
+written once and phones that name every photo "image.jpg" no longer overwrite
+each other. A small JPEG thumbnail is written next to each original; /static
+serves both. Old and excess files are removed by evict(), which the
+app runs periodically in the background rather than in the request path.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+
+UPLOAD_DIR = "uploads"
+ORIGINALS_DIR = os.path.join(UPLOAD_DIR, "originals")
+THUMBNAILS_DIR = os.path.join(UPLOAD_DIR, "thumbs")
+
+THUMBNAIL_MAX_SIDE = 256
+THUMBNAIL_QUALITY = 80
+
+# Eviction limits: files unused for longer than MAX_AGE go first, then the
+# least recently used until the store is under MAX_BYTES
+MAX_AGE_SECONDS = int(os.environ.get("DRISHTI_UPLOAD_MAX_AGE", str(7 * 24 * 3600)))
+MAX_BYTES = int(os.environ.get("DRISHTI_UPLOAD_MAX_MB", "1024")) * 1024 * 1024
+EVICTION_INTERVAL_SECONDS = 600
+# Files used this recently are kept even over the size limit, so a URL that was
+# just returned still resolves when the client fetches it
+RECENT_USE_SECONDS = 300
+
+# Held while store() checks or writes files and while evict() deletes them, so
+# eviction never removes a file between its dedup check and the response
+_lock = threading.Lock()
+
+# Magic numbers of the formats cv2.imdecode accepts from phones
+_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+    (b"BM", ".bmp"),
+    (b"II*\x00", ".tiff"),
+    (b"MM\x00*", ".tiff"),
+    (b"RIFF", ".webp"),
+]
+
+
+def guess_extension(contents):
+    for signature, extension in _SIGNATURES:
+        if contents.startswith(signature):
+            return extension
+    return ".bin"
+
+
+def _sharded(directory, digest, extension):
+    """Two-level layout keeps directory listings short"""
+    return os.path.join(directory, digest[:2], digest + extension)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def make_thumbnail(img):
+    """JPEG bytes of img scaled so its longest side is at most THUMBNAIL_MAX_SIDE"""
+    height, width = img.shape[:2]
+    scale = min(1.0, THUMBNAIL_MAX_SIDE / float(max(height, width)))
+    if scale < 1.0:
+        img = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode thumbnail")
+    return encoded.tobytes()
+
+
+def store(contents, img):
+    """
+    Store an upload and its thumbnail, deduplicating by content.
+
+    Args:
+        contents: Raw uploaded bytes
+        img: The same image decoded by OpenCV, used for the thumbnail
+
+    Returns:
+        Dict with the content hash, whether it was already stored, and the
+        original and thumbnail paths relative to UPLOAD_DIR (for /static URLs)
+    """
+    digest = hashlib.sha256(contents).hexdigest()
+    original_path = _sharded(ORIGINALS_DIR, digest, guess_extension(contents))
+    thumbnail_path = _sharded(THUMBNAILS_DIR, digest, ".jpg")
+
+    with _lock:
+        existed = os.path.exists(original_path) and os.path.exists(thumbnail_path)
+        if existed:
+            # Refresh the access time used by eviction instead of writing again
+            now = time.time()
+            for path in (original_path, thumbnail_path):
+                try:
+                    os.utime(path, (now, now))
+                except OSError:
+                    existed = False
+    if not existed:
+        thumbnail = make_thumbnail(img)
+        with _lock:
+            _write_atomic(original_path, contents)
+            _write_atomic(thumbnail_path, thumbnail)
+
+    return {
+        "hash": digest,
+        "deduplicated": existed,
+        "original": os.path.relpath(original_path, UPLOAD_DIR).replace(os.sep, "/"),
+        "thumbnail": os.path.relpath(thumbnail_path, UPLOAD_DIR).replace(os.sep, "/"),
+    }
+
+
+def _stored_files():
+    files = []
+    for directory in (ORIGINALS_DIR, THUMBNAILS_DIR):
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def evict(max_age=MAX_AGE_SECONDS, max_bytes=MAX_BYTES, recent=RECENT_USE_SECONDS):
+    """
+    Delete files older than max_age, then the oldest until under max_bytes,
+    sparing files used in the last recent seconds. Shard directories left
+    empty are removed too.
+    """
+    files = sorted(_stored_files())
+    now = time.time()
+    cutoff = now - max_age
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        with _lock:
+            try:
+                # Checked again under the lock: store() may have just reused it
+                if os.stat(path).st_mtime >= now - recent:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                # Not empty
+                pass
+    return {"removed": removed, "bytes": total}